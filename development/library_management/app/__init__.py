@@ -5,10 +5,12 @@ Main application factory
 
 from flask import Flask
 from flask_wtf.csrf import CSRFProtect
+from jinja2 import FileSystemBytecodeCache
 import os
 import sys
 from dotenv import load_dotenv
 from .db import db
+from . import serving
 
 # Load environment variables
 load_dotenv()
@@ -16,13 +18,30 @@ load_dotenv()
 # Initialize extensions
 csrf = CSRFProtect()
 
-def create_app(config_class=None):
-    """Application factory function"""
+def create_app(config_class=None, interfaces=None):
+    """Application factory function
+
+    interfaces selects the blueprints to register: 'admin' (staff pages)
+    and/or 'opac' (public catalog and patron pages). Defaults to the
+    APP_INTERFACES environment variable, or both.
+    """
     app = Flask(__name__, template_folder='../templates')
+    interfaces = interfaces or os.getenv('APP_INTERFACES', 'admin,opac').split(',')
 
     # Configuration
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-change-this')
     app.config['WTF_CSRF_ENABLED'] = False
+    # Serve anonymous OPAC pages from the in-process page cache (see app/page_cache.py)
+    app.config['OPAC_PAGE_CACHE'] = os.getenv('OPAC_PAGE_CACHE', 'true').lower() != 'false'
+    # Where the staff navigation links to the public catalog (combined mode serves it under /catalog)
+    app.config['OPAC_SEARCH_URL'] = os.getenv('OPAC_SEARCH_URL', 'http://localhost:5001/opac/search')
+    # In-process scheduled backups with GFS retention (see app/backup_scheduler.py)
+    app.config['BACKUP_SCHEDULE'] = os.getenv('BACKUP_SCHEDULE', 'false').lower() == 'true'
+    app.config['BACKUP_FULL_AT'] = os.getenv('BACKUP_FULL_AT', '02:00')
+    app.config['BACKUP_INCREMENTAL_AT'] = os.getenv('BACKUP_INCREMENTAL_AT', '10:00,14:00,18:00')
+    app.config['BACKUP_KEEP_DAILY'] = int(os.getenv('BACKUP_KEEP_DAILY', '7'))
+    app.config['BACKUP_KEEP_WEEKLY'] = int(os.getenv('BACKUP_KEEP_WEEKLY', '4'))
+    app.config['BACKUP_KEEP_MONTHLY'] = int(os.getenv('BACKUP_KEEP_MONTHLY', '12'))
 
     # Use database path based on environment (exe vs development)
     if getattr(sys, 'frozen', False):
@@ -37,10 +56,12 @@ def create_app(config_class=None):
 
     app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-        'pool_pre_ping': True,  # Verify connections before use
-        'pool_recycle': 300,    # Recycle connections every 5 minutes
-    }
+    # One pooled connection per request thread (see app/serving.py)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = serving.engine_options()
+
+    # Settings from config_class (e.g. another SQLALCHEMY_DATABASE_URI) override the defaults above
+    if config_class is not None:
+        app.config.from_object(config_class)
 
     # Initialize extensions with app
     csrf.init_app(app)
@@ -52,7 +73,7 @@ def create_app(config_class=None):
             print("Initializing SQLAlchemy database...")
 
             # Import models - they'll use the Flask app's db instance
-            from .models import User, LibrarySettings, Category, Patron, Book, Transaction
+            from .models import User, LibrarySettings, Category, Patron, Book, Transaction, install_triggers
             print("Models imported successfully")
 
             # Now the models are registered with the correct db instance
@@ -60,6 +81,7 @@ def create_app(config_class=None):
             # Create all tables (only if they don't exist)
             print("Creating database tables...")
             db.create_all()
+            install_triggers()
             print("Database tables created successfully")
 
             # Verify tables were actually created
@@ -134,6 +156,18 @@ def create_app(config_class=None):
                 except Exception as e:
                     print(f" Warning during user creation: {e}")
                     print(" Continuing without admin user creation...")
+
+                # Seed the fines ledger from transactions if it has never been filled
+                try:
+                    from . import ledger
+                    with db.engine.connect() as conn:
+                        backfilled = ledger.backfill_if_empty(conn)
+                        conn.commit()
+                    if backfilled:
+                        print(f" Fines ledger backfilled: {backfilled['assessments']} assessments, "
+                              f"{backfilled['payments']} payments")
+                except Exception as e:
+                    print(f" Warning during fines ledger backfill: {e}")
             else:
                 print(" No tables were created - models may not be properly registered")
 
@@ -142,21 +176,27 @@ def create_app(config_class=None):
             print("Attempting to continue with existing database...")
             # Continue even if initialization fails - database might already exist
 
-    # Register blueprints first
-    from .routes import core_bp, patrons_bp, books_bp, transactions_bp, backup_bp, settings_bp
-    from .auth import auth_bp
-    from .routes.opac import opac_bp
-    from .routes.patron_auth import patron_auth_bp
-
-    app.register_blueprint(core_bp)
-    app.register_blueprint(patrons_bp)
-    app.register_blueprint(books_bp)
-    app.register_blueprint(transactions_bp)
-    app.register_blueprint(backup_bp)
-    app.register_blueprint(settings_bp)
-    app.register_blueprint(auth_bp)
-    app.register_blueprint(opac_bp)
-    app.register_blueprint(patron_auth_bp)
+    # Register blueprints first; an interface that is not served is never imported
+    if 'admin' in interfaces:
+        from .routes import core_bp, patrons_bp, books_bp, transactions_bp, backup_bp, settings_bp
+        from .auth import auth_bp
+
+        app.register_blueprint(core_bp)
+        app.register_blueprint(patrons_bp)
+        app.register_blueprint(books_bp)
+        app.register_blueprint(transactions_bp)
+        app.register_blueprint(backup_bp)
+        app.register_blueprint(settings_bp)
+        app.register_blueprint(auth_bp)
+
+    if 'opac' in interfaces:
+        from .routes.opac import opac_bp
+        from .routes.patron_auth import patron_auth_bp
+        from .routes.catalog_api import catalog_api_bp
+
+        app.register_blueprint(opac_bp)
+        app.register_blueprint(patron_auth_bp)
+        app.register_blueprint(catalog_api_bp)
 
     # Initialize login manager after blueprints are registered
     from .auth import login_manager
@@ -179,36 +219,36 @@ def create_app(config_class=None):
 
     app.jinja_env.filters['date'] = date_filter
 
+    configure_template_cache(app)
+
+    # Scheduled backups run on a background thread, off the request path
+    if app.config['BACKUP_SCHEDULE']:
+        from . import backup_scheduler
+        backup_scheduler.init_app(app)
+
     # Context processors to make data available to all templates
     @app.context_processor
     def inject_global_data():
         from .models import LibrarySettings
         from flask import session
-        from .models import Patron
+        from . import principals
 
         # Library name
         library_name = LibrarySettings.get_setting('library_name', 'Library')
 
-        # Patron session (for OPAC and patron pages)
+        # Patron session (for OPAC and patron pages), served from the principal cache
         patron_session = None
         if 'patron_id' in session:
             try:
-                patron_session = Patron.query.get(session['patron_id'])
-                # Debug logging
-                if patron_session:
-                    print(f"DEBUG: Found patron session for {patron_session.name} (ID: {patron_session.id}, Status: {patron_session.status})")
-                    # If patron is not active, clear the session
-                    if patron_session.status != 'active':
-                        print(f"DEBUG: Patron {patron_session.name} is not active (status: {patron_session.status})")
-                        # Clear the invalid session
-                        session.pop('patron_id', None)
-                        session.pop('patron_roll_no', None)
-                        session.pop('require_password_change', None)
-                        patron_session = None
-                else:
-                    print(f"DEBUG: No patron found for session ID: {session['patron_id']}")
+                patron_session = principals.get_patron(session['patron_id'])
+                # If patron is missing or not active, clear the session
+                if patron_session is None or patron_session.status != 'active':
+                    session.pop('patron_id', None)
+                    session.pop('patron_roll_no', None)
+                    session.pop('require_password_change', None)
+                    patron_session = None
             except Exception as e:
-                print(f"DEBUG: Error getting patron session: {e}")
+                print(f"Error getting patron session: {e}")
                 patron_session = None
 
         return {
@@ -217,3 +257,20 @@ def create_app(config_class=None):
         }
 
     return app
+
+def configure_template_cache(app):
+    """Keep compiled templates on disk so new processes skip Jinja compilation.
+
+    Uses TEMPLATE_CACHE_DIR, or a per-user temp directory.
+    """
+    template_cache_dir = os.getenv('TEMPLATE_CACHE_DIR')
+    if template_cache_dir:
+        os.makedirs(template_cache_dir, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(template_cache_dir)
+
+def precompile_templates(app):
+    """Compile every template into the Jinja caches; returns how many were compiled"""
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
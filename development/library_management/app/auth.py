@@ -8,7 +8,7 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, SelectField
 from wtforms.validators import DataRequired, Email, Length, ValidationError
 from app.models import User
-from app import db
+from app import db, principals
 from flask import current_app
 
 # Initialize login manager
@@ -18,11 +18,10 @@ login_manager = LoginManager()
 def load_user(user_id):
     """Load user by ID for Flask-Login"""
     try:
-        user = User.query.get(int(user_id))
-        if user:
-            print(f"DEBUG: Loaded user {user.username} (ID: {user_id}, Role: {user.role})")
-        else:
-            print(f"DEBUG: No user found for ID: {user_id}")
+        # Served from the per-worker principal cache; deactivated users are logged out
+        user = principals.get_user(user_id)
+        if user is None or not user.is_active:
+            return None
         return user
     except Exception as e:
         print(f"Error loading user {user_id}: {e}")
@@ -0,0 +1,462 @@
+"""
+Single-file backup archives for the Library Management System
+
+An archive is one deflate-compressed zip holding every data table as a
+JSON Lines member (one row per line, values keep their SQLite types) and
+an embedded manifest.json with each member's columns, row count and
+SHA-256. Rows are read from a consistent copy of the database in batches
+and written straight into the compressed member, so memory use stays flat
+and the archive can be streamed to a download without touching the disk.
+
+Restoring streams each member back in batches inside one transaction and
+checks its row count and SHA-256 against the manifest before committing.
+
+Every archive records per-table watermarks (the newest updated_at, or the
+highest id for the append-only ledger). An incremental archive holds only
+rows past its parent's watermarks, plus the ids deleted since then from the
+row_tombstones table, so a full archive followed by its incrementals can be
+replayed as a chain. Replaying a full archive first empties the tables it
+holds, so rows created after it was taken do not survive the restore.
+Tombstones are pruned only once every archive chain in the backup
+directory has moved past them.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime
+from .db import db
+from .snapshots import copy_database, database_path
+from . import backup_catalog
+from .backup_paths import BACKUP_DIR
+
+ARCHIVE_PREFIX = 'library_archive_'
+INCREMENTAL_PREFIX = 'library_incremental_'
+MANIFEST_NAME = 'manifest.json'
+DELETES_MEMBER = 'deletes.jsonl'
+FORMAT_VERSION = '1.0'
+BATCH_SIZE = 2000
+
+# Parents before children so restored rows always find their references
+ARCHIVE_TABLES = ['category', 'users', 'patrons', 'books', 'transactions',
+                  'fine_ledger', 'patron_balances', 'library_settings']
+
+# How incremental archives find changed rows; other tables are small and copied whole
+CHANGE_COLUMNS = {
+    'patrons': 'updated_at',
+    'books': 'updated_at',
+    'transactions': 'updated_at',
+    'fine_ledger': 'id',
+    'patron_balances': 'updated_at',
+    'library_settings': 'updated_at'
+}
+# Re-export rows stamped shortly before the watermark, in case a slow
+# transaction committed them after the parent archive was taken
+WATERMARK_OVERLAP = '-60 seconds'
+
+class ArchiveError(Exception):
+    """Raised when an archive is malformed or fails verification"""
+
+class _ChunkSink:
+    """Write-only file object that collects compressed output for streaming"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+@contextmanager
+def consistent_copy():
+    """Path of a temporary point-in-time copy of the live database"""
+    fd, path = tempfile.mkstemp(suffix='.db', dir=os.path.dirname(os.path.abspath(database_path())))
+    os.close(fd)
+    try:
+        copy_database(path)
+        yield path
+    finally:
+        os.remove(path)
+
+def _watermarks(source):
+    """Newest change marker per tracked table, plus the last tombstone id"""
+    marks = {}
+    for table, column in CHANGE_COLUMNS.items():
+        if column in _columns(source, table):
+            marks[table] = source.execute(f'SELECT MAX("{column}") FROM "{table}"').fetchone()[0]
+    if _columns(source, 'row_tombstones'):
+        marks['row_tombstones'] = source.execute('SELECT COALESCE(MAX(id), 0) FROM row_tombstones').fetchone()[0]
+    return marks
+
+def _change_filter(table, since):
+    """WHERE clause and parameters selecting rows changed after a watermark"""
+    column = CHANGE_COLUMNS.get(table)
+    if since is None or column is None or since.get(table) is None:
+        return '', ()
+    if column == 'id':
+        return ' WHERE id > ?', (since[table],)
+    return f' WHERE "{column}" >= datetime(?, \'{WATERMARK_OVERLAP}\')', (since[table],)
+
+def _write_member(zf, name, cursor):
+    """Stream a cursor into a JSON Lines member; yields per batch, then (rows, sha256)"""
+    digest = hashlib.sha256()
+    rows = 0
+    with zf.open(name, 'w', force_zip64=True) as out:
+        while True:
+            batch = cursor.fetchmany(BATCH_SIZE)
+            if not batch:
+                break
+            chunk = ''.join(json.dumps(row, ensure_ascii=False, separators=(',', ':')) + '\n'
+                            for row in batch).encode('utf-8')
+            digest.update(chunk)
+            out.write(chunk)
+            rows += len(batch)
+            yield None
+    yield rows, digest.hexdigest()
+
+def _archive_writer(fileobj, source, manifest, since=None):
+    """Write the archive to fileobj, yielding after every batch of rows.
+
+    With since (a parent's watermarks) only changed rows and deletes are written.
+    """
+    manifest.update({
+        'backup_type': 'library_archive',
+        'kind': 'full' if since is None else 'incremental',
+        'version': FORMAT_VERSION,
+        'timestamp': datetime.now().strftime('%Y%m%d_%H%M%S'),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'sqlite_version': sqlite3.sqlite_version,
+        'watermarks': _watermarks(source),
+        'members': []
+    })
+
+    with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+        if since is not None:
+            cursor = source.execute('SELECT table_name, row_id FROM row_tombstones WHERE id > ? ORDER BY id',
+                                    (since.get('row_tombstones') or 0,))
+            for result in _write_member(zf, DELETES_MEMBER, cursor):
+                if result is None:
+                    yield
+            manifest['deletes'] = {'name': DELETES_MEMBER, 'row_count': result[0], 'sha256': result[1]}
+
+        for table in ARCHIVE_TABLES:
+            columns = _columns(source, table)
+            if not columns:
+                continue
+
+            member = f'{table}.jsonl'
+            column_list = ', '.join(f'"{c}"' for c in columns)
+            where, params = _change_filter(table, since)
+            cursor = source.execute(f'SELECT {column_list} FROM "{table}"{where}', params)
+            for result in _write_member(zf, member, cursor):
+                if result is None:
+                    yield
+
+            manifest['members'].append({
+                'name': member,
+                'table': table,
+                'columns': columns,
+                'row_count': result[0],
+                'sha256': result[1]
+            })
+            yield
+
+        manifest['total_rows'] = sum(m['row_count'] for m in manifest['members'])
+        zf.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
+
+def _write_archive_file(backup_dir, prefix, manifest, since=None):
+    os.makedirs(backup_dir, exist_ok=True)
+    fd, partial = tempfile.mkstemp(prefix=prefix, suffix='.partial', dir=backup_dir)
+    try:
+        with consistent_copy() as path, os.fdopen(fd, 'wb') as f:
+            source = sqlite3.connect(path)
+            try:
+                for _ in _archive_writer(f, source, manifest, since):
+                    pass
+            finally:
+                source.close()
+    except Exception:
+        os.remove(partial)
+        raise
+
+    filename = f"{prefix}{manifest['timestamp']}.zip"
+    suffix = 1
+    while os.path.exists(os.path.join(backup_dir, filename)):
+        filename = f"{prefix}{manifest['timestamp']}_{suffix}.zip"
+        suffix += 1
+    os.replace(partial, os.path.join(backup_dir, filename))
+    manifest['filename'] = filename
+    manifest['size'] = os.path.getsize(os.path.join(backup_dir, filename))
+    backup_catalog.record([{'filename': filename, 'row_count': manifest['total_rows']}], backup_dir)
+    return manifest
+
+def create_archive(backup_dir=BACKUP_DIR):
+    """Write a full library_archive_<timestamp>.zip into backup_dir; returns the manifest"""
+    manifest = _write_archive_file(backup_dir, ARCHIVE_PREFIX, {})
+    prune_tombstones(backup_dir)
+    return manifest
+
+def list_archives(backup_dir=BACKUP_DIR):
+    """Manifests of every full and incremental archive in backup_dir, newest first"""
+    archives = []
+    if not os.path.isdir(backup_dir):
+        return archives
+    for filename in os.listdir(backup_dir):
+        if filename.startswith((ARCHIVE_PREFIX, INCREMENTAL_PREFIX)) and filename.endswith('.zip'):
+            try:
+                with zipfile.ZipFile(os.path.join(backup_dir, filename)) as zf:
+                    manifest = read_manifest(zf)
+            except (OSError, zipfile.BadZipFile, ArchiveError) as e:
+                print(f"Error reading backup archive {filename}: {e}")
+                continue
+            manifest['filename'] = filename
+            archives.append(manifest)
+    return sorted(archives, key=lambda m: (m.get('timestamp', ''), m['filename']), reverse=True)
+
+def create_incremental(backup_dir=BACKUP_DIR):
+    """Write library_incremental_<timestamp>.zip with the changes since the newest archive.
+
+    Returns the manifest. Raises ArchiveError if there is no archive to chain from.
+    """
+    archives = [m for m in list_archives(backup_dir) if 'watermarks' in m]
+    if not archives:
+        raise ArchiveError('No full archive to build on; create a full archive first')
+    parent = archives[0]
+
+    manifest = _write_archive_file(backup_dir, INCREMENTAL_PREFIX, {
+        'parent': parent['filename'],
+        'base': parent['filename'] if parent.get('kind', 'full') == 'full' else parent['base']
+    }, since=parent['watermarks'])
+    prune_tombstones(backup_dir)
+    return manifest
+
+def prune_tombstones(backup_dir=BACKUP_DIR):
+    """Drop the tombstones that every archive chain in backup_dir has already captured.
+
+    The next incremental of a chain needs the tombstones past the newest
+    watermark in that chain, so only those at or below the lowest such
+    watermark go. Returns the number of tombstones dropped.
+    """
+    chains = {}
+    for manifest in list_archives(backup_dir):
+        mark = manifest.get('watermarks', {}).get('row_tombstones')
+        if mark is None:
+            continue
+        base = manifest['filename'] if manifest.get('kind', 'full') == 'full' else manifest.get('base')
+        chains[base] = max(chains.get(base, 0), mark)
+    if not chains:
+        return 0
+    with db.engine.begin() as conn:
+        return conn.exec_driver_sql('DELETE FROM row_tombstones WHERE id <= ?', (min(chains.values()),)).rowcount
+
+def stream_archive():
+    """Generator of archive bytes for a streamed download.
+
+    The consistent copy is taken before returning, so the caller gets any
+    error before the response starts; the copy is removed once streaming ends.
+    """
+    fd, path = tempfile.mkstemp(suffix='.db', dir=os.path.dirname(os.path.abspath(database_path())))
+    os.close(fd)
+    try:
+        copy_database(path)
+    except Exception:
+        os.remove(path)
+        raise
+
+    def generate():
+        sink = _ChunkSink()
+        source = sqlite3.connect(path)
+        try:
+            for _ in _archive_writer(sink, source, {}):
+                data = sink.drain()
+                if data:
+                    yield data
+            yield sink.drain()
+        finally:
+            source.close()
+            os.remove(path)
+
+    return generate()
+
+def read_manifest(zf):
+    """Embedded manifest of an open archive, checked for the members it lists"""
+    try:
+        manifest = json.loads(zf.read(MANIFEST_NAME).decode('utf-8'))
+    except KeyError:
+        raise ArchiveError('Archive has no manifest.json')
+    except ValueError as e:
+        raise ArchiveError(f'Archive manifest is not valid JSON: {e}')
+
+    if manifest.get('backup_type') != 'library_archive':
+        raise ArchiveError('Not a library archive')
+    names = set(zf.namelist())
+    for member in manifest.get('members', []):
+        if member.get('name') not in names:
+            raise ArchiveError(f"Archive member missing: {member.get('name')}")
+        if member.get('table') not in ARCHIVE_TABLES:
+            raise ArchiveError(f"Unexpected table in archive: {member.get('table')}")
+    return manifest
+
+def _read_member(zf, member):
+    """Rows of a JSON Lines member, checking its row count and SHA-256 once exhausted"""
+    digest = hashlib.sha256()
+    rows = 0
+    with zf.open(member['name']) as f:
+        for line in f:
+            digest.update(line)
+            rows += 1
+            yield json.loads(line)
+    if rows != member['row_count'] or digest.hexdigest() != member['sha256']:
+        raise ArchiveError(f'{member["name"]} does not match the manifest; nothing was restored')
+
+def _batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _clear_tables(conn, tables):
+    """Empty tables, children first, for a full archive to be replayed into.
+
+    The fine ledger's append-only guard is lifted for the duration, and the
+    tombstones the deletes record are dropped again: the restored rows were
+    not deleted, and a later incremental must not replay them as deletes.
+    """
+    if not conn.connection.driver_connection.in_transaction:
+        # pysqlite only opens a transaction before DML; the guards must be dropped inside it
+        conn.exec_driver_sql('BEGIN')
+    last_tombstone = conn.exec_driver_sql('SELECT COALESCE(MAX(id), 0) FROM row_tombstones').scalar()
+    for table in reversed(tables):
+        guards = conn.exec_driver_sql(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ? AND name = ?",
+            (table, f'trg_{table}_no_delete')).fetchall()
+        for name, _ in guards:
+            conn.exec_driver_sql(f'DROP TRIGGER "{name}"')
+        conn.exec_driver_sql(f'DELETE FROM "{table}"')
+        for _, sql in guards:
+            conn.exec_driver_sql(sql)
+    conn.exec_driver_sql('DELETE FROM row_tombstones WHERE id > ?', (last_tombstone,))
+
+def apply_archive(conn, zf, manifest):
+    """Replay one archive on an open connection: deletes first, then upserts.
+
+    A full archive replaces the contents of the tables it holds.
+    Returns {table: rows upserted, 'deleted': rows deleted}.
+    """
+    results = {}
+
+    if manifest.get('kind', 'full') == 'full':
+        _clear_tables(conn, [table for table in ARCHIVE_TABLES
+                             if any(member['table'] == table for member in manifest['members'])])
+
+    if manifest.get('deletes'):
+        deleted = 0
+        for batch in _batches(_read_member(zf, manifest['deletes'])):
+            by_table = {}
+            for table_name, row_id in batch:
+                if table_name not in ARCHIVE_TABLES:
+                    raise ArchiveError(f'Unexpected table in deletes: {table_name}')
+                by_table.setdefault(table_name, []).append((row_id,))
+            for table_name, ids in by_table.items():
+                conn.exec_driver_sql(f'DELETE FROM "{table_name}" WHERE id = ?', ids)
+            deleted += len(batch)
+        results['deleted'] = deleted
+
+    for member in manifest['members']:
+        table = member['table']
+        live_columns = {row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{table}")')}
+        positions = [i for i, c in enumerate(member['columns']) if c in live_columns]
+        if not positions:
+            continue
+        column_list = ', '.join(f'"{member["columns"][i]}"' for i in positions)
+        placeholders = ', '.join('?' for _ in positions)
+        sql = f'INSERT OR REPLACE INTO "{table}" ({column_list}) VALUES ({placeholders})'
+
+        rows = 0
+        for batch in _batches(_read_member(zf, member)):
+            conn.exec_driver_sql(sql, [tuple(values[i] for i in positions) for values in batch])
+            rows += len(batch)
+        results[table] = rows
+
+    return results
+
+def _open_archive(fileobj):
+    try:
+        return zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile as e:
+        raise ArchiveError(f'Not a zip archive: {e}')
+
+def _summary(results, started, **extra):
+    deleted = results.pop('deleted', 0)
+    return {
+        'success': True,
+        'tables': results,
+        'deleted': deleted,
+        'total_restored': sum(results.values()),
+        'duration_seconds': round((datetime.now() - started).total_seconds(), 3),
+        **extra
+    }
+
+def restore_archive(fileobj):
+    """Stream every member of an archive back into the database.
+
+    A full archive replaces each table's rows, an incremental upserts them
+    by primary key; either way in one transaction, which is rolled back if
+    any member's row count or SHA-256 differs from the manifest.
+    Returns a result dict with per-table row counts.
+    """
+    started = datetime.now()
+    with _open_archive(fileobj) as zf, db.engine.begin() as conn:
+        manifest = read_manifest(zf)
+        results = apply_archive(conn, zf, manifest)
+    return _summary(results, started, timestamp=manifest.get('timestamp'))
+
+def resolve_chain(filename, backup_dir=BACKUP_DIR):
+    """Archive filenames from the full base up to filename, oldest first"""
+    chain = []
+    while filename:
+        if os.path.basename(filename) != filename or not filename.startswith((ARCHIVE_PREFIX, INCREMENTAL_PREFIX)):
+            raise ArchiveError(f'Invalid archive name: {filename}')
+        path = os.path.join(backup_dir, filename)
+        if not os.path.exists(path):
+            raise ArchiveError(f'Archive missing from chain: {filename}')
+        with _open_archive(path) as zf:
+            manifest = read_manifest(zf)
+        chain.append(filename)
+        if filename in chain[:-1] or len(chain) > 10000:
+            raise ArchiveError('Archive chain has a cycle')
+        filename = manifest.get('parent') if manifest.get('kind') == 'incremental' else None
+    return list(reversed(chain))
+
+def restore_chain(filename, backup_dir=BACKUP_DIR):
+    """Replay a full archive and its incrementals up to filename in one transaction"""
+    started = datetime.now()
+    chain = resolve_chain(filename, backup_dir)
+    totals = {}
+
+    with db.engine.begin() as conn:
+        for name in chain:
+            with _open_archive(os.path.join(backup_dir, name)) as zf:
+                for table, count in apply_archive(conn, zf, read_manifest(zf)).items():
+                    totals[table] = totals.get(table, 0) + count
+
+    return _summary(totals, started, chain=chain)
@@ -0,0 +1,222 @@
+"""
+Backup catalog for the Library Management System
+
+Every file a backup produces is recorded when it is written in a small
+SQLite index that lives in the backup directory itself, so it survives
+database restores and travels with the backups. Each entry stores its
+backup set (the files written together), kind, size, SHA-256, row count
+and creation time. The backup page pages through this index instead of
+listing and stat-ing the whole directory on every view.
+
+Files copied in or deleted by hand are picked up by reconcile(), which
+also builds the catalog the first time it is opened for a directory
+(see utils/reconcile_backup_catalog.py).
+
+The same file records scheduled backup runs. A run is claimed by
+inserting its (job, slot) row, so when several workers reach the same
+slot only the one whose insert succeeds runs the job; the row then keeps
+the run's duration, size and row count. A claim still 'running' after
+RUN_TIMEOUT belongs to a worker that died, and the next claim of that
+slot takes it over.
+"""
+
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from . import snapshots
+from .backup_paths import BACKUP_DIR
+
+CATALOG_NAME = 'backup_catalog.sqlite3'
+# A run still 'running' after this many seconds is taken to have died with its worker
+RUN_TIMEOUT = 3 * 3600
+BACKUP_SUFFIXES = ('.csv', '.json', '.db', '.db.gz', '.zip')
+
+# filename pattern -> kind; the set is the name without its member part and extension
+BACKUP_KINDS = [
+    (re.compile(r'^system_backup_(?:categories|patrons|books|transactions|manifest)_(\d{8}_\d{6}(?:_\d+)?)\.(?:csv|json)$'),
+     'csv', 'system_backup_{}'),
+    (re.compile(r'^library_backup_(\d{8}_\d{6}(?:_\d+)?)\.json$'), 'json', 'library_backup_{}'),
+    (re.compile(r'^library_snapshot_(\d{8}_\d{6}(?:_\d+)?)\.(?:db|db\.gz|manifest\.json)$'), 'snapshot', 'library_snapshot_{}'),
+    (re.compile(r'^library_archive_(\d{8}_\d{6}(?:_\d+)?)\.zip$'), 'archive', 'library_archive_{}'),
+    (re.compile(r'^library_incremental_(\d{8}_\d{6}(?:_\d+)?)\.zip$'), 'incremental', 'library_incremental_{}')
+]
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS backup_files (
+        filename TEXT PRIMARY KEY,
+        backup_set TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        sha256 TEXT,
+        row_count INTEGER,
+        created_at TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS ix_backup_files_created_at ON backup_files (created_at);
+    CREATE INDEX IF NOT EXISTS ix_backup_files_backup_set ON backup_files (backup_set);
+    CREATE TABLE IF NOT EXISTS backup_runs (
+        id INTEGER PRIMARY KEY,
+        job TEXT NOT NULL,
+        slot TEXT NOT NULL,
+        status TEXT NOT NULL,
+        started_at TEXT NOT NULL,
+        duration_seconds REAL,
+        filename TEXT,
+        size INTEGER,
+        row_count INTEGER,
+        error TEXT,
+        UNIQUE (job, slot)
+    );
+'''
+
+def classify(filename):
+    """(kind, backup_set) of a backup file name"""
+    for pattern, kind, backup_set in BACKUP_KINDS:
+        match = pattern.match(filename)
+        if match:
+            return kind, backup_set.format(match.group(1))
+    stem = filename.split('.', 1)[0]
+    return 'other', stem
+
+def is_backup_file(filename):
+    return filename.endswith(BACKUP_SUFFIXES)
+
+@contextmanager
+def _catalog(backup_dir):
+    os.makedirs(backup_dir, exist_ok=True)
+    path = os.path.join(backup_dir, CATALOG_NAME)
+    created = not os.path.exists(path)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.executescript(SCHEMA)
+        if created:
+            _reconcile(conn, backup_dir)
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+def _entry(backup_dir, filename, row_count=None, sha256=None, created_at=None):
+    path = os.path.join(backup_dir, filename)
+    stat = os.stat(path)
+    kind, backup_set = classify(filename)
+    return (filename, backup_set, kind, stat.st_size,
+            sha256 or snapshots.sha256_file(path), row_count,
+            (created_at or datetime.fromtimestamp(stat.st_mtime)).isoformat(sep=' ', timespec='seconds'))
+
+def _insert(conn, entries):
+    conn.executemany('INSERT OR REPLACE INTO backup_files VALUES (?, ?, ?, ?, ?, ?, ?)', entries)
+
+def record(members, backup_dir=BACKUP_DIR):
+    """Add the files of one backup to the catalog.
+
+    members is a list of dicts with a filename and optionally row_count
+    and sha256 (computed here when not already known).
+    """
+    now = datetime.now()
+    entries = [_entry(backup_dir, m['filename'], m.get('row_count'), m.get('sha256'), now) for m in members]
+    with _catalog(backup_dir) as conn:
+        _insert(conn, entries)
+
+def remove(filename, backup_dir=BACKUP_DIR):
+    """Delete a cataloged backup file and its entry; returns False if it is not cataloged"""
+    with _catalog(backup_dir) as conn:
+        if conn.execute('SELECT 1 FROM backup_files WHERE filename = ?', (filename,)).fetchone() is None:
+            return False
+        path = os.path.join(backup_dir, filename)
+        if os.path.exists(path):
+            os.remove(path)
+        conn.execute('DELETE FROM backup_files WHERE filename = ?', (filename,))
+    return True
+
+def _reconcile(conn, backup_dir):
+    on_disk = {name for name in os.listdir(backup_dir)
+               if is_backup_file(name) and os.path.isfile(os.path.join(backup_dir, name))}
+    cataloged = {row[0] for row in conn.execute('SELECT filename FROM backup_files')}
+
+    added = sorted(on_disk - cataloged)
+    removed = sorted(cataloged - on_disk)
+    _insert(conn, [_entry(backup_dir, name) for name in added])
+    conn.executemany('DELETE FROM backup_files WHERE filename = ?', [(name,) for name in removed])
+    return {'added': added, 'removed': removed}
+
+def reconcile(backup_dir=BACKUP_DIR):
+    """Catalog files added to backup_dir out of band and drop entries whose files are gone"""
+    with _catalog(backup_dir) as conn:
+        return _reconcile(conn, backup_dir)
+
+def _file_info(backup_dir, row):
+    created_at = datetime.fromisoformat(row['created_at'])
+    return {
+        'name': row['filename'],
+        'path': os.path.join(backup_dir, row['filename']),
+        'backup_set': row['backup_set'],
+        'type': row['kind'],
+        'size': row['size'],
+        'sha256': row['sha256'],
+        'row_count': row['row_count'],
+        'modified_formatted': created_at.strftime('%Y-%m-%d %H:%M'),
+        'modified_date': created_at.strftime('%Y-%m-%d')
+    }
+
+def list_page(page=1, per_page=50, backup_dir=BACKUP_DIR):
+    """One page of cataloged files, newest first, and the catalog totals"""
+    with _catalog(backup_dir) as conn:
+        totals = conn.execute('''
+            SELECT COUNT(*) AS files, COALESCE(SUM(size), 0) AS total_size,
+                   SUM(filename LIKE '%.csv') AS csv_count, MAX(created_at) AS latest
+            FROM backup_files
+        ''').fetchone()
+        rows = conn.execute('SELECT * FROM backup_files ORDER BY created_at DESC, filename LIMIT ? OFFSET ?',
+                            (per_page, (page - 1) * per_page)).fetchall()
+
+    return [_file_info(backup_dir, row) for row in rows], {
+        'files': totals['files'],
+        'total_size': totals['total_size'],
+        'csv_count': totals['csv_count'] or 0,
+        'latest': totals['latest'][:10] if totals['latest'] else None,
+        'pages': max(1, -(-totals['files'] // per_page))
+    }
+
+def files_of_kind(kind, backup_dir=BACKUP_DIR):
+    """(filename, created_at) of every cataloged file of one kind, newest first"""
+    with _catalog(backup_dir) as conn:
+        return [(row['filename'], datetime.fromisoformat(row['created_at'])) for row in conn.execute(
+            'SELECT filename, created_at FROM backup_files WHERE kind = ? ORDER BY created_at DESC, filename DESC',
+            (kind,))]
+
+def claim_run(job, slot, backup_dir=BACKUP_DIR):
+    """Claim a scheduled run; returns its id, or None if another worker already has it"""
+    now = datetime.now()
+    stale = (now - timedelta(seconds=RUN_TIMEOUT)).isoformat(sep=' ', timespec='seconds')
+    now = now.isoformat(sep=' ', timespec='seconds')
+    with _catalog(backup_dir) as conn:
+        cursor = conn.execute("INSERT OR IGNORE INTO backup_runs (job, slot, status, started_at) VALUES (?, ?, 'running', ?)",
+                              (job, slot, now))
+        if cursor.rowcount:
+            return cursor.lastrowid
+        # A claim left 'running' past RUN_TIMEOUT died with its worker; take it over
+        cursor = conn.execute('''
+            UPDATE backup_runs SET started_at = ?, error = 'Restarted after a run that did not finish'
+            WHERE job = ? AND slot = ? AND status = 'running' AND started_at < ?
+        ''', (now, job, slot, stale))
+        if not cursor.rowcount:
+            return None
+        return conn.execute('SELECT id FROM backup_runs WHERE job = ? AND slot = ?', (job, slot)).fetchone()[0]
+
+def finish_run(run_id, status, duration_seconds, filename=None, size=None, row_count=None, error=None,
+               backup_dir=BACKUP_DIR):
+    """Record the outcome of a claimed run"""
+    with _catalog(backup_dir) as conn:
+        conn.execute('''
+            UPDATE backup_runs SET status = ?, duration_seconds = ?, filename = ?, size = ?, row_count = ?, error = ?
+            WHERE id = ?
+        ''', (status, round(duration_seconds, 3), filename, size, row_count, error, run_id))
+
+def recent_runs(limit=20, backup_dir=BACKUP_DIR):
+    """The latest scheduled runs, newest first"""
+    with _catalog(backup_dir) as conn:
+        return [dict(row) for row in conn.execute(
+            'SELECT * FROM backup_runs ORDER BY started_at DESC, id DESC LIMIT ?', (limit,))]
@@ -0,0 +1,25 @@
+"""
+Backup directory of the Library Management System
+
+Every backup engine, the Backup page and the startup backup in
+start_server.py write to and read from BACKUP_DIR, an absolute path, so
+files land in the same place whatever directory a process was started
+from (gunicorn runs in library_management/, the launcher wherever it was
+invoked). The BACKUP_DIR environment variable overrides the default of
+library_management/backups, or backups/ next to the executable when
+frozen. This module has no Flask imports so scripts can use it directly.
+"""
+
+import os
+import sys
+
+def default_backup_dir():
+    """BACKUP_DIR from the environment, else the backups folder beside the app"""
+    if os.getenv('BACKUP_DIR'):
+        return os.path.abspath(os.getenv('BACKUP_DIR'))
+    if getattr(sys, 'frozen', False):
+        # The exe launcher changes to the exe's directory, as for data/library.db
+        return os.path.join(os.getcwd(), 'backups')
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backups')
+
+BACKUP_DIR = default_backup_dir()
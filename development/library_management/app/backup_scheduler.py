@@ -0,0 +1,165 @@
+"""
+Scheduled backups for the Library Management System
+
+A daemon thread started by create_app when BACKUP_SCHEDULE is on wakes
+every POLL_SECONDS and runs each job whose latest configured time has
+passed: a full archive once a day and incremental archives at the
+listed times. Each run is claimed in the backup catalog before it
+starts, so whichever worker claims a slot first runs it and the others
+skip it, and a server that was down at the scheduled time catches up
+once on start. The catalog row also records the run's duration, size
+and row count.
+
+Under gunicorn with preload_app, gunicorn.conf.py calls defer_start()
+before the app is built in the master, so create_app only records the
+app and each worker starts its own thread from post_fork through
+start_deferred(); the master never runs backups.
+
+After each full archive, grandfather-father-son retention keeps the
+newest full archive of each of the last BACKUP_KEEP_DAILY days,
+BACKUP_KEEP_WEEKLY weeks and BACKUP_KEEP_MONTHLY months, deletes the
+rest, and deletes incremental archives whose base is gone.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from . import backup_archive, backup_catalog
+
+POLL_SECONDS = 30
+
+_app = None
+_deferred = False
+_start_lock = threading.Lock()
+
+def _parse_times(value):
+    """'02:00,14:30' -> [(2, 0), (14, 30)]"""
+    times = []
+    for part in str(value or '').split(','):
+        part = part.strip()
+        if part:
+            hour, minute = part.split(':')
+            times.append((int(hour), int(minute)))
+    return times
+
+def latest_slot(times, now):
+    """The most recent scheduled time at or before now, or None if there are no times"""
+    slots = []
+    for hour, minute in times:
+        slot = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        slots.append(slot if slot <= now else slot - timedelta(days=1))
+    return max(slots) if slots else None
+
+def gfs_keep(backups, keep_daily, keep_weekly, keep_monthly):
+    """Filenames to keep from (filename, created_at) pairs sorted newest first"""
+    keep = set()
+    tiers = [(keep_daily, lambda d: d.date()),
+             (keep_weekly, lambda d: d.isocalendar()[:2]),
+             (keep_monthly, lambda d: (d.year, d.month))]
+    for limit, period in tiers:
+        seen = []
+        for filename, created_at in backups:
+            key = period(created_at)
+            if key in seen:
+                continue
+            if len(seen) >= limit:
+                break
+            seen.append(key)
+            keep.add(filename)
+    return keep
+
+def apply_retention(keep_daily, keep_weekly, keep_monthly, backup_dir=backup_archive.BACKUP_DIR):
+    """Delete full archives outside the GFS tiers and incrementals whose base was deleted.
+
+    Returns the deleted filenames.
+    """
+    fulls = backup_catalog.files_of_kind('archive', backup_dir)
+    keep = gfs_keep(fulls, keep_daily, keep_weekly, keep_monthly)
+    deleted = [filename for filename, _ in fulls if filename not in keep]
+
+    for manifest in backup_archive.list_archives(backup_dir):
+        if manifest.get('kind') == 'incremental' and manifest.get('base') not in keep:
+            deleted.append(manifest['filename'])
+
+    for filename in deleted:
+        backup_catalog.remove(filename, backup_dir)
+    return deleted
+
+def _run_job(app, job, slot):
+    run_id = backup_catalog.claim_run(job, slot.isoformat(sep=' ', timespec='minutes'))
+    if run_id is None:
+        return
+
+    started = time.perf_counter()
+    try:
+        with app.app_context():
+            if job == 'full':
+                manifest = backup_archive.create_archive()
+            else:
+                manifest = backup_archive.create_incremental()
+    except backup_archive.ArchiveError as e:
+        backup_catalog.finish_run(run_id, 'skipped', time.perf_counter() - started, error=str(e))
+        return
+    except Exception as e:
+        print(f"Scheduled {job} backup failed: {e}")
+        backup_catalog.finish_run(run_id, 'failed', time.perf_counter() - started, error=str(e))
+        return
+
+    backup_catalog.finish_run(run_id, 'ok', time.perf_counter() - started,
+                              manifest['filename'], manifest['size'], manifest['total_rows'])
+    print(f"Scheduled {job} backup {manifest['filename']} written in {time.perf_counter() - started:.1f}s")
+
+    if job == 'full':
+        deleted = apply_retention(app.config['BACKUP_KEEP_DAILY'], app.config['BACKUP_KEEP_WEEKLY'],
+                                  app.config['BACKUP_KEEP_MONTHLY'])
+        if deleted:
+            print(f"Backup retention removed {len(deleted)} archives")
+
+def run_due_jobs(app, now=None):
+    """Run every job whose latest slot has not been claimed yet"""
+    now = now or datetime.now()
+    full_slot = latest_slot(_parse_times(app.config['BACKUP_FULL_AT']), now)
+    incremental_slot = latest_slot(_parse_times(app.config['BACKUP_INCREMENTAL_AT']), now)
+
+    if full_slot:
+        _run_job(app, 'full', full_slot)
+    # An incremental slot that precedes the latest full run has nothing left to capture
+    if incremental_slot and (full_slot is None or incremental_slot > full_slot):
+        _run_job(app, 'incremental', incremental_slot)
+
+def _loop(app):
+    while True:
+        try:
+            run_due_jobs(app)
+        except Exception as e:
+            print(f"Backup scheduler error: {e}")
+        time.sleep(POLL_SECONDS)
+
+def _start(app):
+    thread = threading.Thread(target=_loop, args=(app,), name='backup-scheduler', daemon=True)
+    thread.start()
+    print(f"Backup scheduler started (pid {os.getpid()}): full at {app.config['BACKUP_FULL_AT']}, "
+          f"incremental at {app.config['BACKUP_INCREMENTAL_AT'] or 'never'}")
+
+def defer_start():
+    """Make init_app only record the app; call before a preloaded master builds it"""
+    global _deferred
+    _deferred = True
+
+def start_deferred():
+    """Start the thread for the app init_app recorded (in a forked gunicorn worker)"""
+    if _app is not None:
+        _start(_app)
+
+def init_app(app):
+    """Start the scheduler thread once per process if BACKUP_SCHEDULE is on"""
+    global _app
+    if not app.config.get('BACKUP_SCHEDULE'):
+        return
+    with _start_lock:
+        if _app is not None:
+            return
+        _app = app
+    if not _deferred:
+        _start(app)
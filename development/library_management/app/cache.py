@@ -0,0 +1,215 @@
+"""
+Per-worker caches for the Library Management System
+
+Each worker process keeps its own TTL/LRU caches. Writes that make cached
+data stale bump a named counter in the cache_versions table; every cache
+bound to that counter re-reads it at most once per `version_check_interval`
+seconds and clears itself when it has moved, so invalidation reaches the
+other workers without a shared cache server.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import text
+from .db import db
+
+_MISSING = object()
+
+# Every cache created in this process, for the metrics endpoint
+_registry = {}
+
+def register_cache(name, cache):
+    """Include any object with a stats() method in the cache metrics"""
+    _registry[name] = cache
+
+def get_version(name):
+    """Read a shared cache version counter (0 if it was never bumped)"""
+    try:
+        with db.engine.connect() as conn:
+            row = conn.execute(text('SELECT version FROM cache_versions WHERE name = :name'),
+                               {'name': name}).fetchone()
+        return row[0] if row else 0
+    except Exception as e:
+        print(f"Error reading cache version {name}: {e}")
+        return None
+
+def bump_version(name):
+    """Increment a shared cache version counter.
+
+    Opens its own connection, so call it after the write that made the
+    cache stale has been committed.
+    """
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(text('''
+                INSERT INTO cache_versions (name, version) VALUES (:name, 1)
+                ON CONFLICT(name) DO UPDATE SET version = version + 1
+            '''), {'name': name})
+    except Exception as e:
+        print(f"Error bumping cache version {name}: {e}")
+
+def read_versions(conn):
+    """Every shared counter as {name: version}"""
+    return dict(conn.execute(text('SELECT name, version FROM cache_versions')).fetchall())
+
+def advance_versions(conn, previous, keep=()):
+    """Move every counter past its value before a restore overwrote cache_versions.
+
+    A restore rewinds the counters, possibly to exactly the value another
+    worker last saw, which would then never clear its caches. Each counter
+    becomes max(previous, restored) + 1 instead. Rows named in keep are not
+    counters (e.g. index watermarks) and stay as restored.
+    """
+    restored = read_versions(conn)
+    for name in (previous.keys() | restored.keys()) - set(keep):
+        conn.execute(text('''
+            INSERT INTO cache_versions (name, version) VALUES (:name, :version)
+            ON CONFLICT(name) DO UPDATE SET version = excluded.version
+        '''), {'name': name, 'version': max(previous.get(name, 0), restored.get(name, 0)) + 1})
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds.
+
+    When `max_bytes` is set, `sizeof(value)` is used to keep the total
+    size of cached values under that cap as well.
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=60, version_key=None, version_check_interval=2.0,
+                 max_bytes=None, sizeof=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 0)
+        self.ttl = ttl
+        self.version_key = version_key
+        self.version_check_interval = version_check_interval
+
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        register_cache(name, self)
+
+    def _sync_version(self):
+        """Clear the cache if another worker bumped its version counter"""
+        if self.version_key is None:
+            return
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        self._version_checked_at = now
+
+        version = get_version(self.version_key)
+        if version is None:
+            return
+        with self._lock:
+            if self._version is not None and version != self._version:
+                self._data.clear()
+                self._bytes = 0
+                self.invalidations += 1
+            self._version = version
+
+    def get(self, key, default=None, sync=True):
+        """Return the cached value for key, or default on a miss.
+
+        sync=False skips the version check (which may read the database);
+        call sync_version() regularly from elsewhere instead.
+        """
+        if sync:
+            self._sync_version()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, size, value = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self._bytes -= size
+            self.misses += 1
+            return default
+
+    def sync_version(self):
+        """Check the version counter now if the check interval has passed"""
+        self._sync_version()
+
+    def set(self, key, value):
+        """Store value under key, evicting least recently used entries if full"""
+        size = self.sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+            while len(self._data) > self.maxsize or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                _, (_, evicted_size, _) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() on a miss.
+
+        None results are not cached, so a missing row is looked up again.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = loader()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key):
+        """Drop one entry from this worker's cache"""
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+    def clear(self):
+        """Drop every entry from this worker's cache"""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            self.invalidations += 1
+
+    def stats(self):
+        """Hit/miss counters for this worker's cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'version': self._version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+def cache_stats():
+    """Metrics for every cache in this worker process"""
+    return {name: cache.stats() for name, cache in _registry.items()}
+
+def clear_caches(version_key):
+    """Clear every cache in this worker bound to a version counter"""
+    for cache in list(_registry.values()):
+        if getattr(cache, 'version_key', None) == version_key:
+            cache.clear()
@@ -0,0 +1,183 @@
+"""
+Catalog search helpers for the Library Management System
+
+Query building shared by the OPAC pages and the JSON catalog API, plus
+faceted search. Facet counts come from one grouped pass over the books
+matching the search text: rows are grouped by (category, status, decade,
+publisher), and every facet's counts are derived from those rows in
+Python, each facet ignoring its own selection so the other values stay
+selectable. The grouped rows are cached per normalized search text and
+dropped with the OPAC page cache when the catalog changes, as is the
+list of active categories behind the category filters and pages.
+"""
+
+from collections import Counter, namedtuple
+from sqlalchemy import func
+from .cache import TTLCache
+from .db import db
+from .identifiers import classify_query
+from .models import Book, Category
+from .page_cache import CATALOG_VERSION
+
+FACETS = ('category', 'status', 'decade', 'publisher')
+MAX_PUBLISHER_VALUES = 15
+
+facet_cache = TTLCache('opac_facets', maxsize=512, ttl=600, version_key=CATALOG_VERSION)
+category_cache = TTLCache('categories', maxsize=1, ttl=3600, version_key=CATALOG_VERSION)
+
+CategoryEntry = namedtuple('CategoryEntry', 'id name description')
+
+def _load_categories():
+    return [CategoryEntry(*row) for row in db.session.query(Category.id, Category.name, Category.description)
+            .filter(Category.is_active == True).order_by(Category.name)]
+
+def active_categories():
+    """Active categories ordered by name, shared per worker until the catalog changes"""
+    return category_cache.get_or_load('active', _load_categories)
+
+def _as_list(value):
+    """Accept a single filter value or a list of them"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return [v for v in value if v]
+
+def apply_text_search(books_query, search):
+    """Apply the five-way title/author/accession/call number/ISBN match"""
+    if search:
+        books_query = books_query.filter(
+            db.or_(
+                Book.title.like(f'%{search}%'),
+                Book.author.like(f'%{search}%'),
+                Book.accession_number.like(f'%{search}%'),
+                Book.call_number.like(f'%{search}%'),
+                Book.isbn.like(f'%{search}%')
+            )
+        )
+    return books_query
+
+def match_identifier(books_query, search):
+    """Restrict a Book query to an exact ISBN/accession seek when the search looks like one.
+
+    Returns None for free text, so callers fall through to the text search.
+    """
+    candidates = classify_query(search)
+    if not candidates:
+        return None
+    return books_query.filter(db.or_(*[
+        getattr(Book, column) == value for column, value in candidates.items()
+    ]))
+
+def apply_catalog_filters(books_query, search='', category_filter='', status_filter='', category_joined=False):
+    """Apply the public catalog search, category and status filters to a Book query.
+
+    Category and status filters may be a single value or a list. Pass
+    category_joined=True when the query already joins Category.
+    """
+    books_query = apply_text_search(books_query, search)
+
+    # Apply category filter
+    categories = _as_list(category_filter)
+    if categories:
+        if not category_joined:
+            books_query = books_query.join(Category)
+        books_query = books_query.filter(Category.name.in_(categories))
+
+    # Apply status filter (only show available books by default for public)
+    statuses = _as_list(status_filter)
+    if statuses:
+        books_query = books_query.filter(Book.status.in_(statuses))
+    else:
+        # Default to available books for public view
+        books_query = books_query.filter(Book.status == 'available')
+
+    return books_query
+
+def apply_facet_filters(books_query, decades=None, publishers=None):
+    """Apply the publication-decade and publisher facet filters"""
+    decade_values = []
+    for decade in _as_list(decades):
+        try:
+            decade_values.append(int(decade))
+        except (ValueError, TypeError):
+            continue
+    if decade_values:
+        books_query = books_query.filter(db.or_(*[
+            Book.publication_year.between(decade, decade + 9) for decade in decade_values
+        ]))
+
+    publishers = _as_list(publishers)
+    if publishers:
+        books_query = books_query.filter(Book.publisher.in_(publishers))
+
+    return books_query
+
+def parse_facet_args(args):
+    """Read the selected facet values from request args"""
+    return {
+        'category': args.getlist('category'),
+        'status': args.getlist('status'),
+        'decade': args.getlist('decade'),
+        'publisher': args.getlist('publisher')
+    }
+
+def normalize_search(search):
+    """Cache key form of the search text"""
+    return ' '.join((search or '').lower().split())
+
+def _grouped_rows(search):
+    """(category, status, decade, publisher, count) for all books matching the text"""
+    decade = Book.publication_year - Book.publication_year % 10
+    query = (db.session.query(Category.name, Book.status, decade, Book.publisher, func.count(Book.id))
+             .outerjoin(Category, Book.category_id == Category.id))
+    query = apply_text_search(query, search)
+    rows = query.group_by(Category.name, Book.status, decade, Book.publisher).all()
+    return [(r[0], r[1], str(r[2]) if r[2] is not None else None, r[3], r[4]) for r in rows]
+
+def facet_summary(search, selected):
+    """Total matches and per-facet counts for the current search and selection.
+
+    `selected` maps facet name to the chosen values; an empty status
+    selection means 'available', as on the rest of the OPAC.
+    """
+    rows = facet_cache.get_or_load(normalize_search(search), lambda: _grouped_rows(search))
+
+    chosen = {name: set(_as_list(selected.get(name))) for name in FACETS}
+    if not chosen['status']:
+        chosen['status'] = {'available'}
+
+    counts = {name: Counter() for name in FACETS}
+    total = 0
+    for category, status, decade, publisher, count in rows:
+        values = {'category': category, 'status': status, 'decade': decade, 'publisher': publisher}
+        misses = [name for name in FACETS if chosen[name] and values[name] not in chosen[name]]
+
+        if not misses:
+            total += count
+        # A row counts towards a facet when it passes every other facet's selection
+        for name in FACETS:
+            if values[name] is not None and (not misses or misses == [name]):
+                counts[name][values[name]] += count
+
+    facets = {}
+    for name in FACETS:
+        if name == 'decade':
+            items = sorted(counts[name].items(), key=lambda item: int(item[0]), reverse=True)
+        elif name == 'publisher':
+            items = counts[name].most_common(MAX_PUBLISHER_VALUES)
+            listed = {value for value, _ in items}
+            items += [(value, counts[name][value]) for value in chosen[name] if value not in listed]
+        else:
+            items = sorted(counts[name].items())
+        facets[name] = [
+            {
+                'value': value,
+                'label': f'{value}s' if name == 'decade' else str(value).title() if name == 'status' else value,
+                'count': count,
+                'selected': value in chosen[name]
+            }
+            for value, count in items
+        ]
+
+    return total, facets
@@ -0,0 +1,105 @@
+"""
+CSV system backups for the Library Management System
+
+Writes the coordinated four-file system backup (categories, patrons,
+books, transactions) and its manifest straight from a stdlib sqlite3
+cursor. Rows are streamed to disk FETCH_SIZE at a time, so memory does
+not grow with the collection. All four tables are read inside one read
+transaction, so the set is consistent. The backup page and the
+start_server launcher share this writer. The manifest is what the
+complete restore reads.
+"""
+
+import csv
+import json
+import os
+import sqlite3
+from datetime import datetime
+from . import backup_catalog
+from .backup_paths import BACKUP_DIR
+
+FETCH_SIZE = 1000
+
+# (manifest type, table, description, dependencies) in import order
+SYSTEM_BACKUP_TABLES = [
+    ('categories', 'category', 'Book categories - import FIRST', []),
+    ('patrons', 'patrons', 'Library patrons - import SECOND', ['categories']),
+    ('books', 'books', 'Book collection - import THIRD', ['categories']),
+    ('transactions', 'transactions', 'Transaction history - import FOURTH', ['patrons', 'books'])
+]
+
+def write_table_csv(conn, table, path):
+    """Stream every row of table into a CSV file with a header row.
+
+    No file is written for an empty table. Returns the row count.
+    """
+    cursor = conn.execute(f'SELECT * FROM "{table}"')
+    rows = cursor.fetchmany(FETCH_SIZE)
+    if not rows:
+        return 0
+
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow([column[0] for column in cursor.description])
+        while rows:
+            writer.writerows(rows)
+            count += len(rows)
+            rows = cursor.fetchmany(FETCH_SIZE)
+    return count
+
+def create_system_backup(db_path, backup_dir=BACKUP_DIR):
+    """Write system_backup_<table>_<timestamp>.csv files and their manifest.
+
+    Returns the manifest dict.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute('BEGIN')
+        counts = {}
+        for file_type, table, _, _ in SYSTEM_BACKUP_TABLES:
+            counts[file_type] = write_table_csv(
+                conn, table, os.path.join(backup_dir, f'system_backup_{file_type}_{timestamp}.csv'))
+        conn.execute('COMMIT')
+    finally:
+        conn.close()
+
+    manifest_data = {
+        'backup_type': 'complete_system_backup',
+        'timestamp': timestamp,
+        'version': '1.0',
+        'total_files': len(SYSTEM_BACKUP_TABLES),
+        'files': [
+            {
+                'filename': f'system_backup_{file_type}_{timestamp}.csv',
+                'type': file_type,
+                'description': description,
+                'record_count': counts[file_type],
+                'import_order': order,
+                'dependencies': dependencies
+            }
+            for order, (file_type, _, description, dependencies) in enumerate(SYSTEM_BACKUP_TABLES, start=1)
+        ],
+        'restore_instructions': [
+            '1. Import categories first (creates foundation)',
+            '2. Import patrons second (needs categories for reference)',
+            '3. Import books third (needs categories for reference)',
+            '4. Import transactions last (needs patrons and books)',
+            '5. System will be fully restored and ready for use'
+        ],
+        'backup_summary': {f'total_{file_type}': counts[file_type] for file_type, _, _, _ in SYSTEM_BACKUP_TABLES}
+    }
+
+    manifest_file = f'system_backup_manifest_{timestamp}.json'
+    with open(os.path.join(backup_dir, manifest_file), 'w', encoding='utf-8') as f:
+        json.dump(manifest_data, f, indent=2, ensure_ascii=False)
+
+    # Empty tables are listed in the manifest but have no file
+    backup_catalog.record(
+        [{'filename': file_info['filename'], 'row_count': file_info['record_count']}
+         for file_info in manifest_data['files'] if file_info['record_count']]
+        + [{'filename': manifest_file}], backup_dir)
+    return manifest_data
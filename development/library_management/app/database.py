@@ -1,19 +1,45 @@
 """
 Database utility class for the Library Management System
 Provides database connection and backup functionality
+
+The database path is discovered once per process. Each thread gets one
+reusable connection, tuned with CONNECTION_PRAGMAS when it is opened.
+Tables are read through iter_table generators, which fetch batch_size
+rows at a time, so maintenance scripts and backups run in constant
+memory.
 """
 
 import sqlite3
 import os
 import sys
+import threading
 from flask import current_app
 
+# Applied to every connection when it is opened
+CONNECTION_PRAGMAS = {
+    'cache_size': -16000,      # 16 MB page cache
+    'temp_store': 'MEMORY',
+    'mmap_size': 268435456     # 256 MB memory-mapped reads
+}
+BUSY_TIMEOUT = 30
+DEFAULT_BATCH_SIZE = 1000
+
 class Database:
     """Database utility class with PyInstaller support"""
 
-    def __init__(self):
-        self.db_path = None
-        self._get_db_path()
+    _discovered_path = None
+    _discovery_lock = threading.Lock()
+
+    def __init__(self, db_path=None):
+        self._local = threading.local()
+        self.db_path = db_path
+        if not self.db_path:
+            # Path discovery touches the filesystem, so it runs once per process
+            with Database._discovery_lock:
+                if Database._discovered_path is None:
+                    self._get_db_path()
+                    Database._discovered_path = self.db_path
+                self.db_path = Database._discovered_path
 
     def _get_db_path(self):
         """Get database path with PyInstaller compatibility"""
@@ -64,14 +90,21 @@ class Database:
                     print(f"Created empty database file as fallback: {self.db_path}")
 
     def get_connection(self):
-        """Get database connection"""
+        """Get this thread's database connection, opening and tuning it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+
         try:
             if not self.db_path or not os.path.exists(self.db_path):
                 print(f"Database file not found at: {self.db_path}")
                 return None
 
-            conn = sqlite3.connect(self.db_path)
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT)
             conn.row_factory = sqlite3.Row  # Enable column access by name
+            for pragma, value in CONNECTION_PRAGMAS.items():
+                conn.execute(f"PRAGMA {pragma} = {value}")
+            self._local.conn = conn
             return conn
         except Exception as e:
             print(f"Error connecting to database: {e}")
@@ -82,15 +115,12 @@ class Database:
         conn = self.get_connection()
         if conn:
             try:
-                cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
-                tables = cursor.fetchall()
-                print(f"✅ Database connected successfully. Found {len(tables)} tables.")
+                count = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type='table'").fetchone()[0]
+                print(f"✅ Database connected successfully. Found {count} tables.")
                 return True
             except Exception as e:
                 print(f"❌ Database connection test failed: {e}")
                 return False
-            finally:
-                conn.close()
         return False
 
     def get_table_names(self):
@@ -98,48 +128,63 @@ class Database:
         conn = self.get_connection()
         if conn:
             try:
-                cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
-                tables = [row[0] for row in cursor.fetchall()]
-                return tables
+                cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
+                return [row[0] for row in cursor]
             except Exception as e:
                 print(f"Error getting table names: {e}")
                 return []
-            finally:
-                conn.close()
         return []
 
-    def backup_table(self, table_name):
-        """Backup a specific table"""
-        conn = self.get_connection()
-        if conn:
-            try:
-                cursor = conn.execute(f"SELECT * FROM {table_name}")
-                rows = cursor.fetchall()
-                columns = [description[0] for description in cursor.description]
-                return {
-                    'columns': columns,
-                    'rows': rows,
-                    'count': len(rows)
-                }
-            except Exception as e:
-                print(f"Error backing up table {table_name}: {e}")
-                return None
-            finally:
-                conn.close()
-        return None
-
-    def backup_all_tables(self):
-        """Backup all tables in the database"""
-        tables = self.get_table_names()
-        backup_data = {}
-
-        for table in tables:
-            backup_data[table] = self.backup_table(table)
+    def _checked_table(self, table_name):
+        """table_name quoted for SQL, after checking that the table exists"""
+        if table_name not in self.get_table_names():
+            raise ValueError(f"Unknown table: {table_name}")
+        return '"' + table_name + '"'
+
+    def table_columns(self, table_name):
+        """Column names of a table"""
+        table = self._checked_table(table_name)
+        return [row[1] for row in self.get_connection().execute(f"PRAGMA table_info({table})")]
+
+    def count_rows(self, table_name):
+        """Number of rows in a table"""
+        table = self._checked_table(table_name)
+        return self.get_connection().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def iter_table(self, table_name, batch_size=DEFAULT_BATCH_SIZE):
+        """Yield every row of a table, fetching batch_size rows at a time"""
+        table = self._checked_table(table_name)
+        cursor = self.get_connection().execute(f"SELECT * FROM {table}")
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
+    def backup_table(self, table_name, batch_size=DEFAULT_BATCH_SIZE):
+        """Backup a specific table; rows is a generator that streams the table"""
+        try:
+            return {
+                'columns': self.table_columns(table_name),
+                'rows': self.iter_table(table_name, batch_size),
+                'count': self.count_rows(table_name)
+            }
+        except Exception as e:
+            print(f"Error backing up table {table_name}: {e}")
+            return None
 
-        return backup_data
+    def backup_all_tables(self, batch_size=DEFAULT_BATCH_SIZE):
+        """Backup all tables in the database; each table's rows are streamed when iterated"""
+        return {table: self.backup_table(table, batch_size) for table in self.get_table_names()}
 
-    def close_connection(self, conn):
-        """Close database connection"""
+    def close_connection(self, conn=None):
+        """Close this thread's connection (or the given one); the next call reopens it"""
+        conn = conn or getattr(self._local, 'conn', None)
+        if conn is getattr(self._local, 'conn', None):
+            self._local.conn = None
         if conn:
             try:
                 conn.close()
@@ -0,0 +1,60 @@
+"""
+ISBN and accession number normalization for the Library Management System
+
+Books store isbn and accession_number free-form. The normalized forms kept
+in books.isbn13 and books.accession_norm let searches that are clearly an
+identifier use a single index seek instead of the LIKE text search. This
+module has no Flask imports so migration scripts can use it directly.
+"""
+
+import re
+
+_ISBN_PREFIX = re.compile(r'^\s*ISBN(?:-1[03])?:?\s*', re.IGNORECASE)
+_ISBN_SHAPED = re.compile(r'^(?:ISBN(?:-1[03])?:?\s*)?[0-9Xx][0-9Xx\s-]*$', re.IGNORECASE)
+_ACCESSION_SEPARATORS = re.compile(r'[\s\-_/.]')
+
+def isbn13_check_digit(first12):
+    """ISBN-13 check digit for a 12-digit prefix"""
+    total = sum((1 if i % 2 == 0 else 3) * int(d) for i, d in enumerate(first12))
+    return str((10 - total % 10) % 10)
+
+def normalize_isbn(value):
+    """Return the 13-digit form of an ISBN-10 or ISBN-13 (None if it is neither)"""
+    if not value:
+        return None
+    digits = re.sub(r'[\s-]', '', _ISBN_PREFIX.sub('', str(value))).upper()
+    if re.fullmatch(r'97[89]\d{10}', digits):
+        return digits
+    if re.fullmatch(r'\d{9}[\dX]', digits):
+        core = '978' + digits[:9]
+        return core + isbn13_check_digit(core)
+    return None
+
+def normalize_accession(value):
+    """Uppercase an accession number and drop spaces and separators"""
+    if not value:
+        return None
+    normalized = _ACCESSION_SEPARATORS.sub('', str(value)).upper()
+    return normalized or None
+
+def classify_query(search):
+    """Identifier lookups a search string could be, as {column: normalized value}.
+
+    ISBN-shaped input yields an isbn13 candidate, and any single token
+    containing a digit yields an accession_norm candidate. Free text
+    yields an empty dict.
+    """
+    search = (search or '').strip()
+    candidates = {}
+    if not search:
+        return candidates
+
+    if _ISBN_SHAPED.match(search):
+        isbn = normalize_isbn(search)
+        if isbn:
+            candidates['isbn13'] = isbn
+
+    if len(search) <= 50 and not re.search(r'\s', search) and any(c.isdigit() for c in search):
+        candidates['accession_norm'] = normalize_accession(search)
+
+    return candidates
@@ -0,0 +1,240 @@
+"""
+Fines and payments ledger for the Library Management System
+
+Every fine event is appended to the fine_ledger table and applied to the
+patron's row in patron_balances inside the same database transaction, so
+"how much does this patron owe" is a primary-key lookup instead of a scan
+over transactions. Functions take an open SQLAlchemy connection and leave
+committing to the caller, matching the route code that uses
+`with db.engine.connect() as conn: ... conn.commit()`.
+"""
+
+from datetime import datetime, date, timedelta
+from sqlalchemy import text
+
+ENTRY_TYPES = ('assessment', 'payment', 'waiver')
+
+def _timestamp():
+    """Current local time in the format SQLite date functions understand"""
+    return datetime.now().isoformat(sep=' ', timespec='seconds')
+
+def record_entry(conn, patron_id, entry_type, amount, transaction_id=None, recorded_by=None, note=None):
+    """Append a ledger entry and apply it to the patron's running balance"""
+    if entry_type not in ENTRY_TYPES:
+        raise ValueError(f'Unknown ledger entry type: {entry_type}')
+
+    amount = round(float(amount or 0), 2)
+    if amount <= 0:
+        raise ValueError('Ledger amounts must be positive')
+
+    now = _timestamp()
+    conn.execute(text('''
+        INSERT INTO fine_ledger (patron_id, transaction_id, entry_type, amount, note, recorded_by, created_at)
+        VALUES (:patron_id, :transaction_id, :entry_type, :amount, :note, :recorded_by, :created_at)
+    '''), {
+        'patron_id': patron_id,
+        'transaction_id': transaction_id,
+        'entry_type': entry_type,
+        'amount': amount,
+        'note': note,
+        'recorded_by': recorded_by,
+        'created_at': now
+    })
+
+    # Apply the entry to the running balance in the same database transaction
+    conn.execute(text('''
+        INSERT INTO patron_balances (patron_id, balance, total_assessed, total_paid, total_waived, updated_at)
+        VALUES (:patron_id, :delta, :assessed, :paid, :waived, :updated_at)
+        ON CONFLICT(patron_id) DO UPDATE SET
+            balance = balance + excluded.balance,
+            total_assessed = total_assessed + excluded.total_assessed,
+            total_paid = total_paid + excluded.total_paid,
+            total_waived = total_waived + excluded.total_waived,
+            updated_at = excluded.updated_at
+    '''), {
+        'patron_id': patron_id,
+        'delta': amount if entry_type == 'assessment' else -amount,
+        'assessed': amount if entry_type == 'assessment' else 0.0,
+        'paid': amount if entry_type == 'payment' else 0.0,
+        'waived': amount if entry_type == 'waiver' else 0.0,
+        'updated_at': now
+    })
+
+def record_assessment(conn, patron_id, amount, transaction_id=None, recorded_by=None, note=None):
+    """Record a fine charged to a patron"""
+    record_entry(conn, patron_id, 'assessment', amount, transaction_id, recorded_by, note)
+
+def record_payment(conn, patron_id, amount, transaction_id=None, recorded_by=None, note=None):
+    """Record cash collected from a patron"""
+    record_entry(conn, patron_id, 'payment', amount, transaction_id, recorded_by, note)
+
+def record_waiver(conn, patron_id, amount, transaction_id=None, recorded_by=None, note=None):
+    """Record a fine written off by a librarian"""
+    record_entry(conn, patron_id, 'waiver', amount, transaction_id, recorded_by, note)
+
+def get_balance(conn, patron_id):
+    """Get a patron's outstanding balance (primary-key lookup)"""
+    row = conn.execute(text('SELECT balance FROM patron_balances WHERE patron_id = :patron_id'),
+                       {'patron_id': patron_id}).fetchone()
+    return float(row[0]) if row else 0.0
+
+def get_balance_summary(conn, patron_id):
+    """Get a patron's balance with assessed/paid/waived totals"""
+    row = conn.execute(text('''
+        SELECT balance, total_assessed, total_paid, total_waived
+        FROM patron_balances WHERE patron_id = :patron_id
+    '''), {'patron_id': patron_id}).fetchone()
+    if not row:
+        return {'balance': 0.0, 'total_assessed': 0.0, 'total_paid': 0.0, 'total_waived': 0.0}
+    return {
+        'balance': float(row[0]),
+        'total_assessed': float(row[1]),
+        'total_paid': float(row[2]),
+        'total_waived': float(row[3])
+    }
+
+def cash_report(conn, start_date, end_date):
+    """Per-day ledger totals between two dates (inclusive).
+
+    Filters on a created_at range rather than strftime(created_at) so the
+    ix_fine_ledger_created_at index is used.
+    """
+    if isinstance(start_date, str):
+        start_date = date.fromisoformat(start_date)
+    if isinstance(end_date, str):
+        end_date = date.fromisoformat(end_date)
+
+    rows = conn.execute(text('''
+        SELECT substr(created_at, 1, 10) as day, entry_type, COUNT(*) as entries, SUM(amount) as total
+        FROM fine_ledger
+        WHERE created_at >= :start AND created_at < :end
+        GROUP BY day, entry_type
+        ORDER BY day
+    '''), {
+        'start': start_date.isoformat(),
+        'end': (end_date + timedelta(days=1)).isoformat()
+    }).fetchall()
+
+    days = {}
+    for row in rows:
+        day = days.setdefault(row.day, {
+            'date': row.day,
+            'assessment': 0.0, 'payment': 0.0, 'waiver': 0.0,
+            'assessment_count': 0, 'payment_count': 0, 'waiver_count': 0
+        })
+        day[row.entry_type] = float(row.total or 0)
+        day[f'{row.entry_type}_count'] = row.entries
+    return list(days.values())
+
+def rebuild_balances(conn):
+    """Recompute every patron_balances row from the ledger in one pass"""
+    conn.execute(text('DELETE FROM patron_balances'))
+    conn.execute(text('''
+        INSERT INTO patron_balances (patron_id, balance, total_assessed, total_paid, total_waived, updated_at)
+        SELECT patron_id,
+               SUM(CASE WHEN entry_type = 'assessment' THEN amount ELSE -amount END),
+               SUM(CASE WHEN entry_type = 'assessment' THEN amount ELSE 0 END),
+               SUM(CASE WHEN entry_type = 'payment' THEN amount ELSE 0 END),
+               SUM(CASE WHEN entry_type = 'waiver' THEN amount ELSE 0 END),
+               :now
+        FROM fine_ledger
+        GROUP BY patron_id
+    '''), {'now': _timestamp()})
+
+def backfill_from_transactions(conn):
+    """Seed the ledger from existing transactions, then rebuild balances.
+
+    Each fined transaction gets an assessment dated on its return date, and
+    paid ones also get a payment unless the ledger already settles them with
+    a payment or waiver. Transactions already present in the ledger are
+    skipped, so the backfill can be re-run safely (e.g. after an import).
+    It only adds entries; reconcile_with_transactions() also corrects them.
+    """
+    assessed = conn.execute(text('''
+        INSERT INTO fine_ledger (patron_id, transaction_id, entry_type, amount, note, recorded_by, created_at)
+        SELECT t.patron_id, t.id, 'assessment', t.fine_amount, 'Backfilled from transactions', NULL,
+               COALESCE(t.return_date, t.updated_at, t.created_at, CURRENT_TIMESTAMP)
+        FROM transactions t
+        WHERE t.fine_amount > 0
+          AND NOT EXISTS (SELECT 1 FROM fine_ledger l WHERE l.transaction_id = t.id AND l.patron_id = t.patron_id
+                          AND l.entry_type = 'assessment')
+    ''')).rowcount
+
+    paid = conn.execute(text('''
+        INSERT INTO fine_ledger (patron_id, transaction_id, entry_type, amount, note, recorded_by, created_at)
+        SELECT t.patron_id, t.id, 'payment', t.fine_amount, 'Backfilled from transactions', NULL,
+               COALESCE(t.updated_at, t.return_date, t.created_at, CURRENT_TIMESTAMP)
+        FROM transactions t
+        WHERE t.fine_amount > 0 AND t.fine_paid = 1
+          AND NOT EXISTS (SELECT 1 FROM fine_ledger l WHERE l.transaction_id = t.id AND l.patron_id = t.patron_id
+                          AND l.entry_type IN ('payment', 'waiver'))
+    ''')).rowcount
+
+    rebuild_balances(conn)
+    return {'assessments': assessed, 'payments': paid}
+
+def backfill_if_empty(conn):
+    """Backfill a ledger that has never been filled, e.g. on first start after upgrading.
+
+    Returns backfill_from_transactions()'s result, or None when the ledger
+    already has entries or no transaction carries a fine.
+    """
+    if conn.execute(text('SELECT 1 FROM fine_ledger LIMIT 1')).first():
+        return None
+    if not conn.execute(text('SELECT 1 FROM transactions WHERE fine_amount > 0 LIMIT 1')).first():
+        return None
+    return backfill_from_transactions(conn)
+
+def reconcile_with_transactions(conn):
+    """Bring the ledger in line with transactions rewritten by a restore.
+
+    For each (patron, transaction) the ledger should hold the fine_amount
+    as assessed and, when fine_paid is set, as settled. Entries are never
+    changed or deleted: a difference is written as a compensating entry
+    dated now, negative when the ledger holds more than the restored data
+    (e.g. a payment recorded after the backup was taken). Entries for a
+    transaction that no longer exists, or now belongs to another patron,
+    are cancelled the same way. Returns the number of entries written.
+    """
+    targets = {}
+    for row in conn.execute(text('SELECT patron_id, id, fine_amount, fine_paid FROM transactions WHERE fine_amount > 0')):
+        amount = round(float(row.fine_amount), 2)
+        targets[(row.patron_id, row.id)] = (amount, amount if row.fine_paid else 0.0)
+
+    held = {}
+    for row in conn.execute(text('''
+        SELECT patron_id, transaction_id,
+               SUM(CASE WHEN entry_type = 'assessment' THEN amount ELSE 0 END) as assessed,
+               SUM(CASE WHEN entry_type = 'payment' THEN amount ELSE 0 END) as paid,
+               SUM(CASE WHEN entry_type = 'waiver' THEN amount ELSE 0 END) as waived
+        FROM fine_ledger
+        WHERE transaction_id IS NOT NULL
+        GROUP BY patron_id, transaction_id
+    ''')):
+        held[(row.patron_id, row.transaction_id)] = (float(row.assessed), float(row.paid), float(row.waived))
+
+    entries = []
+    for patron_id, transaction_id in targets.keys() | held.keys():
+        assess_target, settle_target = targets.get((patron_id, transaction_id), (0.0, 0.0))
+        assessed, paid, waived = held.get((patron_id, transaction_id), (0.0, 0.0, 0.0))
+        changes = [('assessment', assess_target - assessed)]
+        settle_change = settle_target - paid - waived
+        if settle_change > 0:
+            changes.append(('payment', settle_change))
+        else:
+            # Cancel waivers before cash payments
+            waiver_change = max(settle_change, -waived)
+            changes += [('waiver', waiver_change), ('payment', settle_change - waiver_change)]
+        for entry_type, amount in changes:
+            amount = round(amount, 2)
+            if amount:
+                entries.append({'patron_id': patron_id, 'transaction_id': transaction_id,
+                                'entry_type': entry_type, 'amount': amount, 'created_at': _timestamp()})
+
+    if entries:
+        conn.execute(text('''
+            INSERT INTO fine_ledger (patron_id, transaction_id, entry_type, amount, note, recorded_by, created_at)
+            VALUES (:patron_id, :transaction_id, :entry_type, :amount, 'Restore adjustment', NULL, :created_at)
+        '''), entries)
+    rebuild_balances(conn)
+    return len(entries)
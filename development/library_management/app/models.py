@@ -5,9 +5,12 @@ Database models for the Enhanced Library Management System
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event, DDL
 from datetime import datetime, date
 import json
 from .db import db
+from .cache import TTLCache, bump_version
+from .identifiers import normalize_isbn, normalize_accession
 
 class User(db.Model, UserMixin):
     """User model for authentication (Admin/Librarian)"""
@@ -128,6 +131,8 @@ class Book(db.Model):
     publication_year = db.Column(db.Integer)
     accession_number = db.Column(db.String(50), unique=True, nullable=False)
     call_number = db.Column(db.String(50))  # Library call number (e.g., '669 TAY', '668.9 TAD')
+    isbn13 = db.Column(db.String(13), index=True)  # normalized ISBN, set from isbn on write
+    accession_norm = db.Column(db.String(50), index=True)  # normalized accession_number, set on write
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
     status = db.Column(db.String(20), default='available')  # available, issued, lost, damaged
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -142,12 +147,19 @@ class Book(db.Model):
     def is_available(self):
         return self.status == 'available'
 
+@event.listens_for(Book, 'before_insert')
+@event.listens_for(Book, 'before_update')
+def _normalize_book_identifiers(mapper, connection, book):
+    """Keep the normalized lookup columns in step with isbn and accession_number"""
+    book.isbn13 = normalize_isbn(book.isbn)
+    book.accession_norm = normalize_accession(book.accession_number)
+
 class Transaction(db.Model):
     """Book issue/return transactions"""
     __tablename__ = 'transactions'  # Explicitly set table name to match existing queries
     id = db.Column(db.Integer, primary_key=True)
-    patron_id = db.Column(db.Integer, db.ForeignKey('patrons.id'), nullable=False)
-    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False)
+    patron_id = db.Column(db.Integer, db.ForeignKey('patrons.id'), nullable=False, index=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False, index=True)
     issue_date = db.Column(db.Date, nullable=False)
     due_date = db.Column(db.Date, nullable=False)
     return_date = db.Column(db.Date)
@@ -215,6 +227,241 @@ class Transaction(db.Model):
             print(f"DEBUG: Transaction {self.id} error in is_overdue: {e}, due_date: {self.due_date}, type: {type(self.due_date)}")
             return False
 
+# Partial index backing the outstanding fines page and its summary statistics
+db.Index(
+    'ix_transactions_outstanding_fines',
+    Transaction.fine_amount.desc(),
+    Transaction.id.desc(),
+    sqlite_where=db.and_(
+        Transaction.fine_paid == False,
+        Transaction.status == 'returned',
+        Transaction.fine_amount > 0
+    )
+)
+
+# Keep fine_amount a REAL on every write path (raw SQL, CSV restores), so no ''
+# or NULL values reach the outstanding fines index or its aggregates
+FINE_AMOUNT_NORMALIZE_SQL = "COALESCE(CAST(NULLIF(TRIM(NEW.fine_amount), '') AS REAL), 0.0)"
+FINE_AMOUNT_TRIGGERS = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_fine_amount_insert
+    AFTER INSERT ON transactions
+    WHEN NEW.fine_amount IS NULL OR typeof(NEW.fine_amount) != 'real'
+    BEGIN
+        UPDATE transactions SET fine_amount = {FINE_AMOUNT_NORMALIZE_SQL} WHERE id = NEW.id;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_fine_amount_update
+    AFTER UPDATE OF fine_amount ON transactions
+    WHEN NEW.fine_amount IS NULL OR typeof(NEW.fine_amount) != 'real'
+    BEGIN
+        UPDATE transactions SET fine_amount = {FINE_AMOUNT_NORMALIZE_SQL} WHERE id = NEW.id;
+    END
+    '''
+]
+
+for _trigger_sql in FINE_AMOUNT_TRIGGERS:
+    event.listen(Transaction.__table__, 'after_create', DDL(_trigger_sql).execute_if(dialect='sqlite'))
+
+class FineLedgerEntry(db.Model):
+    """Append-only ledger of fine assessments, payments and waivers"""
+    __tablename__ = 'fine_ledger'
+
+    id = db.Column(db.Integer, primary_key=True)
+    patron_id = db.Column(db.Integer, db.ForeignKey('patrons.id'), nullable=False, index=True)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transactions.id'), index=True)
+    entry_type = db.Column(db.String(20), nullable=False)  # assessment, payment, waiver
+    amount = db.Column(db.Float, nullable=False)  # positive, except restore adjustments; entry_type gives the sign
+    note = db.Column(db.String(200))
+    recorded_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)  # local time, like issue/return dates
+
+    def __repr__(self):
+        return f'<FineLedgerEntry {self.id}: {self.entry_type} {self.amount} for Patron {self.patron_id}>'
+
+# The ledger is append-only: corrections are new entries, never edits
+FINE_LEDGER_TRIGGERS = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_fine_ledger_no_update
+    BEFORE UPDATE ON fine_ledger
+    BEGIN
+        SELECT RAISE(ABORT, 'fine_ledger is append-only');
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_fine_ledger_no_delete
+    BEFORE DELETE ON fine_ledger
+    BEGIN
+        SELECT RAISE(ABORT, 'fine_ledger is append-only');
+    END
+    '''
+]
+
+for _trigger_sql in FINE_LEDGER_TRIGGERS:
+    event.listen(FineLedgerEntry.__table__, 'after_create', DDL(_trigger_sql).execute_if(dialect='sqlite'))
+
+class PatronBalance(db.Model):
+    """Running fine balance per patron, maintained incrementally from the ledger"""
+    __tablename__ = 'patron_balances'
+
+    patron_id = db.Column(db.Integer, db.ForeignKey('patrons.id'), primary_key=True, autoincrement=False)
+    balance = db.Column(db.Float, nullable=False, default=0.0)
+    total_assessed = db.Column(db.Float, nullable=False, default=0.0)
+    total_paid = db.Column(db.Float, nullable=False, default=0.0)
+    total_waived = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return f'<PatronBalance {self.patron_id}: {self.balance}>'
+
+class CacheVersion(db.Model):
+    """Shared version counters used to invalidate per-worker caches"""
+    __tablename__ = 'cache_versions'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CacheVersion {self.name}: {self.version}>'
+
+class CatalogChange(db.Model):
+    """Change feed of book and category edits, filled by triggers"""
+    __tablename__ = 'catalog_changes'
+
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)  # book, category
+    entity_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)  # insert, update, delete
+    changed_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+
+    def __repr__(self):
+        return f'<CatalogChange {self.entity} {self.entity_id} {self.op}>'
+
+# Installed by install_triggers() once create_all has created books and category
+CATALOG_CHANGE_TRIGGERS = []
+for _table, _entity, _columns in (('books', 'book', 'title, author, category_id'),
+                                  ('category', 'category', 'name, is_active')):
+    CATALOG_CHANGE_TRIGGERS += [
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{_table}_catalog_insert
+        AFTER INSERT ON {_table}
+        BEGIN
+            INSERT INTO catalog_changes (entity, entity_id, op) VALUES ('{_entity}', NEW.id, 'insert');
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{_table}_catalog_update
+        AFTER UPDATE OF {_columns} ON {_table}
+        BEGIN
+            INSERT INTO catalog_changes (entity, entity_id, op) VALUES ('{_entity}', NEW.id, 'update');
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{_table}_catalog_delete
+        AFTER DELETE ON {_table}
+        BEGIN
+            INSERT INTO catalog_changes (entity, entity_id, op) VALUES ('{_entity}', OLD.id, 'delete');
+        END
+        '''
+    ]
+
+# The feed keeps the last CATALOG_CHANGES_KEPT changes for the per-worker
+# suggestion indexes, which rebuild if they fall further behind, and never
+# drops a change the trigram index has not applied ('trigram_index' in
+# cache_versions; nothing is trimmed while that index is being built)
+CATALOG_CHANGES_KEPT = 10000
+CATALOG_CHANGE_TRIGGERS.append(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_catalog_changes_trim
+    AFTER INSERT ON catalog_changes
+    BEGIN
+        DELETE FROM catalog_changes
+        WHERE id <= MIN(NEW.id - {CATALOG_CHANGES_KEPT},
+                        COALESCE((SELECT version FROM cache_versions WHERE name = 'trigram_index'), 0));
+    END
+    ''')
+
+class BookTrigram(db.Model):
+    """Trigram postings over book titles and authors for fuzzy search"""
+    __tablename__ = 'book_trigrams'
+    __table_args__ = (
+        db.Index('ix_book_trigrams_book_id', 'book_id'),
+        {'sqlite_with_rowid': False}
+    )
+
+    trigram = db.Column(db.String(3), primary_key=True)
+    book_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+    def __repr__(self):
+        return f'<BookTrigram {self.trigram!r} {self.book_id}>'
+
+class RowTombstone(db.Model):
+    """Deleted row ids, recorded by triggers so incremental backups can replay deletes"""
+    __tablename__ = 'row_tombstones'
+
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(50), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, server_default=db.func.current_timestamp(), index=True)
+
+    def __repr__(self):
+        return f'<RowTombstone {self.table_name} {self.row_id}>'
+
+# Incremental backups select rows by updated_at, so stamp it on raw-SQL writes
+# that leave it unchanged (ORM writes already set it via onupdate). Stamps are
+# UTC like datetime.utcnow(). Installed by install_triggers(), like the catalog
+# feed, once create_all has created the tables they fire on.
+ROW_STAMP_SQL = "strftime('%%Y-%%m-%%d %%H:%%M:%%f', 'now')"  # % is doubled for DDL()
+ROW_CHANGE_TRIGGERS = []
+for _table in ('books', 'patrons', 'transactions', 'library_settings'):
+    ROW_CHANGE_TRIGGERS += [
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{_table}_stamp_insert
+        AFTER INSERT ON {_table}
+        WHEN NEW.updated_at IS NULL
+        BEGIN
+            UPDATE {_table} SET updated_at = {ROW_STAMP_SQL} WHERE id = NEW.id;
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{_table}_stamp_update
+        AFTER UPDATE ON {_table}
+        WHEN NEW.updated_at IS OLD.updated_at
+        BEGIN
+            UPDATE {_table} SET updated_at = {ROW_STAMP_SQL} WHERE id = NEW.id;
+        END
+        '''
+    ]
+for _table in ('category', 'users', 'patrons', 'books', 'transactions'):
+    ROW_CHANGE_TRIGGERS.append(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{_table}_tombstone
+        AFTER DELETE ON {_table}
+        BEGIN
+            INSERT INTO row_tombstones (table_name, row_id) VALUES ('{_table}', OLD.id);
+        END
+    ''')
+
+class ImportBatch(db.Model):
+    """An uploaded import file staged for validation, committed later by its id"""
+    __tablename__ = 'import_batches'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid hex; also names the staging table
+    import_type = db.Column(db.String(20), nullable=False)  # patrons, books, transactions, categories
+    filename = db.Column(db.String(255))
+    status = db.Column(db.String(20), nullable=False, default='staged')  # staged, imported, expired
+    total_rows = db.Column(db.Integer, default=0)
+    valid_rows = db.Column(db.Integer, default=0)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<ImportBatch {self.id}: {self.import_type} {self.status}>'
+
+SETTINGS_VERSION = 'settings'
+
+# Every setting, read once per worker and dropped when any setting changes
+settings_cache = TTLCache('settings', maxsize=1, ttl=3600, version_key=SETTINGS_VERSION)
+
 class LibrarySettings(db.Model):
     """Library configuration settings"""
     id = db.Column(db.Integer, primary_key=True)
@@ -223,17 +470,32 @@ class LibrarySettings(db.Model):
     description = db.Column(db.String(200))
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    @staticmethod
+    def _load_snapshot():
+        snapshot = {}
+        for setting in LibrarySettings.query.all():
+            try:
+                snapshot[setting.setting_key] = json.loads(setting.setting_value)
+            except:
+                snapshot[setting.setting_key] = setting.setting_value
+        return snapshot
+
+    @staticmethod
+    def snapshot():
+        """Every setting as {key: value}, from the per-worker settings cache"""
+        return settings_cache.get_or_load('all', LibrarySettings._load_snapshot)
+
+    @staticmethod
+    def invalidate():
+        """Drop the cached settings here and in every other worker"""
+        settings_cache.clear()
+        bump_version(SETTINGS_VERSION)
+
     @staticmethod
     def get_setting(key, default=None):
         """Get setting value by key"""
         try:
-            setting = LibrarySettings.query.filter_by(setting_key=key).first()
-            if setting:
-                try:
-                    return json.loads(setting.setting_value)
-                except:
-                    return setting.setting_value
-            return default
+            return LibrarySettings.snapshot().get(key, default)
         except Exception:
             # Fallback to default if database query fails
             return default
@@ -255,6 +517,7 @@ class LibrarySettings(db.Model):
                 )
                 db.session.add(new_setting)
             db.session.commit()
+            LibrarySettings.invalidate()
         except Exception as e:
             print(f"Warning: Could not save setting {key}: {e}")
             # Don't raise exception - allow system to continue
@@ -280,3 +543,19 @@ class LibrarySettings(db.Model):
 
     def __repr__(self):
         return f'<LibrarySettings {self.setting_key}>'
+
+def install_triggers():
+    """Create the triggers that fire on tables other than their own.
+
+    Call after db.create_all(). The change feed and row change triggers
+    fire on books, patrons, transactions and the other source tables,
+    which a fresh database does not have yet when create_all creates
+    catalog_changes and row_tombstones; CREATE TRIGGER IF NOT EXISTS also
+    adds them to databases created before the triggers existed. The
+    feed's own trim trigger is installed with them.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return
+    with db.engine.begin() as conn:
+        for trigger_sql in CATALOG_CHANGE_TRIGGERS + ROW_CHANGE_TRIGGERS:
+            conn.execute(DDL(trigger_sql))
@@ -0,0 +1,237 @@
+"""
+Async serving path for the OPAC
+
+OpacASGI is an ASGI application around the OPAC Flask app, to be run by
+an ASGI server (uvicorn) instead of gunicorn's threads:
+
+- Anonymous GETs of pages already in the OPAC page cache are answered on
+  the event loop from the cache itself, with the same ETag, Last-Modified
+  and 304 handling as cache_anonymous_page, without a thread or a
+  database round trip.
+- Every other request runs the Flask app on a bounded pool of
+  OPAC_DB_THREADS threads; the request body is read and the response
+  sent by the event loop, so a slow client holds a coroutine, not a
+  thread. More than MAX_PENDING requests waiting for the pool are
+  turned away with a 503.
+
+The page cache's version counter is checked from the pool every
+version_check_interval seconds, so pages dropped by another worker's
+invalidate_catalog() stop being served as quickly as under WSGI.
+"""
+
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+from werkzeug.http import http_date, is_resource_modified, parse_cookie, quote_etag
+from werkzeug.utils import get_content_type
+from .page_cache import page_cache, page_key
+
+MAX_PENDING = 1000
+MAX_BODY_BYTES = 1024 * 1024
+
+def _latin1(value):
+    return value.encode('utf-8').decode('latin-1')
+
+class OpacASGI:
+    """ASGI front for the OPAC WSGI app"""
+
+    def __init__(self, app, threads=None, max_pending=MAX_PENDING):
+        self.app = app
+        self.threads = threads or int(os.getenv('OPAC_DB_THREADS', '8'))
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix='opac')
+        self._pending = 0
+        self._refresher = None
+
+        self.cache_hits = 0
+        self.rejected = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise RuntimeError(f"unsupported ASGI scope type {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._start_refresher()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._refresher:
+                    self._refresher.cancel()
+                self._executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # Page cache fast path
+
+    def _start_refresher(self):
+        if self._refresher is None:
+            self._refresher = asyncio.get_running_loop().create_task(self._refresh_page_cache())
+
+    def _sync_page_cache(self):
+        with self.app.app_context():
+            page_cache.sync_version()
+
+    async def _refresh_page_cache(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(self._executor, self._sync_page_cache)
+            except Exception as e:
+                print(f"Error checking the OPAC page cache version: {e}")
+            await asyncio.sleep(page_cache.version_check_interval)
+
+    def _cached_page(self, scope, headers):
+        """The cached page for an anonymous GET, or None"""
+        if scope['method'] not in ('GET', 'HEAD') or not self.app.config.get('OPAC_PAGE_CACHE', True):
+            return None
+        # Any session may hold a login or flash messages, which the page cache never serves
+        if self.app.config['SESSION_COOKIE_NAME'] in parse_cookie(headers.get('HTTP_COOKIE', '')):
+            return None
+        args = parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True,
+                         errors='werkzeug.url_quote')
+        return page_cache.get(page_key(self._path_info(scope), args), sync=False)
+
+    async def _send_cached(self, scope, headers, page, send):
+        conditions = {'REQUEST_METHOD': 'GET', **headers}
+        etag = quote_etag(page.etag)
+        response_headers = [
+            (b'etag', etag.encode('latin-1')),
+            (b'last-modified', http_date(page.last_modified).encode('latin-1')),
+            (b'cache-control', b'public, no-cache'),
+            # The page is only for visitors without a session, as the Flask path's Vary says
+            (b'vary', b'Cookie')
+        ]
+        if not is_resource_modified(conditions, etag=page.etag, last_modified=page.last_modified):
+            await send({'type': 'http.response.start', 'status': 304, 'headers': response_headers})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        response_headers += [
+            (b'content-type', get_content_type(page.mimetype, 'utf-8').encode('latin-1')),
+            (b'content-length', str(len(page.body)).encode('latin-1'))
+        ]
+        await send({'type': 'http.response.start', 'status': 200, 'headers': response_headers})
+        await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else page.body})
+
+    # WSGI on the thread pool
+
+    @staticmethod
+    def _path_info(scope):
+        path = scope['path']
+        root_path = scope.get('root_path', '')
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        return '/' + path.lstrip('/')
+
+    def _environ(self, scope, headers, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': _latin1(scope.get('root_path', '')),
+            'PATH_INFO': _latin1(self._path_info(scope)),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False
+        }
+        environ.update(headers)
+        if 'HTTP_CONTENT_TYPE' in environ:
+            environ['CONTENT_TYPE'] = environ.pop('HTTP_CONTENT_TYPE')
+        if 'HTTP_CONTENT_LENGTH' in environ:
+            environ['CONTENT_LENGTH'] = environ.pop('HTTP_CONTENT_LENGTH')
+        return environ
+
+    def _run_wsgi(self, environ):
+        """Run the Flask app to completion; returns (status, headers, body)"""
+        response = {}
+        chunks = []
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = headers
+            return chunks.append
+
+        app_iter = self.app(environ, start_response)
+        try:
+            for chunk in app_iter:
+                chunks.append(chunk)
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+        return response['status'], response['headers'], b''.join(chunks)
+
+    async def _read_body(self, receive):
+        """The whole request body; None if the client went away, False if it is too large"""
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            body += message.get('body', b'')
+            if len(body) > MAX_BODY_BYTES:
+                return False
+            if not message.get('more_body'):
+                return bytes(body)
+
+    async def _send_plain(self, send, status, text, extra_headers=()):
+        body = text.encode('utf-8')
+        await send({'type': 'http.response.start', 'status': status, 'headers': [
+            (b'content-type', b'text/plain; charset=utf-8'),
+            (b'content-length', str(len(body)).encode('latin-1')), *extra_headers]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _http(self, scope, receive, send):
+        self._start_refresher()
+        headers = {}
+        for name, value in scope['headers']:
+            key = 'HTTP_' + name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            headers[key] = f'{headers[key]},{value}' if key in headers else value
+
+        page = self._cached_page(scope, headers)
+        if page is not None:
+            self.cache_hits += 1
+            await self._send_cached(scope, headers, page, send)
+            return
+
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            await self._send_plain(send, 503, 'The catalog is busy. Please try again in a moment.',
+                                   [(b'retry-after', b'1')])
+            return
+
+        body = await self._read_body(receive)
+        if body is None:
+            return
+        if body is False:
+            await self._send_plain(send, 413, 'Request body too large.')
+            return
+
+        self._pending += 1
+        try:
+            status, response_headers, response_body = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._run_wsgi, self._environ(scope, headers, body))
+        finally:
+            self._pending -= 1
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': [
+            (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response_headers]})
+        await send({'type': 'http.response.body', 'body': response_body})
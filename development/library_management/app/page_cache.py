@@ -0,0 +1,75 @@
+"""
+HTTP response cache for anonymous OPAC pages
+
+Public catalog pages only change when books, categories, loans or library
+settings change. Rendered bodies of anonymous GETs are kept in a per-worker
+LRU cache (capped by total body size) keyed on path and query arguments,
+and served with a strong ETag and Last-Modified so browsers revalidate
+with a cheap 304. Writes that affect the public catalog call
+invalidate_catalog() after committing, which clears this worker's cache
+and bumps the shared 'catalog' version counter for the others.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+from flask import request, session, make_response, current_app
+from .cache import TTLCache, bump_version, clear_caches
+
+CATALOG_VERSION = 'catalog'
+
+page_cache = TTLCache('opac_pages', maxsize=2048, ttl=3600, version_key=CATALOG_VERSION,
+                      max_bytes=32 * 1024 * 1024, sizeof=lambda page: len(page.body))
+
+class CachedPage:
+    """A rendered response body with its validators"""
+
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+
+def invalidate_catalog():
+    """Drop cached OPAC pages and facet counts here and in every other worker"""
+    clear_caches(CATALOG_VERSION)
+    bump_version(CATALOG_VERSION)
+
+def page_key(path, args):
+    """Cache key of a page from its path and (name, value) query arguments"""
+    return (path, tuple(sorted(args)))
+
+def _is_anonymous():
+    """True when the request carries no staff login, patron login or pending flash messages"""
+    return not any(key in session for key in ('_user_id', 'patron_id', '_flashes'))
+
+def _serve(page):
+    response = make_response(page.body)
+    response.mimetype = page.mimetype
+    response.set_etag(page.etag)
+    response.last_modified = page.last_modified
+    # Let browsers keep the page but revalidate it on every use
+    response.headers['Cache-Control'] = 'public, no-cache'
+    return response.make_conditional(request)
+
+def cache_anonymous_page(view):
+    """Serve anonymous GETs of a view from the page cache"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != 'GET' or not current_app.config.get('OPAC_PAGE_CACHE', True) or not _is_anonymous():
+            return view(*args, **kwargs)
+
+        key = page_key(request.path, request.args.items(multi=True))
+        page = page_cache.get(key)
+        if page is not None:
+            return _serve(page)
+
+        response = make_response(view(*args, **kwargs))
+        # Only cache plain successful pages that did not touch the session
+        if response.status_code != 200 or 'Set-Cookie' in response.headers or not _is_anonymous():
+            return response
+
+        page = CachedPage(response.get_data(), response.mimetype)
+        page_cache.set(key, page)
+        return _serve(page)
+    return wrapper
@@ -0,0 +1,32 @@
+"""
+Keyset (cursor) pagination helpers for the Library Management System
+"""
+
+
+def parse_cursor(value):
+    """Parse a cursor query argument into a positive integer id (or None)"""
+    if value is None or str(value).strip() == '':
+        return None
+    try:
+        cursor = int(str(value).strip())
+        return cursor if cursor > 0 else None
+    except (ValueError, TypeError):
+        return None
+
+
+def keyset_page(query, id_column, before=None, per_page=25):
+    """Fetch one page of rows ordered by id descending, starting below `before`.
+
+    Uses a `WHERE id < :before ORDER BY id DESC LIMIT per_page + 1` seek instead of
+    OFFSET, so the cost of a page does not grow with how far back the user scrolls.
+    Returns (items, next_cursor) where next_cursor is None on the last page.
+    """
+    if before is not None:
+        query = query.filter(id_column < before)
+
+    rows = query.order_by(id_column.desc()).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    items = rows[:per_page]
+    next_cursor = items[-1].id if has_more and items else None
+    return items, next_cursor
@@ -0,0 +1,95 @@
+"""
+Cached user and patron principals for the Library Management System
+
+Flask-Login's user loader and the patron session lookup in
+`inject_global_data` run on every request. Instead of loading full ORM
+objects each time, they read small immutable principals from a per-worker
+TTL/LRU cache. Writes that change a user's role or is_active, or a
+patron's status, must call the invalidate_* helpers below after they
+commit.
+"""
+
+from flask_login import UserMixin
+from sqlalchemy import text
+from .cache import TTLCache, bump_version
+from .db import db
+
+PRINCIPALS_VERSION = 'principals'
+
+user_cache = TTLCache('users', maxsize=256, ttl=300, version_key=PRINCIPALS_VERSION)
+patron_cache = TTLCache('patrons', maxsize=2048, ttl=300, version_key=PRINCIPALS_VERSION)
+
+class UserPrincipal(UserMixin):
+    """Lightweight stand-in for a User, safe to share between requests"""
+
+    def __init__(self, id, username, email, role, active):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.role = role
+        self._active = bool(active)
+
+    @property
+    def is_active(self):
+        return self._active
+
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def __repr__(self):
+        return f'<UserPrincipal {self.username}>'
+
+class PatronPrincipal:
+    """Lightweight stand-in for a Patron in the session"""
+
+    def __init__(self, id, roll_no, name, status):
+        self.id = id
+        self.roll_no = roll_no
+        self.name = name
+        self.status = status
+
+    def is_active(self):
+        return self.status == 'active'
+
+    def __repr__(self):
+        return f'<PatronPrincipal {self.roll_no}>'
+
+def _load_user_row(user_id):
+    with db.engine.connect() as conn:
+        row = conn.execute(text('''
+            SELECT id, username, email, role, is_active FROM users WHERE id = :user_id
+        '''), {'user_id': user_id}).fetchone()
+    return UserPrincipal(row.id, row.username, row.email, row.role, row.is_active) if row else None
+
+def _load_patron_row(patron_id):
+    with db.engine.connect() as conn:
+        row = conn.execute(text('''
+            SELECT id, roll_no, name, status FROM patrons WHERE id = :patron_id
+        '''), {'patron_id': patron_id}).fetchone()
+    return PatronPrincipal(row.id, row.roll_no, row.name, row.status) if row else None
+
+def get_user(user_id):
+    """Get a UserPrincipal by id (None if the user does not exist)"""
+    user_id = int(user_id)
+    return user_cache.get_or_load(user_id, lambda: _load_user_row(user_id))
+
+def get_patron(patron_id):
+    """Get a PatronPrincipal by id (None if the patron does not exist)"""
+    patron_id = int(patron_id)
+    return patron_cache.get_or_load(patron_id, lambda: _load_patron_row(patron_id))
+
+def invalidate_user(user_id=None):
+    """Drop a cached user (or all users) here and in every other worker"""
+    if user_id is None:
+        user_cache.clear()
+    else:
+        user_cache.invalidate(int(user_id))
+    bump_version(PRINCIPALS_VERSION)
+
+def invalidate_patron(patron_id=None):
+    """Drop a cached patron (or all patrons) here and in every other worker"""
+    if patron_id is None:
+        patron_cache.clear()
+    else:
+        patron_cache.invalidate(int(patron_id))
+    bump_version(PRINCIPALS_VERSION)
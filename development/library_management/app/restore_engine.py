@@ -0,0 +1,359 @@
+"""
+Bulk restore of CSV system backups for the Library Management System
+
+A complete restore replays the four CSV files of a system backup in
+manifest order inside one transaction. Each file is streamed and written
+with executemany in large batches; while loading, synchronous is relaxed
+and the tables' secondary indexes are dropped, then rebuilt once at the
+end. Row counts are checked against the manifest and any mismatch or
+error rolls the whole restore back, so a failed restore leaves the
+database untouched.
+
+Single-table restores upsert CSV rows by id with batched INSERT ...
+ON CONFLICT(id) DO UPDATE statements, committing per batch so memory
+stays constant whatever the file size. Columns are matched by the header
+row, as written by the table exports, and only the columns present in
+the file are updated. A dry run reports how many rows would be inserted
+or updated without writing anything.
+"""
+
+import csv
+import os
+import time
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from .db import db
+from .identifiers import normalize_isbn, normalize_accession
+from .backup_paths import BACKUP_DIR
+
+BATCH_SIZE = 5000
+UPSERT_BATCH_SIZE = 1000
+
+# Manifest file type -> table it restores into
+RESTORE_TABLES = {
+    'categories': 'category',
+    'patrons': 'patrons',
+    'books': 'books',
+    'transactions': 'transactions'
+}
+
+class RestoreError(Exception):
+    """Raised when a backup cannot be restored; the restore is rolled back"""
+
+def _secondary_indexes(conn, table):
+    """(name, sql) of the non-unique indexes that can be rebuilt after a load"""
+    return conn.exec_driver_sql(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? "
+        "AND sql IS NOT NULL AND sql NOT LIKE 'CREATE UNIQUE%'", (table,)).fetchall()
+
+def _load_csv(conn, table, path):
+    """Stream a CSV file into table with batched upserts; returns the row count"""
+    column_types = {row[1]: (row[2] or '').upper()
+                    for row in conn.exec_driver_sql(f'PRAGMA table_info("{table}")')}
+
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
+            return 0
+
+        positions = [i for i, name in enumerate(header) if name in column_types]
+        if not positions:
+            raise RestoreError(f'{os.path.basename(path)} has no columns of table {table}')
+        # CSV writes NULL as an empty string; only text columns keep '' as a value
+        blank_is_null = [not any(t in column_types[header[i]] for t in ('CHAR', 'TEXT', 'CLOB'))
+                         for i in positions]
+
+        column_list = ', '.join(f'"{header[i]}"' for i in positions)
+        placeholders = ', '.join('?' for _ in positions)
+        sql = f'INSERT OR REPLACE INTO "{table}" ({column_list}) VALUES ({placeholders})'
+
+        rows = 0
+        batch = []
+        for record in reader:
+            if not record:
+                continue
+            values = []
+            for i, null_if_blank in zip(positions, blank_is_null):
+                value = record[i] if i < len(record) else None
+                values.append(None if value == '' and null_if_blank else value)
+            batch.append(tuple(values))
+            if len(batch) >= BATCH_SIZE:
+                conn.exec_driver_sql(sql, batch)
+                rows += len(batch)
+                batch = []
+        if batch:
+            conn.exec_driver_sql(sql, batch)
+            rows += len(batch)
+    return rows
+
+def _fill_derived_columns(conn, table):
+    """Recompute the DERIVED_COLUMNS of table in one UPDATE after a bulk load"""
+    derived = DERIVED_COLUMNS.get(table)
+    if not derived:
+        return
+    # The load bypasses the Book mapper events, and older backups have no derived columns
+    raw = conn.connection.driver_connection
+    raw.create_function('normalize_isbn', 1, normalize_isbn, deterministic=True)
+    raw.create_function('normalize_accession', 1, normalize_accession, deterministic=True)
+    assignments = ', '.join(f'"{column}" = {DERIVE_FUNCTIONS[column]}("{source}")' for column, source in derived)
+    conn.exec_driver_sql(f'UPDATE "{table}" SET {assignments}')
+
+def restore_csv_backup(files, backup_dir=BACKUP_DIR):
+    """Restore the files of a system backup manifest in import order.
+
+    files is the manifest's file list (filename, type, record_count,
+    import_order). Returns a result dict with per-table rows and rows/sec;
+    raises RestoreError (after rolling back) on a missing file, a count
+    mismatch or a database error.
+    """
+    files = sorted(files, key=lambda f: f.get('import_order', 0))
+    paths = []
+    for file_info in files:
+        filename = file_info.get('filename', '')
+        if file_info.get('type') not in RESTORE_TABLES:
+            raise RestoreError(f"Unknown backup file type: {file_info.get('type')}")
+        if os.path.basename(filename) != filename:
+            raise RestoreError(f'Invalid backup file name: {filename}')
+        path = os.path.join(backup_dir, filename)
+        if not os.path.exists(path):
+            # Empty tables are listed in the manifest but no file is written
+            if file_info.get('record_count') == 0:
+                path = None
+            else:
+                raise RestoreError(f'Required backup file not found: {filename}')
+        paths.append(path)
+
+    tables = [RESTORE_TABLES[f['type']] for f in files]
+    results = {}
+    started = time.perf_counter()
+
+    with db.engine.connect() as conn:
+        previous_synchronous = conn.exec_driver_sql('PRAGMA synchronous').scalar()
+        # synchronous can only change outside a transaction, and pysqlite does
+        # not open one before DDL, so BEGIN is issued explicitly
+        conn.exec_driver_sql('PRAGMA synchronous = OFF')
+        try:
+            conn.exec_driver_sql('BEGIN')
+            try:
+                deferred = []
+                for table in dict.fromkeys(tables):
+                    for name, sql in _secondary_indexes(conn, table):
+                        conn.exec_driver_sql(f'DROP INDEX "{name}"')
+                        deferred.append(sql)
+
+                for file_info, table, path in zip(files, tables, paths):
+                    table_started = time.perf_counter()
+                    rows = _load_csv(conn, table, path) if path else 0
+                    expected = file_info.get('record_count')
+                    if expected is not None and rows != expected:
+                        raise RestoreError(f"{file_info['filename']} has {rows} rows but the manifest lists {expected}")
+                    seconds = time.perf_counter() - table_started
+                    results[file_info['type']] = {
+                        'table': table,
+                        'rows': rows,
+                        'seconds': round(seconds, 3),
+                        'rows_per_second': int(rows / seconds) if seconds > 0 else rows
+                    }
+
+                for table in dict.fromkeys(tables):
+                    _fill_derived_columns(conn, table)
+                for sql in deferred:
+                    conn.exec_driver_sql(sql)
+                for table in dict.fromkeys(tables):
+                    conn.exec_driver_sql(f'ANALYZE "{table}"')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        finally:
+            conn.exec_driver_sql(f'PRAGMA synchronous = {int(previous_synchronous)}')
+
+    duration = time.perf_counter() - started
+    total = sum(r['rows'] for r in results.values())
+    return {
+        'success': True,
+        'tables': results,
+        'total_restored': total,
+        'indexes_rebuilt': len(deferred),
+        'duration_seconds': round(duration, 3),
+        'rows_per_second': int(total / duration) if duration > 0 else total
+    }
+
+def _value(row, index):
+    return row[index] if index < len(row) else None
+
+def _text(default=None):
+    return lambda v: default if v is None else v
+
+def _optional_text(v):
+    return v or None
+
+def _int(default=None):
+    return lambda v: int(v) if v else default
+
+def _float(default=0.0):
+    return lambda v: float(v) if v else default
+
+def _flag(default=True):
+    return lambda v: default if v is None else v.strip().lower() not in ('', '0', 'false', 'no')
+
+# CSV layouts accepted by restore_table: (column, converter), matched to the
+# file by header name. Files must have the required columns; a converter gets
+# None for a column the file lacks, and that default only applies to new rows.
+# As in _load_csv, text columns keep '' as a value and blank dates are NULL.
+# insert_only values are model defaults that only apply to new rows.
+UPSERT_LAYOUTS = {
+    'patrons': {
+        'table': 'patrons',
+        'required': ('roll_no', 'name'),
+        'columns': [('roll_no', _text()), ('name', _text()), ('email', _text()),
+                    ('phone', _text()), ('patron_type', _text('student')),
+                    ('department', _text()), ('division', _text()),
+                    ('status', _text('active')), ('max_books', _int(3))],
+        'insert_only': {'first_login': True}
+    },
+    'books': {
+        'table': 'books',
+        'required': ('title', 'author', 'accession_number'),
+        'columns': [('title', _text()), ('author', _text()), ('isbn', _text()),
+                    ('publisher', _text()), ('publication_year', _int()),
+                    ('accession_number', _text()), ('call_number', _text()),
+                    ('category_id', _int(1)), ('status', _text('available'))]
+    },
+    'categories': {
+        'table': 'category',
+        'required': ('name',),
+        'columns': [('name', _text()), ('description', _text()), ('is_active', _flag())]
+    },
+    'transactions': {
+        'table': 'transactions',
+        'required': ('patron_id', 'book_id', 'issue_date'),
+        'columns': [('patron_id', _int()), ('book_id', _int()), ('issue_date', _text()),
+                    ('due_date', _optional_text), ('return_date', _optional_text),
+                    ('status', _text('issued')), ('fine_amount', _float()),
+                    ('fine_paid', _flag(False)), ('issued_by', _int(1))]
+    }
+}
+
+# Columns computed from another column on write: (column, source)
+DERIVED_COLUMNS = {'books': [('isbn13', 'isbn'), ('accession_norm', 'accession_number')]}
+# SQL function computing each derived column, registered by _fill_derived_columns()
+DERIVE_FUNCTIONS = {'isbn13': 'normalize_isbn', 'accession_norm': 'normalize_accession'}
+
+def _upsert_params(layout, row, positions, now):
+    id_value = _value(row, positions['id']) if 'id' in positions else None
+    params = {'id': int(id_value) if id_value else None}
+    for column, convert in layout['columns']:
+        params[column] = convert(_value(row, positions[column]) if column in positions else None)
+    if layout['table'] == 'books':
+        # Raw SQL bypasses the Book mapper events that keep these in step
+        params['isbn13'] = normalize_isbn(params['isbn'])
+        params['accession_norm'] = normalize_accession(params['accession_number'])
+    params.update(layout.get('insert_only', {}))
+    params['created_at'] = now
+    if layout['table'] != 'category':
+        params['updated_at'] = now
+    return params
+
+def _upsert_sql(layout, columns, absent):
+    """Upsert of columns; existing rows keep their values of the absent columns"""
+    keep = {'id', 'created_at', *layout.get('insert_only', {}), *absent}
+    table = layout['table']
+    updates = ', '.join(f'{c} = excluded.{c}' for c in columns if c not in keep)
+    return (f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join(":" + c for c in columns)}) '
+            f'ON CONFLICT(id) DO UPDATE SET {updates}')
+
+def _header_positions(table_name, layout, header):
+    """{column: index} of the file's header, checked for the layout's required columns"""
+    positions = {}
+    for i, name in enumerate(header):
+        positions.setdefault(name.strip().lower(), i)
+    missing = [column for column in layout['required'] if column not in positions]
+    if missing:
+        raise RestoreError(f'The {table_name} file is missing required columns: {", ".join(missing)}. '
+                           f'Its first row must name the columns, as in an export of {table_name}.')
+    return positions
+
+def _existing_ids(conn, table, ids):
+    if not ids:
+        return set()
+    placeholders = ', '.join('?' for _ in ids)
+    return {row[0] for row in conn.exec_driver_sql(f'SELECT id FROM {table} WHERE id IN ({placeholders})', tuple(ids))}
+
+def _flush_upserts(conn, sql, table, batch, dry_run, counts):
+    """Count and (unless dry_run) write one batch, committing it on success"""
+    existing = _existing_ids(conn, table, [p['id'] for p in batch if p['id'] is not None])
+    updates = sum(1 for p in batch if p['id'] in existing)
+
+    if dry_run:
+        counts['updated'] += updates
+        counts['inserted'] += len(batch) - updates
+        return
+
+    try:
+        conn.execute(sql, batch)
+        conn.commit()
+        counts['updated'] += updates
+        counts['inserted'] += len(batch) - updates
+    except IntegrityError:
+        # A unique value clashed somewhere in the batch: retry row by row so
+        # only the offending rows are counted as errors
+        conn.rollback()
+        for params in batch:
+            try:
+                conn.execute(sql, params)
+                conn.commit()
+                counts['updated' if params['id'] in existing else 'inserted'] += 1
+            except IntegrityError:
+                conn.rollback()
+                counts['errors'] += 1
+
+def upsert_table_csv(table_name, lines, dry_run=False):
+    """Upsert a CSV export of one table by id.
+
+    lines is any iterable of CSV text lines (e.g. a text-wrapped upload
+    stream) whose first row names the columns. Raises RestoreError if a
+    required column is missing. Returns counts of inserted, updated,
+    skipped (too short) and error rows.
+    """
+    layout = UPSERT_LAYOUTS.get(table_name)
+    if layout is None:
+        raise RestoreError(f'Restoring {table_name} is not supported')
+
+    table = layout['table']
+    now = datetime.utcnow()
+    counts = {'inserted': 0, 'updated': 0, 'skipped': 0, 'errors': 0}
+    started = time.perf_counter()
+
+    reader = csv.reader(lines)
+    positions = _header_positions(table_name, layout, next(reader, []))
+    min_columns = max(positions[column] for column in layout['required']) + 1
+    absent = {column for column, _ in layout['columns'] if column not in positions}
+    absent.update(column for column, source in DERIVED_COLUMNS.get(table_name, []) if source in absent)
+
+    with db.engine.connect() as conn:
+        sql = None
+        batch = []
+        for row in reader:
+            if len(row) < min_columns:
+                counts['skipped'] += 1
+                continue
+            try:
+                params = _upsert_params(layout, row, positions, now)
+            except ValueError:
+                counts['errors'] += 1
+                continue
+            if sql is None:
+                sql = text(_upsert_sql(layout, list(params), absent))
+            batch.append(params)
+            if len(batch) >= UPSERT_BATCH_SIZE:
+                _flush_upserts(conn, sql, table, batch, dry_run, counts)
+                batch = []
+        if batch:
+            _flush_upserts(conn, sql, table, batch, dry_run, counts)
+
+    counts['dry_run'] = dry_run
+    counts['duration_seconds'] = round(time.perf_counter() - started, 3)
+    return counts
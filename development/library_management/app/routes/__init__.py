@@ -1,12 +1,24 @@
 """
 Route blueprints package for the Library Management System
+
+Blueprints are imported on first access, so importing one interface's
+routes (e.g. app.routes.opac) does not import the others.
 """
 
-from .core import core_bp
-from .patrons import patrons_bp
-from .books import books_bp
-from .transactions import transactions_bp
-from .backup import backup_bp
-from .settings import settings_bp
+import importlib
+
+_BLUEPRINT_MODULES = {
+    'core_bp': '.core',
+    'patrons_bp': '.patrons',
+    'books_bp': '.books',
+    'transactions_bp': '.transactions',
+    'backup_bp': '.backup',
+    'settings_bp': '.settings'
+}
 
 __all__ = ['core_bp', 'patrons_bp', 'books_bp', 'transactions_bp', 'backup_bp', 'settings_bp']
+
+def __getattr__(name):
+    if name in _BLUEPRINT_MODULES:
+        return getattr(importlib.import_module(_BLUEPRINT_MODULES[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -13,8 +13,13 @@ import io
 import os
 import json
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, contains_eager
 from app.models import User, Patron, Book, Category, Transaction, LibrarySettings
 from app import db
+from app.page_cache import invalidate_catalog
+from app.suggest import suggestion_index
+from app.catalog_search import match_identifier
+from app.pagination import keyset_page, parse_cursor
 
 books_bp = Blueprint('books', __name__)
 
@@ -47,7 +52,11 @@ def books():
 
     # Build query using SQLAlchemy
     books_query = Book.query
-    if search:
+    identifier_query = match_identifier(books_query, search)
+    if identifier_query is not None and identifier_query.first() is not None:
+        # ISBN or accession number: a single index seek
+        books_query = identifier_query
+    elif search:
         books_query = books_query.filter(
             db.or_(
                 Book.title.like(f'%{search}%'),
@@ -91,17 +100,17 @@ def api_categories():
         # Get search term if provided
         search = request.args.get('q', '').strip()
 
-        # Query categories using SQLAlchemy
-        categories_query = Category.query.filter_by(is_active=True)
-
         if search:
-            # Filter by search term (case-insensitive)
-            categories_query = categories_query.filter(
-                Category.name.like(f'%{search}%')
-            )
+            # Match word prefixes from the in-memory suggestion index
+            categories_list = []
+            for suggestion in suggestion_index.complete(search, limit=20, kinds=('category',)):
+                category = suggestion_index.category(suggestion['id'])
+                if category:
+                    categories_list.append({'id': suggestion['id'], 'name': category[0], 'description': category[1]})
+            return jsonify(categories_list)
 
         # Get categories ordered by name
-        categories = categories_query.order_by(Category.name).all()
+        categories = Category.query.filter_by(is_active=True).order_by(Category.name).all()
 
         # Return as JSON
         categories_list = [{'id': cat.id, 'name': cat.name, 'description': cat.description}
@@ -117,27 +126,49 @@ def api_categories():
 def book_details(book_id):
     """Show detailed information about a specific book"""
     # Get book details using SQLAlchemy
-    book = Book.query.outerjoin(Category).filter(Book.id == book_id).first()
+    book = Book.query.options(joinedload(Book.category)).filter(Book.id == book_id).first()
 
     if not book:
         flash('Book not found', 'error')
         return redirect(url_for('books.books'))
 
-    # Get transaction history for this book
-    transactions = Transaction.query.join(Patron).filter(
-        Transaction.book_id == book_id
-    ).order_by(Transaction.created_at.desc()).all()
+    # Keyset pagination over the transaction history (newest first)
+    before = parse_cursor(request.args.get('before'))
+    per_page = 25
+
+    history_query = Transaction.query.join(Patron).options(
+        contains_eager(Transaction.patron)
+    ).filter(Transaction.book_id == book_id)
+    transactions, next_cursor = keyset_page(history_query, Transaction.id, before=before, per_page=per_page)
 
     # Get current transaction (if book is issued)
-    current_transaction = Transaction.query.filter_by(
-        book_id=book_id, status='issued'
-    ).first()
+    current_transaction = Transaction.query.options(
+        joinedload(Transaction.patron)
+    ).filter_by(book_id=book_id, status='issued').first()
+
+    # Summary numbers computed by SQL aggregates
+    today = date.today()
+    summary = db.session.query(
+        db.func.count(Transaction.id),
+        db.func.coalesce(db.func.sum(db.case((Transaction.status == 'returned', 1), else_=0)), 0),
+        db.func.coalesce(db.func.sum(db.case(
+            (db.and_(Transaction.status == 'issued', Transaction.due_date < today), 1), else_=0)), 0)
+    ).filter(Transaction.book_id == book_id).one()
+
+    stats = {
+        'total_borrowed': summary[0],
+        'completed_returns': summary[1],
+        'overdue_count': summary[2]
+    }
 
     return render_template('book_details.html',
                          book=book,
                          transactions=transactions,
                          current_transaction=current_transaction,
-                         today_date=date.today())
+                         stats=stats,
+                         before=before,
+                         next_cursor=next_cursor,
+                         today_date=today)
 
 @books_bp.route('/books/add', methods=['GET', 'POST'])
 @login_required
@@ -232,6 +263,7 @@ def add_book():
                 existing_accession_book.updated_at = datetime.utcnow()
 
                 db.session.commit()
+                invalidate_catalog()
                 flash(f'Book with accession number "{form.accession_number.data}" updated successfully!', 'success')
             else:
                 # Insert new book only if accession number doesn't exist
@@ -248,6 +280,7 @@ def add_book():
                 )
                 db.session.add(new_book)
                 db.session.commit()
+                invalidate_catalog()
                 flash('Book added successfully!', 'success')
 
             return redirect(url_for('books.books'))
@@ -287,6 +320,7 @@ def delete_book(book_id):
         # Delete the book using SQLAlchemy
         db.session.delete(book)
         db.session.commit()
+        invalidate_catalog()
 
         return jsonify({
             'success': True,
@@ -447,6 +481,9 @@ def bulk_upload_books():
                         error_count += 1
                         errors.append(f'Row {row_num}: {str(e)}')
 
+                if success_count > 0:
+                    invalidate_catalog()
+
                 # Provide comprehensive feedback
                 if success_count > 0:
                     flash(f'Bulk upload completed! {success_count} books processed successfully, {error_count} errors.', 'success')
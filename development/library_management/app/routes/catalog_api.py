@@ -0,0 +1,197 @@
+"""
+Versioned JSON catalog API for the Library Management System
+Read-only public access to the catalog for kiosks and mobile clients
+"""
+
+import base64
+import gzip
+import json
+from flask import Blueprint, request, make_response
+from sqlalchemy import func
+from app.models import Book, Category, Transaction
+from app import db
+from app.catalog_search import apply_catalog_filters
+
+catalog_api_bp = Blueprint('catalog_api', __name__, url_prefix='/api/v1/catalog')
+
+# Selectable book fields and the columns that back them
+BOOK_FIELDS = {
+    'id': Book.id,
+    'title': Book.title,
+    'author': Book.author,
+    'isbn': Book.isbn,
+    'publisher': Book.publisher,
+    'publication_year': Book.publication_year,
+    'accession_number': Book.accession_number,
+    'call_number': Book.call_number,
+    'category': Category.name,
+    'status': Book.status,
+}
+DEFAULT_BOOK_FIELDS = ('id', 'title', 'author', 'call_number', 'category', 'status')
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+GZIP_MIN_BYTES = 1024
+
+def _json_response(payload, status=200):
+    """Compact JSON response, gzipped when the client accepts it, with an ETag"""
+    body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+
+    response = make_response(body, status)
+    response.mimetype = 'application/json'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'public, no-cache'
+
+    if len(body) >= GZIP_MIN_BYTES and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+
+    if status == 200:
+        response.add_etag()
+        response.make_conditional(request)
+    return response
+
+def _error(message, status):
+    return _json_response({'success': False, 'error': message}, status)
+
+def _selected_fields():
+    """Parse ?fields=a,b,c into known book field names (None if any are unknown)"""
+    value = request.args.get('fields', '')
+    if not value.strip():
+        return list(DEFAULT_BOOK_FIELDS)
+    fields = [f.strip() for f in value.split(',') if f.strip()]
+    if any(f not in BOOK_FIELDS for f in fields):
+        return None
+    return fields
+
+def _encode_cursor(title, book_id):
+    raw = json.dumps([title, book_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def _decode_cursor(value):
+    """Decode an opaque (title, id) cursor; None if missing or malformed"""
+    if not value:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+        title, book_id = json.loads(raw)
+        return str(title), int(book_id)
+    except (ValueError, TypeError):
+        return None
+
+def _book_rows(fields, query):
+    return [dict(zip(fields, row)) for row in query]
+
+@catalog_api_bp.route('/books')
+def books():
+    """Search the catalog with the OPAC filters, paginated by a (title, id) cursor"""
+    fields = _selected_fields()
+    if fields is None:
+        return _error(f'Unknown field. Allowed fields: {", ".join(BOOK_FIELDS)}', 400)
+
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit or DEFAULT_LIMIT, MAX_LIMIT))
+
+    cursor = _decode_cursor(request.args.get('cursor'))
+    if request.args.get('cursor') and cursor is None:
+        return _error('Invalid cursor', 400)
+
+    # Always fetch title and id so the next cursor can be built
+    columns = [BOOK_FIELDS[f] for f in fields] + [Book.title, Book.id]
+    books_query = db.session.query(*columns).outerjoin(Category, Book.category_id == Category.id)
+    books_query = apply_catalog_filters(books_query,
+                                        request.args.get('search', ''),
+                                        request.args.get('category', ''),
+                                        request.args.get('status', ''),
+                                        category_joined=True)
+
+    if cursor:
+        title, book_id = cursor
+        books_query = books_query.filter(db.or_(Book.title > title,
+                                                db.and_(Book.title == title, Book.id > book_id)))
+
+    rows = books_query.order_by(Book.title, Book.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = _encode_cursor(rows[-1][-2], rows[-1][-1])
+
+    return _json_response({
+        'success': True,
+        'books': _book_rows(fields, (row[:len(fields)] for row in rows)),
+        'next_cursor': next_cursor
+    })
+
+@catalog_api_bp.route('/books/<int:book_id>')
+def book_detail(book_id):
+    """One book with its availability"""
+    fields = _selected_fields()
+    if fields is None:
+        return _error(f'Unknown field. Allowed fields: {", ".join(BOOK_FIELDS)}', 400)
+
+    row = (db.session.query(*[BOOK_FIELDS[f] for f in fields], Book.status, Transaction.due_date)
+           .outerjoin(Category, Book.category_id == Category.id)
+           .outerjoin(Transaction, db.and_(Transaction.book_id == Book.id, Transaction.status == 'issued'))
+           .filter(Book.id == book_id)
+           .first())
+    if not row:
+        return _error('Book not found', 404)
+
+    book = dict(zip(fields, row[:len(fields)]))
+    status, due_date = row[-2], row[-1]
+    book['availability'] = {
+        'is_available': status == 'available',
+        'status': status,
+        'due_date': due_date.isoformat() if due_date else None
+    }
+    return _json_response({'success': True, 'book': book})
+
+@catalog_api_bp.route('/categories')
+def categories():
+    """Active categories with available-book counts in a single grouped query"""
+    rows = (db.session.query(Category.id, Category.name, Category.description,
+                             func.count(Book.id))
+            .outerjoin(Book, db.and_(Book.category_id == Category.id, Book.status == 'available'))
+            .filter(Category.is_active == True)
+            .group_by(Category.id)
+            .order_by(Category.name)
+            .all())
+
+    return _json_response({
+        'success': True,
+        'categories': [
+            {'id': r[0], 'name': r[1], 'description': r[2], 'available_books': r[3]}
+            for r in rows
+        ]
+    })
+
+@catalog_api_bp.route('/availability')
+def availability():
+    """Status and due date for a comma-separated list of book ids (?ids=1,2,3)"""
+    try:
+        ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip()]
+    except ValueError:
+        return _error('ids must be a comma-separated list of integers', 400)
+    if not ids:
+        return _error('No book ids given', 400)
+    if len(ids) > MAX_LIMIT:
+        return _error(f'At most {MAX_LIMIT} ids per request', 400)
+
+    rows = (db.session.query(Book.id, Book.status, Transaction.due_date)
+            .outerjoin(Transaction, db.and_(Transaction.book_id == Book.id, Transaction.status == 'issued'))
+            .filter(Book.id.in_(ids))
+            .all())
+
+    return _json_response({
+        'success': True,
+        'availability': {
+            str(book_id): {
+                'is_available': status == 'available',
+                'status': status,
+                'due_date': due_date.isoformat() if due_date else None
+            }
+            for book_id, status, due_date in rows
+        }
+    })
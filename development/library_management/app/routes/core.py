@@ -2,11 +2,13 @@
 Core routes for the Library Management System
 """
 
-from flask import Blueprint, render_template, redirect, url_for
+from flask import Blueprint, render_template, redirect, url_for, jsonify
 from flask_login import login_required, current_user
 from app.models import User, Patron, Book, Category, Transaction, LibrarySettings
 from app import db
+from app.cache import cache_stats
 from datetime import datetime, date
+import os
 
 core_bp = Blueprint('core', __name__)
 
@@ -69,3 +71,16 @@ def dashboard():
 def terms_conditions():
     """Terms and conditions page"""
     return render_template('terms_conditions.html')
+
+@core_bp.route('/system/cache_stats')
+@login_required
+def system_cache_stats():
+    """Hit/miss metrics for this worker's in-process caches"""
+    if not current_user.is_admin():
+        return jsonify({'success': False, 'error': 'Access denied. Admin privileges required.'}), 403
+
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'caches': cache_stats()
+    })
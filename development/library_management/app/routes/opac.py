@@ -7,10 +7,15 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_required, current_user
 from app.models import User, Patron, Book, Category, Transaction, LibrarySettings
 from app import db
+from app.page_cache import cache_anonymous_page
+from app.suggest import suggestion_index, KINDS
+from app import trigram_index
+from app.catalog_search import active_categories, apply_catalog_filters, apply_facet_filters, facet_summary, parse_facet_args, match_identifier
 
 opac_bp = Blueprint('opac', __name__)
 
 @opac_bp.route('/opac')
+@cache_anonymous_page
 def opac_home():
     """OPAC home page - shows search directly"""
     # Pagination parameters
@@ -28,30 +33,7 @@ def opac_home():
     status_filter = request.args.get('status', '')
 
     # Build query using SQLAlchemy
-    books_query = Book.query
-
-    # Apply search filters
-    if search:
-        books_query = books_query.filter(
-            db.or_(
-                Book.title.like(f'%{search}%'),
-                Book.author.like(f'%{search}%'),
-                Book.accession_number.like(f'%{search}%'),
-                Book.call_number.like(f'%{search}%'),
-                Book.isbn.like(f'%{search}%')
-            )
-        )
-
-    # Apply category filter
-    if category_filter:
-        books_query = books_query.join(Category).filter(Category.name == category_filter)
-
-    # Apply status filter (only show available books by default for public)
-    if status_filter:
-        books_query = books_query.filter(Book.status == status_filter)
-    else:
-        # Default to available books for public view
-        books_query = books_query.filter(Book.status == 'available')
+    books_query = apply_catalog_filters(Book.query, search, category_filter, status_filter)
 
     # Get total count for pagination
     total_books = books_query.count()
@@ -61,7 +43,7 @@ def opac_home():
     books = books_page.items
 
     # Get categories for filter dropdown
-    categories = Category.query.filter_by(is_active=True).all()
+    categories = active_categories()
 
     # Calculate pagination info
     total_pages = books_page.pages
@@ -82,6 +64,7 @@ def opac_home():
                          total_books=total_books)
 
 @opac_bp.route('/opac/search')
+@cache_anonymous_page
 def search():
     """Public book search - no login required"""
     # Pagination parameters
@@ -93,51 +76,62 @@ def search():
         page = 1
     per_page = 20  # More books per page for public view
 
-    # Search parameters
+    # Search parameters and selected facet values (each facet may repeat)
     search = request.args.get('search', '')
-    category_filter = request.args.get('category', '')
-    status_filter = request.args.get('status', '')
-
-    # Build query using SQLAlchemy
-    books_query = Book.query
-
-    # Apply search filters
-    if search:
-        books_query = books_query.filter(
-            db.or_(
-                Book.title.like(f'%{search}%'),
-                Book.author.like(f'%{search}%'),
-                Book.accession_number.like(f'%{search}%'),
-                Book.call_number.like(f'%{search}%'),
-                Book.isbn.like(f'%{search}%')
-            )
-        )
-
-    # Apply category filter
-    if category_filter:
-        books_query = books_query.join(Category).filter(Category.name == category_filter)
-
-    # Apply status filter (only show available books by default for public)
-    if status_filter:
-        books_query = books_query.filter(Book.status == status_filter)
+    selected = {name: [v for v in values if v] for name, values in parse_facet_args(request.args).items()}
+    filter_args = {'search': search, **selected}
+
+    # ISBN- and accession-shaped searches try a single index seek first
+    identifier_matches = []
+    identifier_query = match_identifier(Book.query, search)
+    if identifier_query is not None:
+        identifier_query = apply_catalog_filters(identifier_query, '', selected['category'], selected['status'])
+        identifier_matches = apply_facet_filters(identifier_query, selected['decade'], selected['publisher']).order_by(Book.title).all()
+
+    if identifier_matches:
+        total_books, facets = len(identifier_matches), {}
     else:
-        # Default to available books for public view
-        books_query = books_query.filter(Book.status == 'available')
+        # Total and facet counts come from one cached grouped pass over the text matches
+        total_books, facets = facet_summary(search, selected)
 
-    # Get total count for pagination
-    total_books = books_query.count()
+    # Attach a toggle link to every facet value
+    for name, items in facets.items():
+        for item in items:
+            values = [v for v in selected[name] if v != item['value']]
+            if not item['selected']:
+                values.append(item['value'])
+            item['url'] = url_for('opac.search', **{**filter_args, name: values})
 
-    # Apply pagination and ordering
-    books_page = books_query.order_by(Book.title).paginate(page=page, per_page=per_page, error_out=False)
-    books = books_page.items
+    # Build query using SQLAlchemy
+    books_query = apply_catalog_filters(Book.query, search, selected['category'], selected['status'])
+    books_query = apply_facet_filters(books_query, selected['decade'], selected['publisher'])
+
+    fuzzy_match = False
+    if identifier_matches:
+        books = identifier_matches[(page - 1) * per_page:page * per_page]
+    elif search and total_books == 0:
+        # No exact matches: fall back to typo-tolerant trigram search ranked by similarity
+        similarity = dict(trigram_index.fuzzy_search(search))
+        if similarity:
+            matches = apply_catalog_filters(Book.query.filter(Book.id.in_(similarity)), '',
+                                            selected['category'], selected['status'])
+            matches = apply_facet_filters(matches, selected['decade'], selected['publisher']).all()
+            matches.sort(key=lambda book: (-similarity[book.id], book.title))
+            total_books = len(matches)
+            books = matches[(page - 1) * per_page:page * per_page]
+            fuzzy_match = total_books > 0
+
+    if not fuzzy_match and not identifier_matches:
+        # Apply pagination and ordering (the total is already known from the facet pass)
+        books = books_query.order_by(Book.title).offset((page - 1) * per_page).limit(per_page).all()
 
     # Get categories for filter dropdown
-    categories = Category.query.filter_by(is_active=True).all()
+    categories = active_categories()
 
     # Calculate pagination info
-    total_pages = books_page.pages
-    has_next = books_page.has_next
-    has_prev = books_page.has_prev
+    total_pages = max(1, -(-total_books // per_page))
+    has_next = page < total_pages
+    has_prev = page > 1
 
     return render_template('opac/search.html',
                          books=books,
@@ -148,11 +142,27 @@ def search():
                          has_prev=has_prev,
                          per_page=per_page,
                          search=search,
-                         category_filter=category_filter,
-                         status_filter=status_filter,
+                         category_filter=selected['category'][0] if selected['category'] else '',
+                         status_filter=selected['status'][0] if selected['status'] else '',
+                         facets=facets,
+                         filter_args=filter_args,
+                         fuzzy_match=fuzzy_match,
                          total_books=total_books)
 
+@opac_bp.route('/api/suggest')
+def suggest():
+    """Search-as-you-type completions from the in-memory prefix index"""
+    query = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', 8, type=int) or 8, 20))
+    kinds = [k for k in request.args.get('types', '').split(',') if k in KINDS] or None
+
+    return jsonify({
+        'success': True,
+        'suggestions': suggestion_index.complete(query, limit=limit, kinds=kinds)
+    })
+
 @opac_bp.route('/opac/book/<int:book_id>')
+@cache_anonymous_page
 def book_details(book_id):
     """Public book details view"""
     # Get book details using SQLAlchemy
@@ -186,9 +196,10 @@ def book_details(book_id):
                          librarian_email=librarian_email)
 
 @opac_bp.route('/opac/categories')
+@cache_anonymous_page
 def categories():
     """Browse books by category"""
-    categories = Category.query.filter_by(is_active=True).all()
+    categories = active_categories()
 
     category_books = {}
     for category in categories:
@@ -202,9 +213,10 @@ def categories():
     return render_template('opac/categories.html', category_books=category_books)
 
 @opac_bp.route('/opac/categories/<int:category_id>')
+@cache_anonymous_page
 def category_books(category_id):
     """Show books in a specific category"""
-    category = Category.query.filter_by(id=category_id, is_active=True).first()
+    category = next((c for c in active_categories() if c.id == category_id), None)
 
     if not category:
         flash('Category not found', 'error')
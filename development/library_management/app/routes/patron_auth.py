@@ -11,6 +11,7 @@ from wtforms.validators import DataRequired, Length, ValidationError
 from werkzeug.security import check_password_hash
 from app.models import Patron, Book, Transaction, LibrarySettings
 from app import db
+from app import ledger
 from datetime import datetime, timedelta
 
 # Patron login manager (separate from librarian login)
@@ -132,14 +133,9 @@ def patron_dashboard():
             overdue_books += 1
     total_borrowed = len(current_books) + len([t for t in Transaction.query.filter_by(patron_id=patron.id, status='returned').all()])
 
-    # Calculate total outstanding fines
-    total_fines = 0.0
-    for t in current_books:
-        if not t.fine_paid and (t.fine_amount or 0) > 0:
-            fine = float(t.fine_amount or 0)
-            total_fines += fine
-            print(f"DEBUG: Transaction {t.id} fine: {fine}")
-    print(f"DEBUG: Total fines: {total_fines}")
+    # Outstanding fines from the patron's running ledger balance
+    with db.engine.connect() as conn:
+        total_fines = max(0.0, ledger.get_balance(conn, patron.id))
 
     # Get librarian email from settings
     librarian_email = LibrarySettings.get_setting('librarian_email', 'library@example.com')
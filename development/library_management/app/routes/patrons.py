@@ -14,8 +14,10 @@ import io
 import os
 import json
 from app.models import User, Patron, Book, Category, Transaction, LibrarySettings
-from app import db
+from app import db, principals
+from app.pagination import keyset_page, parse_cursor
 from sqlalchemy import text
+from sqlalchemy.orm import joinedload, contains_eager
 
 patrons_bp = Blueprint('patrons', __name__)
 
@@ -43,45 +45,49 @@ def patron_details(patron_id):
         flash('Patron not found', 'error')
         return redirect(url_for('patrons.patrons'))
 
-    # Get transaction history for this patron
-    transactions = Transaction.query.join(Book).filter(
-        Transaction.patron_id == patron_id
-    ).order_by(Transaction.created_at.desc()).all()
+    # Keyset pagination over the transaction history (newest first)
+    before = parse_cursor(request.args.get('before'))
+    per_page = 25
+
+    history_query = Transaction.query.join(Book).options(
+        contains_eager(Transaction.book)
+    ).filter(Transaction.patron_id == patron_id)
+    transactions, next_cursor = keyset_page(history_query, Transaction.id, before=before, per_page=per_page)
 
-    # Get current active transactions (issued books)
-    current_transactions = Transaction.query.join(Book).filter(
+    # Get current active transactions (issued books) with their books in the same query
+    current_transactions = Transaction.query.options(
+        joinedload(Transaction.book)
+    ).filter(
         Transaction.patron_id == patron_id,
         Transaction.status == 'issued'
     ).order_by(Transaction.due_date.asc()).all()
 
-    # Calculate patron statistics
-    print(f"DEBUG: Patron {patron.name} has {len(current_transactions)} current transactions")
-    overdue_books = 0
-    for t in current_transactions:
-        print(f"DEBUG: Transaction {t.id}, book: {t.book.title}, due_date: {t.due_date}, type: {type(t.due_date)}, is_overdue: {t.is_overdue()}")
-        if t.is_overdue():
-            overdue_books += 1
-    # Calculate total fines
-    total_fines = 0.0
-    for t in transactions:
-        fine = float(t.fine_amount or 0)
-        total_fines += fine
-        print(f"DEBUG: Transaction {t.id} fine: {fine}")
-    print(f"DEBUG: Total fines: {total_fines}")
+    # Calculate patron statistics with SQL aggregates instead of walking every row
+    today = date.today()
+    summary = db.session.query(
+        db.func.count(Transaction.id),
+        db.func.coalesce(db.func.sum(db.case((Transaction.status == 'returned', 1), else_=0)), 0),
+        db.func.coalesce(db.func.sum(db.case(
+            (db.and_(Transaction.status == 'issued', Transaction.due_date < today), 1), else_=0)), 0),
+        db.func.coalesce(db.func.sum(Transaction.fine_amount), 0.0)
+    ).filter(Transaction.patron_id == patron_id).one()
 
     stats = {
-        'total_transactions': len(transactions),
+        'total_transactions': summary[0],
         'current_books': len(current_transactions),
-        'total_fines': total_fines,
-        'overdue_books': overdue_books,
-        'completed_returns': sum(1 for t in transactions if t.status == 'returned')
+        'total_fines': float(summary[3] or 0),
+        'overdue_books': summary[2],
+        'completed_returns': summary[1]
     }
 
     return render_template('patron_details.html',
                          patron=patron,
                          transactions=transactions,
                          current_transactions=current_transactions,
-                         stats=stats)
+                         stats=stats,
+                         before=before,
+                         next_cursor=next_cursor,
+                         today_date=today)
 
 @patrons_bp.route('/patrons')
 @login_required
@@ -226,6 +232,8 @@ def add_patron():
                     flash(f'Patron "{form.roll_no.data}" created successfully!', 'success')
 
                 conn.commit()
+                if roll_no_exists and existing_patron_id:
+                    principals.invalidate_patron(existing_patron_id)
                 return redirect(url_for('patrons.patrons'))
 
         except Exception as e:
@@ -266,6 +274,7 @@ def delete_patron(patron_id):
             conn.execute(text('DELETE FROM patrons WHERE id = :patron_id'), {'patron_id': patron_id})
 
             conn.commit()
+            principals.invalidate_patron(patron_id)
 
             return jsonify({
                 'success': True,
@@ -394,6 +403,7 @@ def bulk_upload_patrons():
                         errors.append(f'Row {row_num}: {str(e)}')
 
                 db.session.commit()
+                principals.invalidate_patron()
 
                 flash(f'Bulk upload completed! {success_count} patrons processed successfully, {error_count} errors occurred.', 'success')
                 if errors:
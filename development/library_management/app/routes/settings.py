@@ -14,6 +14,7 @@ import os
 import json
 from app.models import User, Patron, Book, Category, Transaction, LibrarySettings
 from app import db
+from app.page_cache import invalidate_catalog
 
 settings_bp = Blueprint('settings', __name__)
 
@@ -48,6 +49,7 @@ def settings():
             LibrarySettings.set_setting('staff_max_books', staff_max_books, 'Maximum books staff can borrow')
             LibrarySettings.set_setting('library_name', library_name, 'Name of the library')
             LibrarySettings.set_setting('librarian_email', librarian_email, 'Contact email for library administration')
+            invalidate_catalog()
 
             flash('Settings updated successfully!', 'success')
             return redirect(url_for('settings.settings'))
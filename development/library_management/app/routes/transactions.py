@@ -15,6 +15,8 @@ import json
 from sqlalchemy import text
 from app.models import User, Patron, Book, Category, Transaction, LibrarySettings
 from app import db
+from app import ledger
+from app.page_cache import invalidate_catalog
 
 transactions_bp = Blueprint('transactions', __name__)
 
@@ -47,6 +49,16 @@ def safe_float(value):
     except (ValueError, TypeError, AttributeError):
         return 0.0
 
+def parse_fine_cursor(value):
+    """Parse a "<fine_amount>:<id>" fines page cursor, returning (None, None) if invalid"""
+    if not value or ':' not in str(value):
+        return None, None
+    amount, _, row_id = str(value).partition(':')
+    try:
+        return float(amount), int(row_id)
+    except (ValueError, TypeError):
+        return None, None
+
 # Form classes
 class IssueBookForm(FlaskForm):
     patron_roll_no = SelectField('Patron Roll Number', coerce=str, validators=[DataRequired()])
@@ -138,6 +150,7 @@ def issue_book():
 
                             # Commit changes
                             conn.commit()
+                            invalidate_catalog()
 
                             flash(f'Book issued successfully! Due date: {due_date}', 'success')
                             return redirect(url_for('transactions.issue_book'))
@@ -238,8 +251,15 @@ def return_book():
                             # Update book status back to available
                             conn.execute(text('UPDATE books SET status = :status WHERE id = :book_id'), {'status': 'available', 'book_id': transaction[2]})
 
+                            # Charge the fine to the patron's ledger
+                            if fine_amount > 0:
+                                ledger.record_assessment(conn, transaction[1], fine_amount,
+                                                         transaction_id=transaction_id, recorded_by=current_user.id,
+                                                         note='Overdue return')
+
                             # Commit changes
                             conn.commit()
+                            invalidate_catalog()
 
                             flash(f'Book returned successfully! Fine: ₹{fine_amount:.2f}', 'success')
                             return redirect(url_for('transactions.return_book'))
@@ -271,8 +291,10 @@ def collect_fine(transaction_id):
             if transaction[8]:  # fine_paid is at index 8
                 return jsonify({'success': False, 'error': 'Fine already paid'})
 
-            # Mark fine as paid
+            # Mark fine as paid and record the payment in the ledger
             conn.execute(text('UPDATE transactions SET fine_paid = 1 WHERE id = :transaction_id'), {'transaction_id': transaction_id})
+            ledger.record_payment(conn, transaction[1], transaction[7],
+                                  transaction_id=transaction_id, recorded_by=current_user.id)
             conn.commit()
 
             return jsonify({
@@ -286,7 +308,7 @@ def collect_fine(transaction_id):
 @transactions_bp.route('/fines', methods=['GET'])
 @login_required
 def fines():
-    """View all outstanding fines"""
+    """View outstanding fines, largest first, one page at a time"""
     print(f"DEBUG: Fines route accessed by user: {current_user.username if current_user.is_authenticated else 'Not authenticated'}")
     print(f"DEBUG: Current user role: {current_user.role}")
     print(f"DEBUG: Current user is_admin: {current_user.is_admin()}")
@@ -314,69 +336,53 @@ def fines():
 
     print("DEBUG: Access granted to admin/librarian user, proceeding to load fines page")
 
+    # Keyset pagination: cursor is "<fine_amount>:<id>" of the last row on the previous page
+    per_page = 25
+    after_amount, after_id = parse_fine_cursor(request.args.get('after'))
+
     try:
         with db.engine.connect() as conn:
-            # Get ALL outstanding fines (no pagination to avoid errors)
-            print("DEBUG: Executing fines query...")
-            outstanding_fines = conn.execute(text('''
-                SELECT t.*, p.name as patron_name, p.roll_no, b.title as book_title, b.accession_number
+            # Outstanding fines, newest page first. The predicate is written with literals so
+            # SQLite can match it against the ix_transactions_outstanding_fines partial index.
+            query = '''
+                SELECT t.id, t.issue_date, t.due_date, t.return_date, t.fine_amount,
+                       p.name as patron_name, p.roll_no, b.title as book_title, b.accession_number
                 FROM transactions t
                 JOIN patrons p ON t.patron_id = p.id
                 JOIN books b ON t.book_id = b.id
-                WHERE CAST(t.fine_amount AS REAL) > 0 AND t.fine_paid = 0 AND t.status = 'returned'
-                ORDER BY CAST(t.fine_amount AS REAL) DESC
-            ''')).fetchall()
-
-            print(f"DEBUG: Found {len(outstanding_fines)} outstanding fines")
-
-            # Get summary statistics
-            print("DEBUG: Executing statistics query...")
+                WHERE t.fine_paid = 0 AND t.status = 'returned' AND t.fine_amount > 0
+            '''
+            params = {'limit': per_page + 1}
+            if after_id is not None:
+                query += ' AND (t.fine_amount < :after_amount OR (t.fine_amount = :after_amount AND t.id < :after_id))'
+                params['after_amount'] = after_amount
+                params['after_id'] = after_id
+            query += ' ORDER BY t.fine_amount DESC, t.id DESC LIMIT :limit'
+
+            rows = conn.execute(text(query), params).fetchall()
+            outstanding_fines = rows[:per_page]
+            next_cursor = None
+            if len(rows) > per_page:
+                last = outstanding_fines[-1]
+                next_cursor = f'{last.fine_amount}:{last.id}'
+
+            # Summary statistics, answered from the same partial index
             try:
                 stats_result = conn.execute(text('''
-                SELECT
-                    COUNT(*) as total_outstanding,
-                    COALESCE(SUM(CASE WHEN fine_amount IS NULL OR fine_amount = '' THEN 0.0 ELSE CAST(fine_amount AS REAL) END), 0) as total_amount,
-                    COALESCE(AVG(CASE WHEN fine_amount IS NULL OR fine_amount = '' THEN 0.0 ELSE CAST(fine_amount AS REAL) END), 0) as avg_fine
-                FROM transactions
-                WHERE CAST(COALESCE(fine_amount, '0') AS REAL) > 0 AND fine_paid = 0 AND status = 'returned'
-            ''')).fetchone()
-
-                print(f"DEBUG: Stats query result: {stats_result}")
-
-                # Handle potential None or empty string values in stats
-                if stats_result:
-                    total_outstanding = safe_int(stats_result[0])
-                    total_amount = safe_float(stats_result[1])
-                    avg_fine = safe_float(stats_result[2])
-
-                    # Additional safety check for fine_amount in query results
-                    if outstanding_fines:
-                        for fine in outstanding_fines:
-                            if fine[7] is not None and fine[7] != '':
-                                try:
-                                    fine[7] = float(fine[7])
-                                except (ValueError, TypeError):
-                                    fine[7] = 0.0
-
-                    # Ensure we have valid numeric values for template rendering
-                    total_outstanding = max(0, total_outstanding)
-                    total_amount = max(0.0, total_amount)
-                    avg_fine = max(0.0, avg_fine)
-
-                    stats = (total_outstanding, total_amount, avg_fine)
-                    print(f"DEBUG: Processed stats: {stats}")
-                else:
-                    stats = (0, 0.0, 0.0)
-                    print("DEBUG: No stats found, using defaults")
+                    SELECT COUNT(*), COALESCE(SUM(fine_amount), 0), COALESCE(AVG(fine_amount), 0)
+                    FROM transactions
+                    WHERE fine_paid = 0 AND status = 'returned' AND fine_amount > 0
+                ''')).fetchone()
+                stats = (safe_int(stats_result[0]), safe_float(stats_result[1]), safe_float(stats_result[2]))
             except Exception as e:
                 print(f"DEBUG: Error in stats query: {e}")
                 stats = (0, 0.0, 0.0)
-                print("DEBUG: Using default stats due to query error")
 
-            # Simple template variables (no pagination needed)
             return render_template('fines.html',
                                  outstanding_fines=outstanding_fines,
-                                 stats=stats)
+                                 stats=stats,
+                                 after=request.args.get('after') if after_id is not None else None,
+                                 next_cursor=next_cursor)
 
     except Exception as e:
         flash(f'Error loading fines: {str(e)}', 'error')
@@ -406,8 +412,10 @@ def mark_fine_paid(transaction_id):
                 flash('Fine already paid', 'error')
                 return redirect(url_for('transactions.fines'))
 
-            # Mark fine as paid
+            # Mark fine as paid and record the payment in the ledger
             conn.execute(text('UPDATE transactions SET fine_paid = 1 WHERE id = :transaction_id'), {'transaction_id': transaction_id})
+            ledger.record_payment(conn, transaction[1], transaction[7],
+                                  transaction_id=transaction_id, recorded_by=current_user.id)
             conn.commit()
 
             flash(f'Fine of ₹{transaction[7]:.2f} marked as paid successfully!', 'success')
@@ -417,6 +425,88 @@ def mark_fine_paid(transaction_id):
 
     return redirect(url_for('transactions.fines'))
 
+@transactions_bp.route('/waive_fine/<int:transaction_id>', methods=['POST'])
+@login_required
+def waive_fine(transaction_id):
+    """Waive an outstanding fine (admin only)"""
+    if not current_user.is_authenticated or current_user.role != 'admin':
+        return jsonify({'success': False, 'error': 'Access denied. Admin privileges required.'})
+
+    try:
+        with db.engine.connect() as conn:
+            # Get transaction details
+            transaction = conn.execute(text('SELECT * FROM transactions WHERE id = :transaction_id'), {'transaction_id': transaction_id}).fetchone()
+            if not transaction:
+                return jsonify({'success': False, 'error': 'Transaction not found'})
+
+            if transaction[7] == 0:  # fine_amount is at index 7
+                return jsonify({'success': False, 'error': 'No fine to waive'})
+
+            if transaction[8]:  # fine_paid is at index 8
+                return jsonify({'success': False, 'error': 'Fine already settled'})
+
+            # Settle the fine and record the waiver in the ledger
+            conn.execute(text('UPDATE transactions SET fine_paid = 1 WHERE id = :transaction_id'), {'transaction_id': transaction_id})
+            ledger.record_waiver(conn, transaction[1], transaction[7],
+                                 transaction_id=transaction_id, recorded_by=current_user.id,
+                                 note=request.form.get('reason', '').strip() or None)
+            conn.commit()
+
+            return jsonify({
+                'success': True,
+                'message': f'Fine of ₹{transaction[7]:.2f} waived'
+            })
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@transactions_bp.route('/fines/cash_report')
+@login_required
+def cash_report():
+    """Export per-day fine collections from the ledger for a date range"""
+    if not current_user.is_authenticated or current_user.role not in ['admin', 'librarian']:
+        flash('Access denied. Admin or librarian privileges required.', 'error')
+        return redirect(url_for('core.dashboard'))
+
+    # Default to today (end-of-day report)
+    today = date.today().strftime('%Y-%m-%d')
+    start_date = request.args.get('start_date') or today
+    end_date = request.args.get('end_date') or start_date
+
+    try:
+        with db.engine.connect() as conn:
+            days = ledger.cash_report(conn, start_date, end_date)
+
+        # Create CSV in memory
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['Date', 'Fines Assessed', 'Assessments', 'Cash Collected', 'Payments',
+                         'Fines Waived', 'Waivers'])
+        for day in days:
+            writer.writerow([
+                day['date'],
+                f"{day['assessment']:.2f}", day['assessment_count'],
+                f"{day['payment']:.2f}", day['payment_count'],
+                f"{day['waiver']:.2f}", day['waiver_count']
+            ])
+        writer.writerow([
+            'Total',
+            f"{sum(d['assessment'] for d in days):.2f}", sum(d['assessment_count'] for d in days),
+            f"{sum(d['payment'] for d in days):.2f}", sum(d['payment_count'] for d in days),
+            f"{sum(d['waiver'] for d in days):.2f}", sum(d['waiver_count'] for d in days)
+        ])
+
+        filename = f'cash_report_{start_date}_to_{end_date}.csv'
+        return Response(
+            output.getvalue(),
+            mimetype='text/csv',
+            headers={'Content-disposition': f'attachment; filename={filename}'}
+        )
+
+    except Exception as e:
+        flash(f'Cash report failed: {str(e)}', 'error')
+        return redirect(url_for('transactions.fines'))
+
 @transactions_bp.route('/transaction_logs', methods=['GET'])
 @login_required
 def transaction_logs():
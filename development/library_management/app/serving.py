@@ -0,0 +1,204 @@
+"""
+Production serving settings for the Library Management System
+
+gunicorn.conf.py runs the app under gunicorn's gthread workers sized by
+worker_count() and thread_count(). SQLite lets any number of connections
+read at once but only one write at a time, so adding processes beyond
+the CPU count only adds waiters on the database lock. Threads cover what
+a sync worker wastes: waiting on slow clients and on SQLite I/O, both of
+which release the GIL.
+
+Every thread of a worker checks out its own connection from the
+SQLAlchemy pool sized by engine_options(). With preload_app the app (and
+possibly a pooled connection) is created in the gunicorn master, so each
+worker calls dispose_engines() after the fork rather than sharing the
+master's SQLite file handles.
+
+Before forking, the master runs warm_up(): it loads the settings
+snapshot, the active categories, the compiled templates and the search
+indexes, then freezes the garbage collector. The workers inherit all of
+this already loaded, sharing its memory pages copy-on-write, and the
+collector never writes to those pages (which would give each worker a
+private copy).
+
+combine() serves the admin app and the OPAC from one process through
+werkzeug's DispatcherMiddleware: the admin app at / and the OPAC under
+OPAC_MOUNT. Both apps use one engine, and the module-level caches and
+search indexes are naturally shared. Each mount gets its own budget of
+concurrent requests (mount_budgets()), so an OPAC burst cannot take the
+threads the librarians' requests need. The two budgets never add up to
+more than the worker's threads, so a queued request waits in its mount's
+budget rather than on a gthread thread. OPAC requests get a 503 after
+MOUNT_QUEUE_SECONDS; admin requests wait longer, ADMIN_QUEUE_SECONDS,
+since a librarian's export or report cannot be retried as cheaply as a
+catalog search, but a waiting request still holds a thread, so it too is
+turned away in the end.
+
+The OPAC can also run on an ASGI server through opac_asgi.OpacASGI
+(run_opac_asgi.py); flask_apps() finds the Flask app inside it for the
+warm-up.
+"""
+
+import gc
+import os
+import threading
+import time
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
+from werkzeug.wsgi import ClosingIterator
+from .db import db
+from .opac_asgi import OpacASGI
+
+DEFAULT_THREADS = 4
+MAX_DEFAULT_WORKERS = 4
+BUSY_TIMEOUT = 30
+
+OPAC_MOUNT = '/catalog'
+# How long an OPAC request waits for a free slot in its mount's budget before a 503
+MOUNT_QUEUE_SECONDS = 0.25
+# The same for an admin request, e.g. one stuck behind streamed archive downloads
+ADMIN_QUEUE_SECONDS = 5.0
+
+def worker_count():
+    """WEB_WORKERS, or one worker per CPU (at least 2, at most MAX_DEFAULT_WORKERS)"""
+    if os.getenv('WEB_WORKERS'):
+        return int(os.getenv('WEB_WORKERS'))
+    return max(2, min(os.cpu_count() or 1, MAX_DEFAULT_WORKERS))
+
+def thread_count():
+    """WEB_THREADS, or DEFAULT_THREADS request threads per worker"""
+    return int(os.getenv('WEB_THREADS', DEFAULT_THREADS))
+
+def mount_budgets():
+    """Concurrent requests per mount of the combined app, within thread_count().
+
+    ADMIN_THREADS defaults to half the threads (at least 2), so one long
+    download or report leaves a slot for the other librarians, and
+    OPAC_THREADS to the rest. Both are clamped so that each mount has a
+    slot and together they fit in the threads; raises ValueError with
+    fewer than 2 threads.
+    """
+    threads = thread_count()
+    if threads < 2:
+        raise ValueError('Serving admin and OPAC together needs WEB_THREADS of at least 2')
+    admin = int(os.getenv('ADMIN_THREADS', max(2, threads // 2)))
+    admin = max(1, min(admin, threads - 1))
+    opac = int(os.getenv('OPAC_THREADS', threads - admin))
+    opac = max(1, min(opac, threads - admin))
+    return {'admin': admin, 'opac': opac}
+
+def engine_options():
+    """SQLAlchemy engine options for a SQLite file shared by a worker's threads.
+
+    The pool keeps one connection per request thread, with overflow for
+    the backup and index threads. A write that finds the database locked
+    waits up to BUSY_TIMEOUT seconds instead of failing.
+    """
+    return {
+        'pool_size': thread_count(),
+        'max_overflow': 4,
+        'pool_timeout': BUSY_TIMEOUT,
+        'connect_args': {'timeout': BUSY_TIMEOUT, 'check_same_thread': False}
+    }
+
+def dispose_engines():
+    """Forget pooled connections inherited from the parent process.
+
+    Call in a forked worker; the parent's connections are left open for
+    the parent, and the worker opens its own on first use.
+    """
+    for engines in list(db._app_engines.values()):
+        for engine in engines.values():
+            engine.dispose(close=False)
+
+def share_engines(app, other):
+    """Point other at app's engines, so both use one connection pool"""
+    for engine in db._app_engines[other].values():
+        engine.dispose()
+    db._app_engines[other] = db._app_engines[app]
+
+class MountBudget:
+    """WSGI wrapper that caps the requests one mounted app runs at once.
+
+    A request waits up to queue_seconds for a slot and then gets a 503.
+    """
+
+    def __init__(self, app, slots, queue_seconds=MOUNT_QUEUE_SECONDS):
+        self.app = app
+        self.slots = slots
+        self.queue_seconds = queue_seconds
+        self._slots = threading.BoundedSemaphore(slots)
+        self.rejected = 0
+
+    def __call__(self, environ, start_response):
+        if not self._slots.acquire(timeout=self.queue_seconds):
+            self.rejected += 1
+            start_response('503 Service Unavailable', [('Content-Type', 'text/plain; charset=utf-8'),
+                                                       ('Retry-After', '1')])
+            return [b'The library server is busy. Please try again in a moment.']
+        try:
+            app_iter = self.app(environ, start_response)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the server has sent the whole body
+        return ClosingIterator(app_iter, self._slots.release)
+
+def combine(admin_app, opac_app, opac_mount=OPAC_MOUNT):
+    """One WSGI app serving admin_app at / and opac_app under opac_mount"""
+    share_engines(admin_app, opac_app)
+    # Keep the two apps' sessions apart; they are signed with different keys
+    opac_app.config['SESSION_COOKIE_NAME'] = 'opac_session'
+    opac_app.config['SESSION_COOKIE_PATH'] = opac_mount
+    admin_app.config['OPAC_SEARCH_URL'] = f'{opac_mount}/opac/search'
+
+    budgets = mount_budgets()
+    return DispatcherMiddleware(MountBudget(admin_app, budgets['admin'], queue_seconds=ADMIN_QUEUE_SECONDS),
+                                {opac_mount: MountBudget(opac_app, budgets['opac'])})
+
+def flask_apps(wsgi_app):
+    """The Flask apps behind an app built by combine() or OpacASGI, or [wsgi_app] itself"""
+    if isinstance(wsgi_app, DispatcherMiddleware):
+        return flask_apps(wsgi_app.app) + [app for mount in wsgi_app.mounts.values() for app in flask_apps(mount)]
+    if isinstance(wsgi_app, (MountBudget, OpacASGI)):
+        return flask_apps(wsgi_app.app)
+    return [wsgi_app]
+
+def warm_up(app):
+    """Load read-mostly data into the master before workers fork.
+
+    Returns {step: seconds}. A failed step is reported and skipped; the
+    workers then load that data on first use as they would without it.
+    """
+    from . import precompile_templates
+    from .catalog_search import active_categories
+    from .models import LibrarySettings
+
+    steps = [
+        ('settings', LibrarySettings.snapshot),
+        ('categories', active_categories),
+        ('templates', lambda: precompile_templates(app))
+    ]
+    if 'opac' in app.blueprints:
+        from . import trigram_index
+        from .suggest import suggestion_index
+        steps += [
+            ('suggestions', lambda: suggestion_index.ensure_fresh(force=True)),
+            ('trigram_index', lambda: trigram_index.ensure_index(force=True, wait=True))
+        ]
+
+    timings = {}
+    with app.app_context():
+        for name, load in steps:
+            started = time.perf_counter()
+            try:
+                load()
+            except Exception as e:
+                print(f"Warm-up step {name} failed: {e}")
+                continue
+            timings[name] = time.perf_counter() - started
+        db.session.remove()
+
+    # Keep the collector off the warmed objects in the forked workers
+    gc.collect()
+    gc.freeze()
+    return timings
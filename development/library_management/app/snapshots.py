@@ -0,0 +1,220 @@
+"""
+Database snapshot backups for the Library Management System
+
+Snapshots are page-level copies of the live SQLite database made with
+sqlite3.Connection.backup. Pages are copied a few hundred at a time with a
+short sleep between steps, so writers are only blocked for one step at a
+time; if another connection writes mid-copy, SQLite restarts the copy, so
+the result is always a consistent point-in-time image with all column
+types intact. Each snapshot is optionally gzipped and gets a JSON
+manifest with its SHA-256, size and per-table row counts.
+
+Restoring copies a verified snapshot back over the live database with the
+same backup API in a single step, which keeps pooled connections and any
+journal files coherent (a plain file rename would not) and takes seconds.
+The restored cache_versions counters are then moved past their values
+before the restore, so every worker drops its caches.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+from .db import db
+from .cache import read_versions, advance_versions
+from . import backup_catalog
+from .backup_paths import BACKUP_DIR
+
+SNAPSHOT_PREFIX = 'library_snapshot_'
+PAGES_PER_STEP = 256
+STEP_SLEEP = 0.005
+CHUNK_SIZE = 1024 * 1024
+
+class SnapshotError(Exception):
+    """Raised when a snapshot is missing, corrupt or fails verification"""
+
+def database_path():
+    """Filesystem path of the live SQLite database"""
+    return db.engine.url.database
+
+def sha256_file(path):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _table_counts(conn):
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+    return {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+
+def manifest_path_for(snapshot_path):
+    """Manifest file that sits next to a snapshot"""
+    base = snapshot_path[:-3] if snapshot_path.endswith('.gz') else snapshot_path
+    return base[:-3] + '.manifest.json' if base.endswith('.db') else base + '.manifest.json'
+
+def copy_database(target_path, pages_per_step=PAGES_PER_STEP, sleep=STEP_SLEEP):
+    """Copy the live database to target_path as a consistent point-in-time image"""
+    source = sqlite3.connect(database_path())
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target, pages=pages_per_step, sleep=sleep)
+    finally:
+        target.close()
+        source.close()
+
+def create_snapshot(backup_dir=BACKUP_DIR, compress=True, pages_per_step=PAGES_PER_STEP, sleep=STEP_SLEEP):
+    """Write a consistent snapshot of the live database and its manifest.
+
+    Returns the manifest dict.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    # Never overwrite an existing snapshot taken within the same second
+    base, suffix = timestamp, 1
+    while any(os.path.exists(os.path.join(backup_dir, f'{SNAPSHOT_PREFIX}{timestamp}{ext}'))
+              for ext in ('.db', '.db.gz', '.manifest.json')):
+        timestamp = f'{base}_{suffix}'
+        suffix += 1
+    db_file = os.path.join(backup_dir, f'{SNAPSHOT_PREFIX}{timestamp}.db')
+
+    started = datetime.now()
+    copy_database(db_file, pages_per_step, sleep)
+    target = sqlite3.connect(db_file)
+    try:
+        if target.execute('PRAGMA quick_check').fetchone()[0] != 'ok':
+            raise SnapshotError('Snapshot failed integrity check')
+        table_counts = _table_counts(target)
+        page_count = target.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        target.close()
+
+    db_size = os.path.getsize(db_file)
+    db_sha256 = sha256_file(db_file)
+
+    snapshot_file = db_file
+    if compress:
+        snapshot_file = db_file + '.gz'
+        with open(db_file, 'rb') as src, gzip.open(snapshot_file, 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        os.remove(db_file)
+
+    manifest = {
+        'backup_type': 'sqlite_snapshot',
+        'version': '1.0',
+        'timestamp': timestamp,
+        'created_at': started.isoformat(timespec='seconds'),
+        'duration_seconds': round((datetime.now() - started).total_seconds(), 3),
+        'filename': os.path.basename(snapshot_file),
+        'compressed': compress,
+        'size': os.path.getsize(snapshot_file),
+        'sha256': sha256_file(snapshot_file),
+        'database_size': db_size,
+        'database_sha256': db_sha256,
+        'page_count': page_count,
+        'sqlite_version': sqlite3.sqlite_version,
+        'table_counts': table_counts
+    }
+
+    manifest_file = manifest_path_for(snapshot_file)
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    backup_catalog.record([
+        {'filename': manifest['filename'], 'sha256': manifest['sha256'], 'row_count': sum(table_counts.values())},
+        {'filename': os.path.basename(manifest_file)}
+    ], backup_dir)
+    return manifest
+
+def list_snapshots(backup_dir=BACKUP_DIR):
+    """Manifests of every snapshot in backup_dir, newest first"""
+    snapshots = []
+    if not os.path.isdir(backup_dir):
+        return snapshots
+    for filename in os.listdir(backup_dir):
+        if filename.startswith(SNAPSHOT_PREFIX) and filename.endswith('.manifest.json'):
+            try:
+                with open(os.path.join(backup_dir, filename), 'r', encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Error reading snapshot manifest {filename}: {e}")
+    return sorted(snapshots, key=lambda m: m.get('timestamp', ''), reverse=True)
+
+def verify_snapshot(filename, backup_dir=BACKUP_DIR):
+    """Check a snapshot against its manifest; returns (snapshot_path, manifest)"""
+    if os.path.basename(filename) != filename or not filename.startswith(SNAPSHOT_PREFIX):
+        raise SnapshotError('Invalid snapshot name')
+
+    snapshot_path = os.path.join(backup_dir, filename)
+    manifest_path = manifest_path_for(snapshot_path)
+    if not os.path.exists(snapshot_path) or not os.path.exists(manifest_path):
+        raise SnapshotError('Snapshot or manifest not found')
+
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if sha256_file(snapshot_path) != manifest.get('sha256'):
+        raise SnapshotError('Snapshot checksum does not match its manifest')
+    return snapshot_path, manifest
+
+def restore_snapshot(filename, backup_dir=BACKUP_DIR, keep_safety_copy=True):
+    """Replace the live database with a verified snapshot.
+
+    A snapshot of the current database is taken first (unless disabled) so
+    the restore itself can be undone. Returns a result dict.
+    """
+    snapshot_path, manifest = verify_snapshot(filename, backup_dir)
+    started = datetime.now()
+
+    safety = create_snapshot(backup_dir) if keep_safety_copy else None
+
+    work_dir = os.path.dirname(os.path.abspath(database_path()))
+    fd, staged = tempfile.mkstemp(suffix='.db', dir=work_dir)
+    os.close(fd)
+    try:
+        opener = gzip.open if manifest.get('compressed') else open
+        with opener(snapshot_path, 'rb') as src, open(staged, 'wb') as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+        if manifest.get('database_sha256') and sha256_file(staged) != manifest['database_sha256']:
+            raise SnapshotError('Decompressed snapshot checksum does not match its manifest')
+
+        source = sqlite3.connect(staged)
+        try:
+            if source.execute('PRAGMA quick_check').fetchone()[0] != 'ok':
+                raise SnapshotError('Snapshot failed integrity check')
+
+            with db.engine.connect() as conn:
+                versions = read_versions(conn)
+
+            # Drop pooled connections so none holds a stale schema, then copy in one step
+            db.session.remove()
+            db.engine.dispose()
+            target = sqlite3.connect(database_path(), timeout=30)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+
+            # The snapshot's cache_versions rewound every counter; move them past what workers hold
+            from .trigram_index import WATERMARK, BUILD_CLAIM
+            with db.engine.begin() as conn:
+                advance_versions(conn, versions, keep=(WATERMARK, BUILD_CLAIM))
+        finally:
+            source.close()
+    finally:
+        if os.path.exists(staged):
+            os.remove(staged)
+
+    return {
+        'success': True,
+        'restored': manifest['filename'],
+        'table_counts': manifest.get('table_counts', {}),
+        'safety_snapshot': safety['filename'] if safety else None,
+        'duration_seconds': round((datetime.now() - started).total_seconds(), 3)
+    }
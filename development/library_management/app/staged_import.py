@@ -0,0 +1,279 @@
+"""
+Staged CSV imports for the Library Management System
+
+Validating an upload streams it once into its own staging table
+(import_staging_<import id>) with executemany, then checks every rule as
+a single set-based UPDATE that records the first error of each row:
+required fields, formats, duplicate keys within the file, and references
+to category, patrons and books. The preview is a LIMIT 10 query on the
+staging table.
+
+The import itself is a later request that only sends the import id; it
+copies the valid rows with one INSERT ... SELECT (an upsert for patrons
+and books) and drops the staging table. Fines of imported transactions
+are assessed in the ledger in the same database transaction. Abandoned
+uploads expire.
+"""
+
+import csv
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from .db import db
+from . import ledger
+from .identifiers import normalize_isbn, normalize_accession
+
+BATCH_SIZE = 5000
+PREVIEW_ROWS = 10
+MAX_LISTED_ERRORS = 100
+STAGING_TTL = timedelta(days=1)
+
+# Columns kept from each upload; key is unique within a file
+IMPORT_FIELDS = {
+    'patrons': {
+        'required': ['roll_no', 'name'],
+        'optional': ['email', 'phone'],
+        'key': 'roll_no'
+    },
+    'books': {
+        'required': ['title', 'author', 'accession_number'],
+        'optional': ['isbn', 'publisher', 'publication_year', 'category'],
+        'key': 'accession_number'
+    },
+    'transactions': {
+        'required': ['patron_id', 'book_id', 'issue_date', 'due_date'],
+        'optional': ['return_date', 'status', 'fine_amount'],
+        'key': None
+    },
+    'categories': {
+        'required': ['name'],
+        'optional': ['description'],
+        'key': 'name'
+    }
+}
+
+# (error message, condition on staging row s), checked in order; a row keeps its first error
+VALIDATION_RULES = {
+    'patrons': [
+        ('Invalid email format', "COALESCE(s.email, '') <> '' AND instr(s.email, '@') = 0")
+    ],
+    'books': [
+        ('Publication year must be a 4-digit number',
+         "COALESCE(s.publication_year, '') <> '' AND (length(s.publication_year) <> 4 OR s.publication_year GLOB '*[^0-9]*')"),
+        ('Unknown category',
+         "COALESCE(s.category, '') <> '' AND NOT EXISTS "
+         "(SELECT 1 FROM category c WHERE c.name = s.category OR CAST(c.id AS TEXT) = s.category)")
+    ],
+    'transactions': [
+        ('Patron ID and Book ID must be positive numbers',
+         "s.patron_id GLOB '*[^0-9]*' OR s.book_id GLOB '*[^0-9]*' "
+         "OR CAST(s.patron_id AS INTEGER) <= 0 OR CAST(s.book_id AS INTEGER) <= 0"),
+        ('Invalid date format (use YYYY-MM-DD)',
+         "date(s.issue_date) IS NOT s.issue_date OR date(s.due_date) IS NOT s.due_date "
+         "OR (COALESCE(s.return_date, '') <> '' AND date(s.return_date) IS NOT s.return_date)"),
+        ('Patron not found', "NOT EXISTS (SELECT 1 FROM patrons p WHERE p.id = CAST(s.patron_id AS INTEGER))"),
+        ('Book not found', "NOT EXISTS (SELECT 1 FROM books b WHERE b.id = CAST(s.book_id AS INTEGER))")
+    ],
+    'categories': []
+}
+
+# Rows that already exist and are skipped (not overwritten) on import
+SKIP_EXISTING = {
+    'transactions': ('transactions already exist and were skipped',
+                     "EXISTS (SELECT 1 FROM transactions t WHERE t.patron_id = CAST(s.patron_id AS INTEGER) "
+                     "AND t.book_id = CAST(s.book_id AS INTEGER) AND t.issue_date = s.issue_date)"),
+    'categories': ('categories already exist and were skipped',
+                   "EXISTS (SELECT 1 FROM category c WHERE c.name = s.name)")
+}
+
+# Rows that match an existing record by key and are updated on import
+UPDATE_EXISTING = {
+    'patrons': "EXISTS (SELECT 1 FROM patrons p WHERE p.roll_no = s.roll_no)",
+    'books': "EXISTS (SELECT 1 FROM books b WHERE b.accession_number = s.accession_number)"
+}
+
+COMMIT_SQL = {
+    'patrons': '''
+        INSERT INTO patrons (roll_no, name, email, phone, patron_type, status, max_books, first_login, created_at, updated_at)
+        SELECT s.roll_no, s.name, NULLIF(s.email, ''), NULLIF(s.phone, ''), 'student', 'active', 3, 1, :now, :now
+        FROM {staging} s WHERE s.error IS NULL ORDER BY s.row_no
+        ON CONFLICT(roll_no) DO UPDATE SET
+            name = excluded.name, email = excluded.email, phone = excluded.phone, updated_at = excluded.updated_at
+    ''',
+    'books': '''
+        INSERT INTO books (title, author, isbn, isbn13, publisher, publication_year, accession_number, accession_norm,
+                           category_id, status, created_at, updated_at)
+        SELECT s.title, s.author, NULLIF(s.isbn, ''), normalize_isbn(s.isbn), NULLIF(s.publisher, ''),
+               CAST(NULLIF(s.publication_year, '') AS INTEGER), s.accession_number, normalize_accession(s.accession_number),
+               COALESCE((SELECT c.id FROM category c WHERE c.name = s.category OR CAST(c.id AS TEXT) = s.category), 1),
+               'available', :now, :now
+        FROM {staging} s WHERE s.error IS NULL ORDER BY s.row_no
+        ON CONFLICT(accession_number) DO UPDATE SET
+            title = excluded.title, author = excluded.author, isbn = excluded.isbn, isbn13 = excluded.isbn13,
+            updated_at = excluded.updated_at
+    ''',
+    'transactions': '''
+        INSERT INTO transactions (patron_id, book_id, issue_date, due_date, return_date, status, fine_amount, fine_paid,
+                                  issued_by, created_at, updated_at)
+        SELECT CAST(s.patron_id AS INTEGER), CAST(s.book_id AS INTEGER), s.issue_date, s.due_date, NULLIF(s.return_date, ''),
+               COALESCE(NULLIF(s.status, ''), 'issued'), COALESCE(CAST(NULLIF(s.fine_amount, '') AS REAL), 0.0), 0,
+               :user_id, :now, :now
+        FROM {staging} s WHERE s.error IS NULL AND NOT ({skip}) ORDER BY s.row_no
+    ''',
+    'categories': '''
+        INSERT INTO category (name, description, is_active, created_at)
+        SELECT s.name, NULLIF(s.description, ''), 1, :now
+        FROM {staging} s WHERE s.error IS NULL AND NOT ({skip}) ORDER BY s.row_no
+    '''
+}
+
+class StagedImportError(Exception):
+    """Raised when an upload cannot be staged or an import id cannot be committed"""
+
+def _staging_table(import_id):
+    return f'import_staging_{import_id}'
+
+def _fields(import_type):
+    spec = IMPORT_FIELDS[import_type]
+    return spec['required'] + spec['optional']
+
+def expire_stale_imports():
+    """Drop staging tables of uploads that were never imported"""
+    cutoff = datetime.utcnow() - STAGING_TTL
+    with db.engine.begin() as conn:
+        stale = [row[0] for row in conn.execute(text(
+            "SELECT id FROM import_batches WHERE status = 'staged' AND created_at < :cutoff"), {'cutoff': cutoff})]
+        for import_id in stale:
+            conn.execute(text(f'DROP TABLE IF EXISTS {_staging_table(import_id)}'))
+        if stale:
+            conn.execute(text("UPDATE import_batches SET status = 'expired' WHERE status = 'staged' AND created_at < :cutoff"),
+                         {'cutoff': cutoff})
+
+def stage_import(import_type, lines, filename=None, user_id=None):
+    """Stream a CSV upload into a new staging table and validate it.
+
+    Returns a dict with import_id, total_rows, valid_rows, errors (the
+    first MAX_LISTED_ERRORS as "Row N: message") and the preview rows.
+    """
+    if import_type not in IMPORT_FIELDS:
+        raise StagedImportError('Please select a valid data type to import')
+
+    reader = csv.reader(lines)
+    headers = [h.lower().strip() for h in next(reader, [])]
+    spec = IMPORT_FIELDS[import_type]
+    missing = [field for field in spec['required'] if field not in headers]
+    if missing:
+        raise StagedImportError(f"Missing required fields: {', '.join(missing)}")
+
+    expire_stale_imports()
+
+    fields = _fields(import_type)
+    positions = [headers.index(field) if field in headers else None for field in fields]
+    import_id = uuid.uuid4().hex
+    staging = _staging_table(import_id)
+    insert_sql = (f'INSERT INTO {staging} (row_no, {", ".join(fields)}) '
+                  f'VALUES (?, {", ".join("?" for _ in fields)})')
+
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            f'CREATE TABLE {staging} (row_no INTEGER PRIMARY KEY, {", ".join(f"{f} TEXT" for f in fields)}, error TEXT)'))
+
+        total = 0
+        batch = []
+        for row_no, row in enumerate(reader, start=2):
+            if not any(cell.strip() for cell in row):
+                continue
+            batch.append((row_no, *[row[i].strip() if i is not None and i < len(row) else None for i in positions]))
+            if len(batch) >= BATCH_SIZE:
+                conn.exec_driver_sql(insert_sql, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            conn.exec_driver_sql(insert_sql, batch)
+            total += len(batch)
+
+        # Set-based validation: each rule is one UPDATE over the rows still without an error
+        rules = [(f"{field} is required", f"COALESCE(s.{field}, '') = ''") for field in spec['required']]
+        rules += VALIDATION_RULES[import_type]
+        if spec['key']:
+            conn.execute(text(f'CREATE INDEX ix_{staging}_key ON {staging} ({spec["key"]})'))
+            rules.append((f"Duplicate {spec['key']} in file",
+                          f"EXISTS (SELECT 1 FROM {staging} d WHERE d.{spec['key']} = s.{spec['key']} AND d.row_no < s.row_no)"))
+        for message, condition in rules:
+            conn.execute(text(f'UPDATE {staging} AS s SET error = :message WHERE s.error IS NULL AND ({condition})'),
+                         {'message': message})
+
+        valid = conn.execute(text(f'SELECT COUNT(*) FROM {staging} WHERE error IS NULL')).scalar()
+        errors = [f'Row {row.row_no}: {row.error}' for row in conn.execute(text(
+            f'SELECT row_no, error FROM {staging} WHERE error IS NOT NULL ORDER BY row_no LIMIT :limit'),
+            {'limit': MAX_LISTED_ERRORS})]
+        if total - valid > len(errors):
+            errors.append(f'... and {total - valid - len(errors)} more rows with errors')
+        preview = [dict(row._mapping, row=row.row_no) for row in conn.execute(text(
+            f'SELECT row_no, {", ".join(fields)} FROM {staging} WHERE error IS NULL ORDER BY row_no LIMIT :limit'),
+            {'limit': PREVIEW_ROWS})]
+
+        conn.execute(text('''
+            INSERT INTO import_batches (id, import_type, filename, status, total_rows, valid_rows, created_by, created_at)
+            VALUES (:id, :import_type, :filename, 'staged', :total, :valid, :user_id, :now)
+        '''), {'id': import_id, 'import_type': import_type, 'filename': filename, 'total': total,
+               'valid': valid, 'user_id': user_id, 'now': datetime.utcnow()})
+
+    return {
+        'import_id': import_id,
+        'import_type': import_type,
+        'total_rows': total,
+        'valid_rows': valid,
+        'errors': errors,
+        'preview': preview
+    }
+
+def commit_import(import_id, user_id):
+    """Copy the valid staged rows of an upload into their table and drop the staging table.
+
+    Returns the same result shape the import page has always shown.
+    """
+    with db.engine.begin() as conn:
+        batch = conn.execute(text('SELECT import_type, status, total_rows FROM import_batches WHERE id = :id'),
+                             {'id': import_id}).fetchone()
+        if batch is None or batch.status != 'staged':
+            raise StagedImportError('This upload is no longer staged; please validate the file again')
+
+        import_type = batch.import_type
+        staging = _staging_table(import_id)
+        params = {'now': datetime.utcnow(), 'user_id': user_id}
+        messages = []
+
+        valid = conn.execute(text(f'SELECT COUNT(*) FROM {staging} WHERE error IS NULL')).scalar()
+        skip_message, skip_condition = SKIP_EXISTING.get(import_type, (None, '0'))
+        skipped = 0
+        if skip_message:
+            skipped = conn.execute(text(
+                f'SELECT COUNT(*) FROM {staging} s WHERE s.error IS NULL AND ({skip_condition})')).scalar()
+            if skipped:
+                messages.append(f'{skipped} {skip_message}')
+        updated = 0
+        if import_type in UPDATE_EXISTING:
+            updated = conn.execute(text(
+                f'SELECT COUNT(*) FROM {staging} s WHERE s.error IS NULL AND {UPDATE_EXISTING[import_type]}')).scalar()
+
+        if import_type == 'books':
+            raw = conn.connection.driver_connection
+            raw.create_function('normalize_isbn', 1, normalize_isbn, deterministic=True)
+            raw.create_function('normalize_accession', 1, normalize_accession, deterministic=True)
+
+        conn.execute(text(COMMIT_SQL[import_type].format(staging=staging, skip=skip_condition)), params)
+        if import_type == 'transactions':
+            # Imported fines bypass the ledger; assess them and recompute balances
+            ledger.backfill_from_transactions(conn)
+        conn.execute(text("UPDATE import_batches SET status = 'imported' WHERE id = :id"), {'id': import_id})
+        conn.execute(text(f'DROP TABLE {staging}'))
+
+    return {
+        'success': True,
+        'import_type': import_type,
+        'imported': valid - skipped,
+        'updated': updated,
+        'errors': messages,
+        'total_processed': batch.total_rows
+    }
@@ -0,0 +1,234 @@
+"""
+Search-as-you-type suggestions for the Library Management System
+
+Each worker keeps, per kind, a sorted list of (key, kind, ref_id, text)
+entries built from normalized book titles, authors and category names,
+where key is every word-start suffix of the normalized text (so "alg"
+finds "Introduction to Algorithms"). A completion is a bisect to the
+first key at or after the prefix in each requested kind followed by a
+short forward scan, with no database round trip. Keeping the kinds apart
+means a lookup of categories alone never scans past titles and authors.
+
+The index is built once and then kept current from the catalog_changes
+feed that triggers on books and category fill: at most every
+`sync_interval` seconds it checks the feed's high-water mark and re-indexes
+only the rows that changed since the last sync. The feed trims itself
+(see CATALOG_CHANGES_KEPT in models.py); an index whose last sync is older
+than the oldest change left rebuilds instead.
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from heapq import merge
+from sqlalchemy import text
+from .cache import register_cache
+from .db import db
+
+KINDS = ('title', 'author', 'category')
+
+# Only index suffixes starting at the first few words of long titles
+MAX_WORD_STARTS = 8
+
+def normalize(value):
+    """Lowercase, strip accents and collapse punctuation to single spaces"""
+    if not value:
+        return ''
+    value = unicodedata.normalize('NFKD', str(value))
+    value = ''.join(c for c in value if not unicodedata.combining(c)).lower()
+    return ' '.join(re.findall(r'[a-z0-9]+', value))
+
+def _keys_for(value):
+    """Word-start suffixes of the normalized value"""
+    words = normalize(value).split(' ')
+    if words == ['']:
+        return []
+    return [' '.join(words[i:]) for i in range(min(len(words), MAX_WORD_STARTS))]
+
+class SuggestionIndex:
+    """Sorted, bisect-searchable prefix index over catalog text"""
+
+    def __init__(self, sync_interval=2.0, max_incremental=500):
+        self.sync_interval = sync_interval
+        self.max_incremental = max_incremental
+
+        self._entries = {kind: [] for kind in KINDS}  # kind -> sorted (key, kind, ref_id, text)
+        self._refs = {}         # (kind, ref_id) -> list of entries
+        self._categories = {}   # category id -> (name, description)
+        self._last_change_id = None
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+
+        self.lookups = 0
+        self.rebuilds = 0
+        self.incremental_updates = 0
+
+        register_cache('suggestions', self)
+
+    # Building
+
+    def _entries_for(self, kind, ref_id, value):
+        return [(key, kind, ref_id, value) for key in _keys_for(value)]
+
+    def _remove_ref(self, kind, ref_id):
+        kind_entries = self._entries[kind]
+        for entry in self._refs.pop((kind, ref_id), []):
+            i = bisect_left(kind_entries, entry)
+            if i < len(kind_entries) and kind_entries[i] == entry:
+                del kind_entries[i]
+
+    def _add_ref(self, kind, ref_id, value):
+        entries = self._entries_for(kind, ref_id, value)
+        for entry in entries:
+            insort(self._entries[kind], entry)
+        if entries:
+            self._refs[(kind, ref_id)] = entries
+
+    def _rebuild(self, conn, latest):
+        """Build a fresh index from the books and category tables and swap it in"""
+        refs = {}
+        for book_id, title, author in conn.execute(text('SELECT id, title, author FROM books')):
+            refs[('title', book_id)] = self._entries_for('title', book_id, title)
+            refs[('author', book_id)] = self._entries_for('author', book_id, author)
+
+        categories = {}
+        for category_id, name, description in conn.execute(text(
+                'SELECT id, name, description FROM category WHERE is_active = 1')):
+            categories[category_id] = (name, description)
+            refs[('category', category_id)] = self._entries_for('category', category_id, name)
+
+        entries = {kind: [] for kind in KINDS}
+        for (kind, _), ref_entries in refs.items():
+            entries[kind].extend(ref_entries)
+        for kind_entries in entries.values():
+            kind_entries.sort()
+
+        with self._lock:
+            self._entries = entries
+            self._refs = {ref: ref_entries for ref, ref_entries in refs.items() if ref_entries}
+            self._categories = categories
+            self._last_change_id = latest
+            self.rebuilds += 1
+
+    def _apply_changes(self, conn, latest):
+        """Re-index only the books and categories changed since the last sync"""
+        changes = conn.execute(text('''
+            SELECT DISTINCT entity, entity_id FROM catalog_changes WHERE id > :last AND id <= :latest
+        '''), {'last': self._last_change_id, 'latest': latest}).fetchall()
+
+        if len(changes) > self.max_incremental:
+            self._rebuild(conn, latest)
+            return
+
+        book_ids = [entity_id for entity, entity_id in changes if entity == 'book']
+        category_ids = [entity_id for entity, entity_id in changes if entity == 'category']
+
+        books = {}
+        if book_ids:
+            params = {f'id{i}': book_id for i, book_id in enumerate(book_ids)}
+            placeholders = ', '.join(f':{name}' for name in params)
+            for book_id, title, author in conn.execute(text(
+                    f'SELECT id, title, author FROM books WHERE id IN ({placeholders})'), params):
+                books[book_id] = (title, author)
+
+        categories = {}
+        if category_ids:
+            params = {f'id{i}': category_id for i, category_id in enumerate(category_ids)}
+            placeholders = ', '.join(f':{name}' for name in params)
+            for category_id, name, description in conn.execute(text(
+                    f'SELECT id, name, description FROM category WHERE is_active = 1 AND id IN ({placeholders})'), params):
+                categories[category_id] = (name, description)
+
+        with self._lock:
+            for book_id in book_ids:
+                self._remove_ref('title', book_id)
+                self._remove_ref('author', book_id)
+                if book_id in books:
+                    title, author = books[book_id]
+                    self._add_ref('title', book_id, title)
+                    self._add_ref('author', book_id, author)
+
+            for category_id in category_ids:
+                self._remove_ref('category', category_id)
+                self._categories.pop(category_id, None)
+                if category_id in categories:
+                    self._categories[category_id] = categories[category_id]
+                    self._add_ref('category', category_id, categories[category_id][0])
+
+            self._last_change_id = latest
+            self.incremental_updates += 1
+
+    def ensure_fresh(self, force=False):
+        """Catch up with the catalog_changes feed (throttled to sync_interval)"""
+        now = time.monotonic()
+        if not force and self._last_change_id is not None and now - self._checked_at < self.sync_interval:
+            return
+        self._checked_at = now
+
+        try:
+            with db.engine.connect() as conn:
+                latest, oldest = conn.execute(text(
+                    'SELECT COALESCE(MAX(id), 0), COALESCE(MIN(id), 0) FROM catalog_changes')).fetchone()
+                # Rebuild if the feed was reset or trimmed past the last change applied
+                if self._last_change_id is None or latest < self._last_change_id or oldest > self._last_change_id + 1:
+                    self._rebuild(conn, latest)
+                elif latest > self._last_change_id:
+                    self._apply_changes(conn, latest)
+        except Exception as e:
+            print(f"Error refreshing suggestion index: {e}")
+
+    # Lookups
+
+    def _scan(self, kind, prefix, limit):
+        """Up to limit distinct entries of one kind whose key starts with prefix, in key order"""
+        entries = self._entries[kind]
+        found = []
+        seen = set()
+        i = bisect_left(entries, (prefix,))
+        # Bound the scan so many books by one author cannot walk the whole kind
+        end = min(len(entries), i + limit * 50)
+        while i < end and len(found) < limit:
+            entry = entries[i]
+            key, _, ref_id, value = entry
+            if not key.startswith(prefix):
+                break
+            i += 1
+            marker = value.lower() if kind != 'title' else ref_id
+            if marker in seen:
+                continue
+            seen.add(marker)
+            found.append(entry)
+        return found
+
+    def complete(self, prefix, limit=8, kinds=None):
+        """Top `limit` distinct completions for prefix, in key order"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        self.ensure_fresh()
+
+        with self._lock:
+            matches = merge(*(self._scan(kind, prefix, limit) for kind in KINDS if not kinds or kind in kinds))
+            results = [{'text': value, 'type': kind, 'id': ref_id}
+                       for _, (_, kind, ref_id, value) in zip(range(limit), matches)]
+            self.lookups += 1
+        return results
+
+    def category(self, category_id):
+        """(name, description) for an indexed category"""
+        return self._categories.get(category_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': sum(len(kind_entries) for kind_entries in self._entries.values()),
+                'categories': len(self._categories),
+                'last_change_id': self._last_change_id,
+                'lookups': self.lookups,
+                'rebuilds': self.rebuilds,
+                'incremental_updates': self.incremental_updates
+            }
+
+suggestion_index = SuggestionIndex()
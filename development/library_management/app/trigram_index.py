@@ -0,0 +1,235 @@
+"""
+Typo-tolerant catalog search for the Library Management System
+
+Every word of a book's title and author is split into padded trigrams
+("tanenbaum" -> "  t", " ta", "tan", ..., "um ") and stored in the
+book_trigrams postings table. A fuzzy query looks up the postings of its
+own trigrams and ranks books by the share of query trigrams they contain,
+so "Tannenbaum" still finds "Andrew Tanenbaum". The cost is one grouped
+index range scan per query trigram instead of a full-table LIKE scan.
+
+The postings are kept current from the catalog_changes feed. The id of the
+last change applied is stored as the 'trigram_index' row of
+cache_versions, so any worker can catch up and a missing row triggers a
+full build.
+
+Requests never build the index: ensure_index() hands the catch-up to a
+background thread and the request searches the postings as they are. A
+full build runs in short write transactions, claimed through the
+'trigram_index_build' row of cache_versions so only one worker builds at
+a time. The watermark is removed while it runs, and until it is back
+fuzzy_search() answers from a LIKE match on word stems instead. The
+gunicorn master builds the index before forking (serving.warm_up).
+"""
+
+import threading
+import time
+from flask import current_app
+from sqlalchemy import text, bindparam
+from .db import db
+from .suggest import normalize
+
+WATERMARK = 'trigram_index'
+BUILD_CLAIM = 'trigram_index_build'
+# A claim older than this is taken to belong to a worker that died mid-build
+BUILD_TIMEOUT = 600
+SYNC_INTERVAL = 2.0
+MAX_INCREMENTAL = 5000
+BATCH_SIZE = 5000
+BOOKS_PER_TRANSACTION = 2000
+# The LIKE fallback matches this many leading characters of each search word
+STEM_LENGTH = 4
+
+_lock = threading.Lock()
+_checked_at = 0.0
+_worker = None
+
+def trigrams(value):
+    """Distinct padded word trigrams of a string"""
+    grams = set()
+    for word in normalize(value).split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def _postings(rows):
+    for book_id, title, author in rows:
+        for gram in trigrams(f'{title or ""} {author or ""}'):
+            yield {'trigram': gram, 'book_id': book_id}
+
+def _insert_postings(conn, rows):
+    batch = []
+    for posting in _postings(rows):
+        batch.append(posting)
+        if len(batch) >= BATCH_SIZE:
+            conn.execute(text('INSERT OR IGNORE INTO book_trigrams (trigram, book_id) VALUES (:trigram, :book_id)'), batch)
+            batch = []
+    if batch:
+        conn.execute(text('INSERT OR IGNORE INTO book_trigrams (trigram, book_id) VALUES (:trigram, :book_id)'), batch)
+
+def _set_watermark(conn, change_id):
+    conn.execute(text('''
+        INSERT INTO cache_versions (name, version) VALUES (:name, :version)
+        ON CONFLICT(name) DO UPDATE SET version = excluded.version
+    '''), {'name': WATERMARK, 'version': change_id})
+
+def rebuild(conn):
+    """Rebuild all postings from the books table in the caller's transaction (offline builds)"""
+    latest = conn.execute(text('SELECT COALESCE(MAX(id), 0) FROM catalog_changes')).scalar()
+    conn.execute(text('DELETE FROM book_trigrams'))
+    _insert_postings(conn, conn.execute(text('SELECT id, title, author FROM books')).fetchall())
+    _set_watermark(conn, latest)
+    return latest
+
+def _changed_book_ids(conn, last, latest):
+    return [row[0] for row in conn.execute(text('''
+        SELECT DISTINCT entity_id FROM catalog_changes
+        WHERE entity = 'book' AND id > :last AND id <= :latest
+    '''), {'last': last, 'latest': latest})]
+
+def _apply_changes(conn, book_ids, latest):
+    if book_ids:
+        ids = bindparam('ids', expanding=True)
+        conn.execute(text('DELETE FROM book_trigrams WHERE book_id IN :ids').bindparams(ids), {'ids': book_ids})
+        rows = conn.execute(text('SELECT id, title, author FROM books WHERE id IN :ids').bindparams(ids),
+                            {'ids': book_ids}).fetchall()
+        _insert_postings(conn, rows)
+    _set_watermark(conn, latest)
+
+def _claim_build(conn):
+    """Take the build claim unless another worker holds a live one"""
+    now = int(time.time())
+    return conn.execute(text('''
+        INSERT INTO cache_versions (name, version) VALUES (:name, :now)
+        ON CONFLICT(name) DO UPDATE SET version = excluded.version
+        WHERE cache_versions.version < :stale
+    '''), {'name': BUILD_CLAIM, 'now': now, 'stale': now - BUILD_TIMEOUT}).rowcount == 1
+
+def rebuild_in_batches():
+    """Rebuild all postings, committing every BOOKS_PER_TRANSACTION books.
+
+    Returns False without building if another worker holds the build claim.
+    """
+    with db.engine.begin() as conn:
+        if not _claim_build(conn):
+            return False
+        latest = conn.execute(text('SELECT COALESCE(MAX(id), 0) FROM catalog_changes')).scalar()
+        conn.execute(text('DELETE FROM cache_versions WHERE name = :name'), {'name': WATERMARK})
+        conn.execute(text('DELETE FROM book_trigrams'))
+
+    try:
+        # Books changed during the build are past latest and caught up by the next sync
+        last_id = 0
+        while True:
+            with db.engine.begin() as conn:
+                rows = conn.execute(text('SELECT id, title, author FROM books WHERE id > :last ORDER BY id LIMIT :limit'),
+                                    {'last': last_id, 'limit': BOOKS_PER_TRANSACTION}).fetchall()
+                _insert_postings(conn, rows)
+            if not rows:
+                break
+            last_id = rows[-1][0]
+        with db.engine.begin() as conn:
+            _set_watermark(conn, latest)
+    finally:
+        with db.engine.begin() as conn:
+            conn.execute(text('DELETE FROM cache_versions WHERE name = :name'), {'name': BUILD_CLAIM})
+    return True
+
+def _sync():
+    with db.engine.begin() as conn:
+        latest, oldest = conn.execute(text(
+            'SELECT COALESCE(MAX(id), 0), COALESCE(MIN(id), 0) FROM catalog_changes')).fetchone()
+        row = conn.execute(text('SELECT version FROM cache_versions WHERE name = :name'),
+                           {'name': WATERMARK}).fetchone()
+        if row is not None and latest == row[0]:
+            return
+        # The feed is only trimmed up to the watermark, so a gap means it was reset
+        if row is not None and latest > row[0] and oldest <= row[0] + 1:
+            book_ids = _changed_book_ids(conn, row[0], latest)
+            if len(book_ids) <= MAX_INCREMENTAL:
+                _apply_changes(conn, book_ids, latest)
+                return
+    rebuild_in_batches()
+
+def _sync_in_background(app):
+    with app.app_context():
+        try:
+            _sync()
+        except Exception as e:
+            print(f"Error updating trigram index: {e}")
+
+def ensure_index(force=False, wait=False):
+    """Bring the postings up to date with the catalog_changes feed (throttled).
+
+    With wait the work runs in the caller (warm-up and scripts). Otherwise
+    it runs on a background thread, at most one per process, and the
+    caller carries on with the postings as they are.
+    """
+    global _checked_at, _worker
+    now = time.monotonic()
+    if not force and now - _checked_at < SYNC_INTERVAL:
+        return
+    with _lock:
+        if _worker is not None and _worker.is_alive():
+            return
+        _checked_at = now
+        if wait:
+            try:
+                _sync()
+            except Exception as e:
+                print(f"Error updating trigram index: {e}")
+            return
+        _worker = threading.Thread(target=_sync_in_background, args=(current_app._get_current_object(),),
+                                   name='trigram-index', daemon=True)
+        _worker.start()
+
+def index_ready():
+    """True once the postings have been built (their watermark exists)"""
+    return db.session.execute(text('SELECT 1 FROM cache_versions WHERE name = :name'),
+                              {'name': WATERMARK}).first() is not None
+
+def _like_search(search, limit):
+    """Books whose title or author contains a stem of the search words, ranked by the share matched"""
+    stems = sorted({word[:STEM_LENGTH] for word in normalize(search).split() if len(word) >= 3})
+    if not stems:
+        return []
+    params = {f'stem{i}': f'%{stem}%' for i, stem in enumerate(stems)}
+    matches = [f'(title LIKE :stem{i} OR author LIKE :stem{i})' for i in range(len(stems))]
+    # Rank every matching book in SQL, not just the first rows the scan finds
+    rows = db.session.execute(text(f'''
+        SELECT id, {' + '.join(matches)} AS hits
+        FROM books
+        WHERE {' OR '.join(matches)}
+        ORDER BY hits DESC, id
+        LIMIT :limit
+    '''), {**params, 'limit': limit}).fetchall()
+
+    return [(row.id, round(row.hits / len(stems), 3)) for row in rows]
+
+def fuzzy_search(search, limit=200, min_similarity=0.5):
+    """Rank books by the share of the query's trigrams found in their title and author.
+
+    Returns [(book_id, similarity), ...], best matches first. Until the
+    index is built, the similarity is the share of search word stems found
+    by a LIKE scan instead.
+    """
+    grams = trigrams(search)
+    if not grams:
+        return []
+    ensure_index()
+    if not index_ready():
+        return _like_search(search, limit)
+
+    min_hits = max(1, int(len(grams) * min_similarity + 0.5))
+    rows = db.session.execute(text('''
+        SELECT book_id, COUNT(*) AS hits
+        FROM book_trigrams
+        WHERE trigram IN :grams
+        GROUP BY book_id
+        HAVING COUNT(*) >= :min_hits
+        ORDER BY hits DESC, book_id
+        LIMIT :limit
+    ''').bindparams(bindparam('grams', expanding=True)),
+        {'grams': sorted(grams), 'min_hits': min_hits, 'limit': limit}).fetchall()
+
+    return [(row.book_id, round(row.hits / len(grams), 3)) for row in rows]
@@ -1,10 +1,20 @@
 # Gunicorn configuration for production
-bind = "0.0.0.0:5000"
-workers = 4
-worker_class = "sync"
-worker_connections = 1000
+#
+#     gunicorn --config gunicorn.conf.py run:app
+#
+# Worker and thread counts come from app/serving.py (WEB_WORKERS and
+# WEB_THREADS override them); see DEPLOYMENT.md for the benchmark behind
+# the defaults.
+import os
+from app import serving, backup_scheduler
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = serving.worker_count()
+worker_class = "gthread"
+threads = serving.thread_count()
 timeout = 30
-keepalive = 2
+graceful_timeout = 30
+keepalive = 5
 
 # Logging
 loglevel = "info"
@@ -28,3 +38,23 @@ certfile = None
 # Restart mechanism
 preload_app = True
 worker_tmp_dir = "/dev/shm"
+
+# The master builds the app but must not run scheduled backups; the workers do
+if preload_app:
+    backup_scheduler.defer_start()
+
+# Load shared caches in the master so workers inherit them (PREFORK_WARM_UP=false to skip)
+prefork_warm_up = os.getenv('PREFORK_WARM_UP', 'true').lower() != 'false'
+
+def when_ready(server):
+    if prefork_warm_up and preload_app:
+        for flask_app in serving.flask_apps(server.app.wsgi()):
+            timings = serving.warm_up(flask_app)
+            server.log.info("Warmed up %s before fork: %s", flask_app.name,
+                            ', '.join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings.items()))
+
+def post_fork(server, worker):
+    # The app was built in the master; give each worker its own SQLite connections
+    serving.dispose_engines()
+    if preload_app:
+        backup_scheduler.start_deferred()
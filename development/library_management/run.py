@@ -11,11 +11,8 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from app import create_app
 import os
 
-app = create_app()
-
-# Remove OPAC blueprints for admin-only interface
-opac_blueprints = ['opac', 'patron_auth']
-app.blueprints = {k: v for k, v in app.blueprints.items() if k not in opac_blueprints}
+# Admin-only interface; the OPAC is served by run_opac.py
+app = create_app(interfaces=['admin'])
 
 if __name__ == '__main__':
     # Create instance folder if it doesn't exist
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Combined Library Management System server
+Admin interface at / and the OPAC under /catalog, served from one process
+
+    gunicorn --config gunicorn.conf.py run_combined:app
+"""
+
+import sys
+import os
+
+# Add the current directory to Python path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from werkzeug.serving import run_simple
+from app import create_app, serving
+from run_opac import app as opac_app
+
+admin_app = create_app(interfaces=['admin'])
+app = serving.combine(admin_app, opac_app)
+
+if __name__ == '__main__':
+    budgets = serving.mount_budgets()
+    print("=" * 50)
+    print("Library Management System - Admin and OPAC")
+    print("=" * 50)
+    print("Admin interface: http://localhost:5000")
+    print(f"OPAC:            http://localhost:5000{serving.OPAC_MOUNT}/")
+    print(f"Request budgets: admin {budgets['admin']}, OPAC {budgets['opac']}")
+    print("Press Ctrl+C to stop the server")
+    print("-" * 50)
+
+    # Development server; use gunicorn (see above) in production
+    run_simple('0.0.0.0', 5000, app, threaded=True)
@@ -6,19 +6,23 @@ Public interface for library catalog access
 
 import sys
 import os
-import webbrowser
 from threading import Timer
 
 # Add the current directory to Python path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from flask import Flask, redirect, url_for
+from app import configure_template_cache, serving
 from app.db import db
+from app.models import install_triggers
 from app.routes.opac import opac_bp
+from app.routes.catalog_api import catalog_api_bp
 from app.routes.patron_auth import patron_auth_bp
 
 def open_browser():
     """Open web browser after a delay"""
+    import webbrowser
+
     url = "http://localhost:5001"
     print(f"\nOpening web browser: {url}")
     webbrowser.open(url)
@@ -30,6 +34,7 @@ def create_opac_app():
     # Configuration
     app.config['SECRET_KEY'] = 'opac-secret-key'
     app.config['WTF_CSRF_ENABLED'] = False
+    configure_template_cache(app)
 
     # Database path
     if getattr(sys, 'frozen', False):
@@ -43,16 +48,19 @@ def create_opac_app():
 
     app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = serving.engine_options()
 
     # Initialize database
     db.init_app(app)
 
     with app.app_context():
         db.create_all()
+        install_triggers()
 
     # Register only OPAC blueprints
     app.register_blueprint(opac_bp)
     app.register_blueprint(patron_auth_bp)
+    app.register_blueprint(catalog_api_bp)
 
     # Override the root route to go to OPAC
     @app.route('/')
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+OPAC server on an ASGI server
+Cached catalog pages are served on the event loop, everything else on a bounded thread pool
+
+    uvicorn run_opac_asgi:app --port 5001
+    gunicorn --config gunicorn.conf.py -k uvicorn.workers.UvicornWorker run_opac_asgi:app
+"""
+
+import sys
+import os
+
+# Add the current directory to Python path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.opac_asgi import OpacASGI
+from run_opac import app as opac_app
+
+app = OpacASGI(opac_app)
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("❌ uvicorn is not installed (pip install -r requirements-prod.txt); use run_opac.py instead")
+
+    print("=" * 50)
+    print("Library Management System - OPAC (ASGI)")
+    print("=" * 50)
+    print("OPAC: http://localhost:5001")
+    print(f"Database threads: {app.threads}")
+    print("Press Ctrl+C to stop the server")
+    print("-" * 50)
+
+    uvicorn.run(app, host='0.0.0.0', port=5001)
@@ -78,7 +78,7 @@ def main():
 
     # Import and run the Flask app
     try:
-        from app import create_app
+        from app import create_app, precompile_templates
         from run_opac import create_opac_app
         from app.database import Database
         from threading import Thread
@@ -93,10 +93,13 @@ def main():
         else:
             print("❌ Database connection failed, but continuing...")
 
-        # Create both apps
-        full_app = create_app()
+        # Create both apps; the admin app leaves the OPAC routes to the OPAC server
+        full_app = create_app(interfaces=['admin'])
         opac_app = create_opac_app()
 
+        # Fill the template caches in the background so first page views don't compile
+        Thread(target=precompile_templates, args=(full_app,), daemon=True).start()
+
         def run_full_app():
             print("Starting full library management server on http://localhost:5000")
             try:
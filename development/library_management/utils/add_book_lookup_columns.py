@@ -0,0 +1,69 @@
+"""
+Database migration script to add normalized isbn13/accession_norm lookup columns to books table
+"""
+
+import sqlite3
+import os
+import sys
+
+# Add the parent directory to the path to import the normalizers
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.identifiers import normalize_isbn, normalize_accession
+
+def add_book_lookup_columns():
+    """Add, backfill and index the isbn13 and accession_norm columns"""
+
+    # Determine database path
+    if os.path.exists('development/data/library.db'):
+        db_path = 'development/data/library.db'
+    elif os.path.exists('instance/library.db'):
+        db_path = 'instance/library.db'
+    elif os.path.exists('data/library.db'):
+        db_path = 'data/library.db'
+    else:
+        print("❌ Database not found!")
+        return
+
+    print(f"📍 Using database: {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("PRAGMA table_info(books)")
+        column_names = [col[1] for col in cursor.fetchall()]
+
+        for name, ddl in (('isbn13', 'ALTER TABLE books ADD COLUMN isbn13 VARCHAR(13)'),
+                          ('accession_norm', 'ALTER TABLE books ADD COLUMN accession_norm VARCHAR(50)')):
+            if name in column_names:
+                print(f"ℹ️ {name} column already exists")
+            else:
+                print(f"➕ Adding {name} column to books table...")
+                cursor.execute(ddl)
+                print(f"✅ Successfully added {name} column")
+
+        # Backfill every row so values written before this migration are covered
+        print("🔄 Backfilling normalized values...")
+        cursor.execute("SELECT id, isbn, accession_number FROM books")
+        updates = [(normalize_isbn(isbn), normalize_accession(accession), book_id)
+                   for book_id, isbn, accession in cursor.fetchall()]
+        cursor.executemany("UPDATE books SET isbn13 = ?, accession_norm = ? WHERE id = ?", updates)
+        print(f"✅ Backfilled {len(updates)} books")
+
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_books_isbn13 ON books (isbn13)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_books_accession_norm ON books (accession_norm)")
+        cursor.execute("ANALYZE books")
+        conn.commit()
+        print("✅ Lookup indexes ready")
+
+    except Exception as e:
+        print(f"❌ Error during migration: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    print("🚀 Adding normalized lookup columns to books table...")
+    add_book_lookup_columns()
+    print("✨ Books lookup column migration completed!")
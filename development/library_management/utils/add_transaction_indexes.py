@@ -0,0 +1,56 @@
+"""
+Database migration script to add patron_id/book_id indexes to transactions table
+"""
+
+import sqlite3
+import os
+
+def add_transaction_indexes():
+    """Add indexes backing the paginated patron and book history views"""
+
+    # Determine database path
+    if os.path.exists('development/data/library.db'):
+        db_path = 'development/data/library.db'
+    elif os.path.exists('instance/library.db'):
+        db_path = 'instance/library.db'
+    elif os.path.exists('data/library.db'):
+        db_path = 'data/library.db'
+    else:
+        print("❌ Database not found!")
+        return
+
+    print(f"📍 Using database: {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        indexes = {
+            'ix_transactions_patron_id': 'CREATE INDEX IF NOT EXISTS ix_transactions_patron_id ON transactions (patron_id)',
+            'ix_transactions_book_id': 'CREATE INDEX IF NOT EXISTS ix_transactions_book_id ON transactions (book_id)',
+        }
+
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='transactions'")
+        existing = {row[0] for row in cursor.fetchall()}
+
+        for name, ddl in indexes.items():
+            if name in existing:
+                print(f"ℹ️ {name} already exists")
+            else:
+                print(f"➕ Creating {name}...")
+                cursor.execute(ddl)
+                print(f"✅ Successfully created {name}")
+
+        cursor.execute("ANALYZE transactions")
+        conn.commit()
+
+    except Exception as e:
+        print(f"❌ Error during migration: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    print("🚀 Adding indexes to transactions table...")
+    add_transaction_indexes()
+    print("✨ Transactions index migration completed!")
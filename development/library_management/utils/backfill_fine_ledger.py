@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Script to backfill the fines ledger from existing transactions
+- Creates the fine_ledger and patron_balances tables if missing
+- Appends an assessment for every fined transaction and a payment for every paid one
+- Rebuilds patron_balances from the ledger
+Safe to re-run: transactions already in the ledger are skipped.
+create_app() runs the backfill itself while the ledger is still empty, and
+the restore routes after every restore.
+"""
+
+import sys
+import os
+
+# Add the parent directory to the path to import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.db import db
+from app import ledger
+
+def backfill_fine_ledger():
+    """Create ledger tables and backfill them from transactions"""
+    app = create_app()
+    with app.app_context():
+        # create_app() already ran create_all(), which creates the ledger tables and triggers
+        with db.engine.connect() as conn:
+            try:
+                result = ledger.backfill_from_transactions(conn)
+                conn.commit()
+                print(f"✅ Added {result['assessments']} assessments and {result['payments']} payments to the ledger")
+            except Exception as e:
+                print(f"❌ Error during backfill: {e}")
+                conn.rollback()
+
+if __name__ == "__main__":
+    print("🚀 Backfilling fines ledger...")
+    backfill_fine_ledger()
+    print("✨ Fines ledger backfill completed!")
@@ -0,0 +1,207 @@
+"""
+Throughput benchmark for the gunicorn worker settings
+
+Starts `gunicorn --config gunicorn.conf.py run:app` once per worker
+configuration and drives it with concurrent keep-alive clients sharing
+one staff login. Most requests are staff page reads. A
+--write-share of them re-save the library settings unchanged, which
+commits nine rows, so the writes contend on the SQLite lock the way
+issues and returns do. For each configuration it prints requests per
+second, median and 95th percentile latency, failed requests and the
+resident memory of the gunicorn processes. --slow-clients adds
+connections that trickle their headers in, as phones on weak Wi-Fi do
+when there is no buffering proxy in front.
+
+    python utils/benchmark_server.py [--configs sync:4:1,gthread:2:4] [--clients 32] [--seconds 10]
+
+A configuration is worker_class:workers:threads. Settings writes go to
+the live database, so run it against a copy.
+"""
+
+import argparse
+import http.client
+import os
+import random
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The database create_app() serves in a development checkout
+DB_PATH = os.path.join(os.path.dirname(APP_DIR), 'data', 'library.db')
+
+READ_PATHS = ['/dashboard', '/books', '/books?page=2', '/patrons', '/fines', '/transaction_logs']
+SETTING_KEYS = ['fine_per_day', 'student_due_days', 'faculty_due_days', 'staff_due_days', 'student_max_books',
+                'faculty_max_books', 'staff_max_books', 'library_name', 'librarian_email']
+
+def current_settings(db_path):
+    """The settings form, filled with the values already stored"""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = dict(conn.execute('SELECT setting_key, setting_value FROM library_settings'))
+    finally:
+        conn.close()
+    return urlencode({key: rows[key] for key in SETTING_KEYS if key in rows})
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(('127.0.0.1', port)) == 0:
+                return True
+        time.sleep(0.2)
+    return False
+
+def login(port, username, password):
+    """Session cookie of a staff login, shared by all clients.
+
+    Password hashing is deliberately slow, so logging in each client
+    would dominate a short run.
+    """
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        conn.request('POST', '/login', urlencode({'username': username, 'password': password}),
+                     {'Content-Type': 'application/x-www-form-urlencoded'})
+        response = conn.getresponse()
+        response.read()
+        if response.status != 302:
+            raise RuntimeError(f"login as {username} failed with status {response.status}")
+        return response.getheader('Set-Cookie').split(';', 1)[0]
+    finally:
+        conn.close()
+
+def slow_client(port, delay, deadline):
+    """Hold a connection open by sending each request's headers over `delay` seconds"""
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=60) as sock:
+                sock.sendall(b'GET /login HTTP/1.1\r\nHost: localhost\r\n')
+                time.sleep(delay)
+                sock.sendall(b'Connection: close\r\n\r\n')
+                while sock.recv(65536):
+                    pass
+        except OSError:
+            time.sleep(0.1)
+
+def total_rss_mb(pid):
+    """Resident memory of a process and its children in MB (Linux only, else None)"""
+    try:
+        pids = [pid] + [int(child) for child in open(f'/proc/{pid}/task/{pid}/children').read().split()]
+        return sum(int(line.split()[1]) for p in pids for line in open(f'/proc/{p}/status')
+                   if line.startswith('VmRSS:')) / 1024
+    except OSError:
+        return None
+
+class Client(threading.Thread):
+    """One keep-alive connection issuing requests until the deadline"""
+
+    def __init__(self, port, cookie, settings_form, write_share, measure_from, deadline):
+        super().__init__(daemon=True)
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        self.cookie = cookie
+        self.settings_form = settings_form
+        self.write_share = write_share
+        self.measure_from = measure_from
+        self.deadline = deadline
+        self.latencies = []
+        self.errors = 0
+
+    def request(self, method, path, body=None):
+        headers = {'Cookie': self.cookie}
+        if body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        self.conn.request(method, path, body, headers)
+        response = self.conn.getresponse()
+        response.read()
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return response.status
+
+    def run(self):
+        while time.monotonic() < self.deadline:
+            started = time.perf_counter()
+            try:
+                if random.random() < self.write_share:
+                    status = self.request('POST', '/settings', self.settings_form)
+                else:
+                    status = self.request('GET', random.choice(READ_PATHS))
+            except (OSError, http.client.HTTPException):
+                self.conn.close()
+                status = None
+            if time.monotonic() < self.measure_from:
+                continue
+            if status in (200, 302):
+                self.latencies.append(time.perf_counter() - started)
+            else:
+                self.errors += 1
+
+def run_config(config, args, settings_form):
+    worker_class, workers, threads = config.split(':')
+    port = args.port
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+         '--worker-class', worker_class, '--workers', workers, '--threads', threads,
+         '--pid', os.path.join(APP_DIR, f'.benchmark-{port}.pid'), '--access-logfile', '/dev/null',
+         '--log-level', 'warning', 'run:app'],
+        cwd=APP_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port(port):
+            raise RuntimeError(f"gunicorn did not start for {config}")
+
+        cookie = login(port, args.username, args.password)
+        # Requests during the warm-up let every worker fill its caches and are not counted
+        measure_from = time.monotonic() + args.warmup
+        clients = [Client(port, cookie, settings_form, args.write_share, measure_from, measure_from + args.seconds)
+                   for _ in range(args.clients)]
+        for _ in range(args.slow_clients):
+            threading.Thread(target=slow_client, args=(port, args.slow_delay, measure_from + args.seconds),
+                             daemon=True).start()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        rss = total_rss_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = sorted(latency for client in clients for latency in client.latencies)
+    errors = sum(client.errors for client in clients)
+    if not latencies:
+        return config, 0, 0, 0, errors, rss
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else latencies[-1]
+    return config, len(latencies) / args.seconds, statistics.median(latencies) * 1000, p95 * 1000, errors, rss
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--configs', default='sync:4:1,gthread:1:8,gthread:2:4,gthread:4:4',
+                        help='comma-separated worker_class:workers:threads')
+    parser.add_argument('--clients', type=int, default=32, help='concurrent keep-alive clients')
+    parser.add_argument('--seconds', type=int, default=10, help='measured seconds per configuration')
+    parser.add_argument('--warmup', type=int, default=3, help='uncounted seconds before measuring')
+    parser.add_argument('--write-share', type=float, default=0.1, help='share of requests that save settings')
+    parser.add_argument('--slow-clients', type=int, default=0,
+                        help='extra clients that trickle their request headers, like phones on weak Wi-Fi')
+    parser.add_argument('--slow-delay', type=float, default=1.0, help='seconds a slow client takes to send headers')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin123')
+    args = parser.parse_args()
+
+    settings_form = current_settings(DB_PATH)
+    print(f"{args.clients} clients ({args.slow_clients} slow), {args.seconds}s per configuration, "
+          f"{args.write_share:.0%} writes, {os.cpu_count()} CPUs")
+    print(f"{'configuration':<16}{'req/s':>8}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}{'RSS MB':>9}")
+    for config in args.configs.split(','):
+        name, rps, p50, p95, errors, rss = run_config(config, args, settings_form)
+        rss = f'{rss:.0f}' if rss is not None else '-'
+        print(f"{name:<16}{rps:>8.1f}{p50:>10.1f}{p95:>10.1f}{errors:>8}{rss:>9}")
+
+if __name__ == "__main__":
+    main()
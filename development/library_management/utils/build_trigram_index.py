@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Build (or rebuild) the book_trigrams postings used by fuzzy OPAC search
+"""
+
+import sys
+import os
+import time
+
+# Add the parent directory to the path to import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app import create_app
+from app.db import db
+from app import trigram_index
+
+def build_trigram_index():
+    """Rebuild every trigram posting from the books table"""
+    app = create_app()
+    with app.app_context():
+        try:
+            start = time.perf_counter()
+            with db.engine.begin() as conn:
+                trigram_index.rebuild(conn)
+                conn.execute(text('ANALYZE book_trigrams'))
+                postings = conn.execute(text('SELECT COUNT(*) FROM book_trigrams')).scalar()
+            print(f"✅ Indexed {postings} trigram postings in {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            print(f"❌ Error building trigram index: {e}")
+
+if __name__ == "__main__":
+    print("🚀 Building trigram index for fuzzy search...")
+    build_trigram_index()
+    print("✨ Trigram index build completed!")
@@ -0,0 +1,91 @@
+"""
+Startup time regression check for the admin app and the OPAC app
+
+Each app is started in a fresh interpreter and timed from process launch
+to the first response. A second run under `python -X importtime` reports
+the slowest imports and checks that modules kept lazy (backup, restore,
+import engines, pandas) are not imported before the first request.
+Exits non-zero when an app is over budget or imports a lazy module.
+
+    python utils/check_startup_time.py [--budget-ms 1500] [--runs 3]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (code that builds the app into `app`, first URL to request)
+TARGETS = {
+    'admin': ("from app import create_app\napp = create_app(interfaces=['admin'])", '/login'),
+    'opac': ("from run_opac import app", '/opac')
+}
+
+# Modules that must stay off the startup path
+LAZY_MODULES = ['pandas', 'app.snapshots', 'app.backup_archive', 'app.backup_catalog', 'app.csv_backup',
+                'app.restore_engine', 'app.staged_import', 'app.backup_scheduler']
+
+def _script(target):
+    setup, url = TARGETS[target]
+    return (
+        "import contextlib, io, sys\n"
+        f"sys.path.insert(0, {APP_DIR!r})\n"
+        "with contextlib.redirect_stdout(io.StringIO()):\n"
+        + ''.join(f"    {line}\n" for line in setup.split('\n'))
+        + f"    status = app.test_client().get({url!r}).status_code\n"
+        "print(status)\n"
+    )
+
+def time_first_request(target):
+    """Wall-clock seconds from process launch to the first response"""
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', _script(target)], capture_output=True, text=True, cwd=APP_DIR)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0 or result.stdout.strip() not in ('200', '302'):
+        raise RuntimeError(f"{target} app failed to serve its first request:\n{result.stderr[-2000:]}")
+    return elapsed
+
+def import_profile(target):
+    """{module: (cumulative microseconds, nesting depth)} from -X importtime"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', _script(target)],
+                            capture_output=True, text=True, cwd=APP_DIR)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules[name.strip()] = (int(cumulative), depth)
+    return modules
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--budget-ms', type=int, default=int(os.getenv('STARTUP_BUDGET_MS', '1500')),
+                        help='time-to-first-request budget per app (default 1500)')
+    parser.add_argument('--runs', type=int, default=3, help='timed runs per app; the best is compared')
+    parser.add_argument('--top', type=int, default=10, help='slowest imports to list')
+    args = parser.parse_args()
+
+    failed = False
+    for target in TARGETS:
+        best = min(time_first_request(target) for _ in range(args.runs)) * 1000
+        modules = import_profile(target)
+        eager = [name for name in LAZY_MODULES if name in modules]
+
+        status = '✅' if best <= args.budget_ms and not eager else '❌'
+        print(f"{status} {target}: first response {best:.0f} ms (budget {args.budget_ms} ms)")
+        # Imports made directly by the app or by its first-level modules
+        direct = [(cumulative, name) for name, (cumulative, depth) in modules.items() if depth <= 1]
+        for cumulative, name in sorted(direct, reverse=True)[:args.top]:
+            print(f"     {cumulative / 1000:8.1f} ms  {name}")
+        if eager:
+            print(f"   ❌ imported at startup but should be lazy: {', '.join(eager)}")
+        failed = failed or status == '❌'
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
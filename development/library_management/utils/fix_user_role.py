@@ -50,6 +50,14 @@ def fix_user_role():
             else:
                 print(f"  ℹ️  {username} already has admin role")
 
+        # Tell running app workers to drop their cached user principals
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='cache_versions'")
+        if cursor.fetchone():
+            cursor.execute('''
+                INSERT INTO cache_versions (name, version) VALUES ('principals', 1)
+                ON CONFLICT(name) DO UPDATE SET version = version + 1
+            ''')
+
         # Commit changes
         conn.commit()
         conn.close()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Database migration script to normalize transactions.fine_amount to REAL
+- Converts NULL, '' and numeric strings in fine_amount to REAL values
+- Converts fine_paid to 0/1 integers
+- Installs triggers that keep fine_amount REAL on every later write
+- Creates the partial index backing the outstanding fines page
+"""
+
+import sys
+import os
+
+# Add the parent directory to the path to import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app import create_app
+from app.db import db
+from app.models import Transaction, FINE_AMOUNT_TRIGGERS
+
+def normalize_fine_amount():
+    """Normalize fine_amount/fine_paid and create the outstanding fines index"""
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            try:
+                # 1. Count values that are not stored as REAL
+                bad_amounts = conn.execute(text('''
+                    SELECT COUNT(*) FROM transactions
+                    WHERE fine_amount IS NULL OR typeof(fine_amount) != 'real'
+                ''')).scalar()
+                print(f"🔍 Found {bad_amounts} fine_amount values not stored as REAL")
+
+                if bad_amounts:
+                    conn.execute(text('''
+                        UPDATE transactions
+                        SET fine_amount = COALESCE(CAST(NULLIF(TRIM(fine_amount), '') AS REAL), 0.0)
+                        WHERE fine_amount IS NULL OR typeof(fine_amount) != 'real'
+                    '''))
+                    print(f"✅ Normalized {bad_amounts} fine_amount values")
+
+                # 2. Normalize fine_paid to 0/1
+                conn.execute(text('''
+                    UPDATE transactions
+                    SET fine_paid = CASE WHEN fine_paid IN (1, '1', 'True', 'true') THEN 1 ELSE 0 END
+                    WHERE fine_paid IS NULL OR typeof(fine_paid) != 'integer'
+                '''))
+
+                # 3. Keep fine_amount REAL on future writes
+                for trigger_sql in FINE_AMOUNT_TRIGGERS:
+                    conn.execute(text(trigger_sql))
+                print("✅ fine_amount normalization triggers installed")
+
+                # 4. Partial index for the outstanding fines page
+                for index in Transaction.__table__.indexes:
+                    index.create(conn, checkfirst=True)
+                conn.execute(text('ANALYZE transactions'))
+                print("✅ Outstanding fines index ready")
+
+                conn.commit()
+
+                # Verify the fix
+                remaining = conn.execute(text('''
+                    SELECT COUNT(*) FROM transactions
+                    WHERE fine_amount IS NULL OR typeof(fine_amount) != 'real'
+                ''')).scalar()
+                if remaining == 0:
+                    print("✅ All fine_amount values are REAL")
+                else:
+                    print(f"⚠️ Still {remaining} non-REAL values remaining")
+
+            except Exception as e:
+                print(f"❌ Error during migration: {e}")
+                conn.rollback()
+
+if __name__ == "__main__":
+    print("🚀 Normalizing transactions.fine_amount...")
+    normalize_fine_amount()
+    print("✨ Fine amount migration completed!")
@@ -0,0 +1,34 @@
+"""
+Reconcile the backup catalog with the files in a backup directory
+
+Run after copying backups in or deleting them by hand:
+    python utils/reconcile_backup_catalog.py [backup_dir]
+"""
+
+import os
+import sys
+
+# Add the parent directory to the path to import the catalog
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import backup_catalog
+
+def reconcile_backup_catalog(backup_dir):
+    """Add uncataloged backup files and drop entries whose files are gone"""
+    if not os.path.isdir(backup_dir):
+        print(f"❌ Backup directory not found: {backup_dir}")
+        return
+
+    print(f"📍 Using backup directory: {backup_dir}")
+    result = backup_catalog.reconcile(backup_dir)
+
+    for filename in result['added']:
+        print(f"➕ Cataloged {filename}")
+    for filename in result['removed']:
+        print(f"➖ Dropped missing {filename}")
+    print(f"✅ {len(result['added'])} files added, {len(result['removed'])} entries removed")
+
+if __name__ == "__main__":
+    print("🚀 Reconciling backup catalog...")
+    reconcile_backup_catalog(sys.argv[1] if len(sys.argv) > 1 else backup_catalog.BACKUP_DIR)
+    print("✨ Backup catalog reconcile completed!")
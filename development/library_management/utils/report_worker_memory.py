@@ -0,0 +1,124 @@
+"""
+Per-worker memory report for the pre-fork warm-up
+
+Starts gunicorn with gunicorn.conf.py twice, once with PREFORK_WARM_UP
+off and once on, and reads each worker's memory from
+/proc/<pid>/smaps_rollup (Linux only) twice: right after the fork, and
+after every worker has served the same page mix. The report shows each
+worker's RSS, how much of it is private and how much is still shared
+with the master, and the total PSS (fair share of the machine's memory)
+of the workers alone and with the master. Run it for run:app and
+run_opac:app and compare their sum with run_combined:app to see what
+combined mode saves.
+
+    python utils/report_worker_memory.py [--app run_opac:app] [--workers 4] [--requests 400]
+"""
+
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PATHS = {
+    'run_opac:app': ['/opac', '/opac/search?search=data', '/opac/search?search=history&status=all',
+                     '/opac/categories', '/api/suggest?q=intro', '/opac/search?search=algoritms'],
+    'run:app': ['/login', '/terms'],
+    'run_combined:app': ['/login', '/terms', '/catalog/opac', '/catalog/opac/search?search=data',
+                         '/catalog/opac/categories', '/catalog/api/suggest?q=intro']
+}
+
+def wait_for_port(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(('127.0.0.1', port)) == 0:
+                return True
+        time.sleep(0.2)
+    return False
+
+def worker_pids(master_pid, expected, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        pids = [int(pid) for pid in open(f'/proc/{master_pid}/task/{master_pid}/children').read().split()]
+        if len(pids) >= expected:
+            return pids
+        time.sleep(0.2)
+    raise RuntimeError(f"only {len(pids)} of {expected} workers started")
+
+def memory_kb(pid):
+    """{field: kB} from smaps_rollup"""
+    fields = {}
+    for line in open(f'/proc/{pid}/smaps_rollup'):
+        parts = line.split()
+        if len(parts) == 3 and parts[2] == 'kB':
+            fields[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        'rss': fields['Rss'],
+        'pss': fields['Pss'],
+        'private': fields['Private_Clean'] + fields['Private_Dirty'],
+        'shared': fields['Shared_Clean'] + fields['Shared_Dirty']
+    }
+
+def drive(port, paths, count):
+    """Spread count requests over new connections, so every worker serves some"""
+    for i in range(count):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        try:
+            conn.request('GET', paths[i % len(paths)], headers={'Connection': 'close'})
+            conn.getresponse().read()
+        finally:
+            conn.close()
+
+def measure(args, warm_up):
+    env = dict(os.environ, PREFORK_WARM_UP='true' if warm_up else 'false')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{args.port}',
+         '--workers', str(args.workers), '--pid', os.path.join(APP_DIR, f'.memory-{args.port}.pid'),
+         '--access-logfile', '/dev/null', '--log-level', 'warning', args.app],
+        cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port(args.port):
+            raise RuntimeError(f"gunicorn did not start for {args.app}")
+        pids = worker_pids(server.pid, args.workers)
+        time.sleep(1)
+        forked = (memory_kb(server.pid), [memory_kb(pid) for pid in pids])
+        drive(args.port, PATHS.get(args.app, ['/']), args.requests)
+        served = (memory_kb(server.pid), [memory_kb(pid) for pid in pids])
+    finally:
+        server.terminate()
+        server.wait()
+    return forked, served
+
+def summary(label, reading):
+    master, workers = reading
+    count = len(workers)
+    mb = lambda field: sum(w[field] for w in workers) / 1024
+    print(f"{label:<26}{mb('rss') / count:>10.1f}{mb('private') / count:>12.1f}"
+          f"{mb('shared') / count:>11.1f}{mb('pss'):>12.1f}{mb('pss') + master['pss'] / 1024:>13.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--app', default='run_opac:app', help='gunicorn app module (run_opac:app, run:app or run_combined:app)')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=400, help='requests served before the second reading')
+    parser.add_argument('--port', type=int, default=5098)
+    args = parser.parse_args()
+
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        sys.exit("❌ /proc/<pid>/smaps_rollup is needed (Linux 4.14+)")
+
+    print(f"{args.app}, {args.workers} workers, {args.requests} requests")
+    print(f"{'per worker (MB)':<26}{'RSS':>10}{'private':>12}{'shared':>11}{'worker PSS':>12}{'with master':>13}")
+    for warm_up in (False, True):
+        forked, served = measure(args, warm_up)
+        mode = 'warm-up' if warm_up else 'no warm-up'
+        summary(f"{mode}, after fork", forked)
+        summary(f"{mode}, after traffic", served)
+
+if __name__ == "__main__":
+    main()
@@ -9,23 +9,18 @@ import sys
 import subprocess
 import time
 import socket
-import csv
+import tempfile
 import threading
+import importlib.util
 from datetime import datetime
+from werkzeug.serving import run_simple
 
 # Add library_management directory to path for imports
-sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'library_management'))
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'library_management')
+sys.path.append(APP_DIR)
 
-from app import create_app
+from app import create_app, serving
 from app.database import Database
-from run_opac import create_opac_app
-
-# Try to import pandas, but don't fail if it's not available
-try:
-    import pandas as pd
-    PANDAS_AVAILABLE = True
-except ImportError:
-    PANDAS_AVAILABLE = False
 
 def check_server_running(host='0.0.0.0', port=5000):
     """Check if server is already running on specified host and port"""
@@ -46,134 +41,75 @@ def check_opac_running():
     return check_server_running(port=5001)
 
 def create_csv_backup():
-    """Create CSV backup of current database"""
+    """Create a CSV system backup of current database (same file set as the Backup page)"""
     try:
-        # Create backups directory if it doesn't exist (in project root)
-        backup_dir = 'backups'
-        os.makedirs(backup_dir, exist_ok=True)
-
-        # Generate timestamp for backup file
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_file = os.path.join(backup_dir, f'library_backup_{timestamp}.csv')
+        from app.csv_backup import create_system_backup
 
-        # Get database connection using the robust Database class
+        # Get the database path using the robust Database class
         # The Database class now has built-in PyInstaller support
         db = Database()
-        conn = db.get_connection()
-        if not conn:
+        if not db.db_path or not os.path.exists(db.db_path):
             print("Error: Could not connect to database - database may not exist yet")
             return False
 
-        # Read all tables and create backup (correct table names from database)
-        tables = ['users', 'books', 'patrons', '"transaction"', 'category', 'library_settings']
-
-        if PANDAS_AVAILABLE:
-            # Use pandas if available
-            all_data = []
-            for table in tables:
-                try:
-                    df = pd.read_sql_query(f"SELECT * FROM {table}", conn)
-                    if not df.empty:
-                        df['table_name'] = table
-                        all_data.append(df)
-                except Exception as e:
-                    print(f"Warning: Could not backup table {table}: {e}")
-
-            if all_data:
-                # Combine all tables into single backup file
-                combined_df = pd.concat(all_data, ignore_index=True)
-                combined_df.to_csv(backup_file, index=False)
-                print(f"CSV backup created: {backup_file}")
-                return True
-            else:
-                print("No data found to backup")
-                return False
-        else:
-            # Fallback method using only built-in libraries
-            with open(backup_file, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = None
-                rows_written = 0
-
-                for table in tables:
-                    try:
-                        cursor = conn.execute(f"SELECT * FROM {table}")
-                        rows = cursor.fetchall()
-                        column_names = [description[0] for description in cursor.description]
-
-                        if writer is None:
-                            # Write header for first table
-                            all_columns = column_names + ['table_name']
-                            writer = csv.writer(csvfile)
-                            writer.writerow(all_columns)
-
-                        if rows:
-                            # Add table_name to each row
-                            for row in rows:
-                                row_with_table = list(row) + [table]
-                                writer.writerow(row_with_table)
-                                rows_written += 1
-
-                    except Exception as e:
-                        print(f"Warning: Could not backup table {table}: {e}")
-
-                if rows_written > 0:
-                    print(f"CSV backup created: {backup_file} ({rows_written} rows)")
-                    return True
-                else:
-                    print("No data found to backup")
-                    return False
+        # Same backup directory as the Backup page (app/backup_paths.py), streamed table by table
+        started = time.perf_counter()
+        manifest = create_system_backup(db.db_path)
+        total_rows = sum(f['record_count'] for f in manifest['files'])
+        print(f"CSV backup created: system_backup_*_{manifest['timestamp']} "
+              f"({total_rows} rows in {time.perf_counter() - started:.1f}s)")
+        return True
 
     except Exception as e:
         print(f"Error creating CSV backup: {e}")
         return False
-    finally:
-        if 'conn' in locals():
-            conn.close()
+
+def gunicorn_available():
+    """Gunicorn runs from a source checkout on POSIX systems, not in the exe or on Windows"""
+    if getattr(sys, 'frozen', False) or os.name == 'nt':
+        return False
+    return importlib.util.find_spec('gunicorn') is not None
+
+def serve(make_app, app_module, port):
+    """Serve app_module under gunicorn's gthread workers (gunicorn.conf.py), or make_app() on the Flask server
+
+    Under gunicorn the app is only built by gunicorn, not also in this process.
+    """
+    if gunicorn_available():
+        print(f"Using Gunicorn ({serving.worker_count()} workers x {serving.thread_count()} threads)...")
+        # Gunicorn's master needs the main thread of its own process for signal handling
+        subprocess.run([sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+                        '--bind', f'0.0.0.0:{port}', '--pid', os.path.join(tempfile.gettempdir(), f'gunicorn-{port}.pid'),
+                        app_module], cwd=APP_DIR)
+    else:
+        print("Gunicorn not available, using Flask development server...")
+        app = make_app()
+        if hasattr(app, 'run'):
+            app.run(
+                host='0.0.0.0',
+                port=port,
+                debug=True,
+                use_reloader=False
+            )
+        else:
+            # The combined app is plain WSGI middleware
+            run_simple('0.0.0.0', port, app, threaded=True)
 
 def start_admin_server():
     """Start the admin server on port 5000"""
     try:
         print("Starting Admin Server on port 5000...")
-        app = create_app()
-
-        # Create CSV backup AFTER database is created
-        print("Creating database backup...")
-        backup_success = create_csv_backup()
 
-        if not backup_success:
-            print("Warning: Backup failed or no data to backup, but continuing...")
+        # Back up the existing database in the background so startup doesn't wait
+        print("Creating database backup in the background...")
+        threading.Thread(target=create_csv_backup, name='startup-backup', daemon=True).start()
 
         print("Admin Server started successfully!")
         print("Access the admin interface at: http://localhost:5000 or http://[YOUR_IP]:5000")
         print("Dashboard: http://localhost:5000/dashboard or http://[YOUR_IP]:5000/dashboard")
         print("Login: http://localhost:5000/login or http://[YOUR_IP]:5000/login")
 
-        # Try to use Gunicorn if available, fallback to Flask dev server
-        try:
-            from gunicorn.app.wsgiapp import WSGIApplication
-            print("Using Gunicorn for better performance...")
-
-            # Create a minimal Gunicorn config for development
-            class DevGunicornConfig:
-                bind = "0.0.0.0:5000"
-                workers = 2
-                worker_class = "sync"
-                timeout = 30
-                reload = True
-                loglevel = "info"
-
-            config = DevGunicornConfig()
-            WSGIApplication("%(prog)s [OPTIONS] [APP_MODULE]", config).run()
-
-        except ImportError:
-            print("Gunicorn not available, using Flask development server...")
-            # Run the admin application with Flask dev server
-            app.run(
-                host='0.0.0.0',
-                port=5000,
-                debug=True,
-                use_reloader=False
-            )
+        serve(lambda: create_app(interfaces=['admin']), 'run:app', 5000)
 
     except KeyboardInterrupt:
         print("\nAdmin Server stopped by user")
@@ -184,44 +120,40 @@ def start_opac_server():
     """Start the OPAC server on port 5001"""
     try:
         print("Starting OPAC Server on port 5001...")
-        app = create_opac_app()
-
         print("OPAC Server started successfully!")
         print("Access the OPAC interface at: http://localhost:5001 or http://[YOUR_IP]:5001")
         print("OPAC Search: http://localhost:5001/opac/search or http://[YOUR_IP]:5001/opac/search")
 
-        # Try to use Gunicorn if available, fallback to Flask dev server
-        try:
-            from gunicorn.app.wsgiapp import WSGIApplication
-            print("Using Gunicorn for better performance...")
-
-            # Create a minimal Gunicorn config for development
-            class DevGunicornConfig:
-                bind = "0.0.0.0:5001"
-                workers = 2
-                worker_class = "sync"
-                timeout = 30
-                reload = True
-                loglevel = "info"
-
-            config = DevGunicornConfig()
-            WSGIApplication("%(prog)s [OPTIONS] [APP_MODULE]", config).run()
-
-        except ImportError:
-            print("Gunicorn not available, using Flask development server...")
-            # Run the OPAC application with Flask dev server
-            app.run(
-                host='0.0.0.0',
-                port=5001,
-                debug=True,
-                use_reloader=False
-            )
+        serve(lambda: importlib.import_module('run_opac').app, 'run_opac:app', 5001)
 
     except KeyboardInterrupt:
         print("\nOPAC Server stopped by user")
     except Exception as e:
         print(f"Error starting OPAC server: {e}")
 
+def start_combined_server():
+    """Start the admin interface and the OPAC in one process on port 5000"""
+    try:
+        if check_admin_running():
+            print("Warning: A server is already running on http://localhost:5000 or http://[YOUR_IP]:5000")
+            return False
+
+        print("Starting Library Management System (admin and OPAC in one process)...")
+        # One thread pool for both mounts: 4 admin request slots and 4 OPAC slots per worker
+        os.environ.setdefault('WEB_THREADS', '8')
+
+        print("Creating database backup in the background...")
+        threading.Thread(target=create_csv_backup, name='startup-backup', daemon=True).start()
+
+        print("Admin Interface: http://localhost:5000 or http://[YOUR_IP]:5000")
+        print(f"OPAC Interface:  http://localhost:5000{serving.OPAC_MOUNT}/ or http://[YOUR_IP]:5000{serving.OPAC_MOUNT}/")
+        serve(lambda: importlib.import_module('run_combined').app, 'run_combined:app', 5000)
+
+    except KeyboardInterrupt:
+        print("\nServer stopped by user")
+    except Exception as e:
+        print(f"Error starting combined server: {e}")
+
 def start_server():
     """Start both admin and OPAC servers"""
     try:
@@ -300,10 +232,12 @@ def main():
             stop_server()
         elif command == 'status':
             show_status()
+        elif command == 'combined':
+            start_combined_server()
         elif command == 'backup':
             create_csv_backup()
         else:
-            print("Unknown command. Use: start, stop, status, or backup")
+            print("Unknown command. Use: start, combined, stop, status, or backup")
     else:
         # Default action is to start the server
         start_server()
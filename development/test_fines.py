@@ -14,30 +14,36 @@ def test_fines():
         print("Testing fines query...")
 
         try:
-            # Test the main fines query
+            # Test the main fines query (first page, backed by the outstanding fines partial index)
             outstanding_fines = conn.execute(text('''
-                SELECT t.*, p.name as patron_name, p.roll_no, b.title as book_title, b.accession_number
+                SELECT t.id, t.fine_amount, p.name as patron_name, p.roll_no, b.title as book_title, b.accession_number
                 FROM transactions t
                 JOIN patrons p ON t.patron_id = p.id
                 JOIN books b ON t.book_id = b.id
-                WHERE CAST(t.fine_amount AS REAL) > 0 AND t.fine_paid = 0 AND t.status = 'returned'
-                ORDER BY CAST(t.fine_amount AS REAL) DESC
+                WHERE t.fine_paid = 0 AND t.status = 'returned' AND t.fine_amount > 0
+                ORDER BY t.fine_amount DESC, t.id DESC
+                LIMIT 26
             ''')).fetchall()
-            print(f"Query successful! Found {len(outstanding_fines)} outstanding fines")
+            print(f"Query successful! Found {len(outstanding_fines)} outstanding fines on the first page")
 
             # Test stats query
             stats_result = conn.execute(text('''
-                SELECT
-                    COUNT(*) as total_outstanding,
-                    COALESCE(SUM(CASE WHEN fine_amount IS NULL OR fine_amount = '' THEN 0.0 ELSE CAST(fine_amount AS REAL) END), 0) as total_amount,
-                    COALESCE(AVG(CASE WHEN fine_amount IS NULL OR fine_amount = '' THEN 0.0 ELSE CAST(fine_amount AS REAL) END), 0) as avg_fine
+                SELECT COUNT(*), COALESCE(SUM(fine_amount), 0), COALESCE(AVG(fine_amount), 0)
                 FROM transactions
-                WHERE CAST(COALESCE(fine_amount, '0') AS REAL) > 0 AND fine_paid = 0 AND status = 'returned'
+                WHERE fine_paid = 0 AND status = 'returned' AND fine_amount > 0
             ''')).fetchone()
             print(f"Stats query successful! Result: {stats_result}")
 
+            # Confirm the stats query is answered from the partial index
+            plan = conn.execute(text('''
+                EXPLAIN QUERY PLAN
+                SELECT COUNT(*) FROM transactions
+                WHERE fine_paid = 0 AND status = 'returned' AND fine_amount > 0
+            ''')).fetchall()
+            print(f"Stats query plan: {[row[-1] for row in plan]}")
+
             # Check for any problematic fine_amount values
-            result = conn.execute(text("SELECT id, fine_amount FROM transactions WHERE fine_amount IS NULL OR fine_amount = ''"))
+            result = conn.execute(text("SELECT id, fine_amount FROM transactions WHERE fine_amount IS NULL OR typeof(fine_amount) != 'real'"))
             problematic = result.fetchall()
             if problematic:
                 print(f"Found {len(problematic)} problematic records:")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Test that create_app() initializes an empty database file:
+every table, the default admin and settings, and working triggers
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+
+# Add the library_management directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'library_management'))
+
+from sqlalchemy import text
+from app import create_app
+from app.db import db
+from app.models import User, LibrarySettings, Category, CatalogChange, RowTombstone
+
+REQUIRED_TABLES = ['users', 'books', 'patrons', 'category', 'transactions', 'library_settings',
+                   'fine_ledger', 'patron_balances', 'cache_versions', 'catalog_changes', 'row_tombstones']
+
+def test_fresh_db():
+    """Initialize a new database file and check what create_app() built"""
+    data_dir = tempfile.mkdtemp()
+
+    class FreshConfig:
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(data_dir, 'library.db')}"
+
+    try:
+        app = create_app(FreshConfig)
+        with app.app_context():
+            tables = db.inspect(db.engine).get_table_names()
+            missing = [table for table in REQUIRED_TABLES if table not in tables]
+            if missing:
+                print(f"Missing tables: {missing}")
+                return False
+            print(f"All {len(REQUIRED_TABLES)} required tables created")
+
+            if not User.query.filter_by(role='admin').first() or not LibrarySettings.query.count():
+                print("Default admin user or settings missing")
+                return False
+            print("Default admin user and settings created")
+
+            triggers = db.session.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'")).scalars().all()
+            print(f"Triggers: {sorted(triggers)}")
+
+            # The change feed triggers fire on category, which create_all made after catalog_changes
+            db.session.add(Category(name='Fresh DB test'))
+            db.session.commit()
+            if not CatalogChange.query.filter_by(entity='category', op='insert').count():
+                print("Category insert was not recorded in catalog_changes")
+                return False
+            print("Catalog change triggers fire")
+
+            # The tombstone triggers fire on category and the other source tables of row_tombstones
+            db.session.delete(Category.query.filter_by(name='Fresh DB test').one())
+            db.session.commit()
+            if not RowTombstone.query.filter_by(table_name='category').count():
+                print("Category delete was not recorded in row_tombstones")
+                return False
+            print("Row change triggers fire")
+            db.session.remove()
+        return True
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    if test_fresh_db():
+        print("\nFresh database test completed successfully!")
+    else:
+        print("\nFresh database test failed!")
+        sys.exit(1)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test that restoring an older CSV system backup brings the fines ledger and
+patron balances back in line with the restored transactions
+"""
+
+import sys
+import os
+import json
+import shutil
+import tempfile
+from datetime import date
+
+# Backups of this test go to their own directory; set before the app is imported
+data_dir = tempfile.mkdtemp()
+os.environ['BACKUP_DIR'] = os.path.join(data_dir, 'backups')
+
+# Add the library_management directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'library_management'))
+
+from sqlalchemy import text
+from app import create_app, ledger, csv_backup
+from app.db import db
+from app.models import Category, Patron, Book, Transaction, User
+
+def check(condition, message):
+    print(('ok: ' if condition else 'FAILED: ') + message)
+    return condition
+
+def outstanding_by_patron(conn):
+    """Unpaid fines per patron according to transactions"""
+    return {row[0]: round(row[1], 2) for row in conn.execute(text(
+        'SELECT patron_id, SUM(fine_amount) FROM transactions WHERE fine_amount > 0 AND fine_paid = 0 GROUP BY patron_id'))}
+
+def balances(conn):
+    return {row[0]: round(row[1], 2) for row in conn.execute(text(
+        'SELECT patron_id, balance FROM patron_balances WHERE balance <> 0'))}
+
+def test_restore_ledger():
+    """Pay, waive and replace fines after a backup, then restore the backup"""
+    db_path = os.path.join(data_dir, 'library.db')
+
+    class LedgerConfig:
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+
+    app = create_app(LedgerConfig, interfaces=['admin'])
+    with app.app_context():
+        admin = User.query.filter_by(role='admin').first()
+        category = Category(name='Ledger test')
+        db.session.add(category)
+        db.session.flush()
+        book = Book(title='Ledger Book', author='Author', accession_number='LED-1', category_id=category.id)
+        alice = Patron(roll_no='LED001', name='Alice', patron_type='student', status='active')
+        bob = Patron(roll_no='LED002', name='Bob', patron_type='student', status='active')
+        db.session.add_all([book, alice, bob])
+        db.session.flush()
+        fined = [(alice, 5.0, False), (alice, 2.0, True), (bob, 3.0, False)]
+        for patron, fine, paid in fined:
+            db.session.add(Transaction(patron_id=patron.id, book_id=book.id, issue_date=date(2024, 1, 2),
+                                       due_date=date(2024, 1, 16), return_date=date(2024, 1, 21), status='returned',
+                                       fine_amount=fine, fine_paid=paid, issued_by=admin.id))
+        db.session.commit()
+        first, _, last = [t.id for t in Transaction.query.order_by(Transaction.id)]
+        alice_id, bob_id, book_id = alice.id, bob.id, book.id
+        with db.engine.connect() as conn:
+            ledger.backfill_from_transactions(conn)
+            conn.commit()
+
+        manifest = csv_backup.create_system_backup(db_path)
+        db.session.remove()
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+
+    # After the backup: Alice pays, Bob's fine is waived, then Bob's transaction is
+    # deleted and its id reused for a new fine of Alice's
+    client.post(f'/collect_fine/{first}')
+    client.post(f'/waive_fine/{last}', data={'reason': 'Test'})
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(text('DELETE FROM transactions WHERE id = :id'), {'id': last})
+            conn.execute(text('''
+                INSERT INTO transactions (id, patron_id, book_id, issue_date, due_date, return_date, status,
+                                          fine_amount, fine_paid, issued_by)
+                VALUES (:id, :patron_id, :book_id, '2024-02-01', '2024-02-15', '2024-02-19', 'returned', 4.0, 0, 1)
+            '''), {'id': last, 'patron_id': alice_id, 'book_id': book_id})
+            ledger.record_assessment(conn, alice_id, 4.0, transaction_id=last)
+            conn.commit()
+            entries_before = conn.execute(text('SELECT COUNT(*) FROM fine_ledger')).scalar()
+
+    response = client.post('/complete_restore', data={'action': 'restore', 'manifest_json': json.dumps(manifest)})
+
+    success = check(b'COMPLETE SYSTEM RESTORED' in response.data, 'the older backup restores')
+    with app.app_context():
+        with db.engine.connect() as conn:
+            expected = outstanding_by_patron(conn)
+            actual = balances(conn)
+            success &= check(expected == {alice_id: 5.0, bob_id: 3.0}, f'restored transactions owe {expected}')
+            success &= check(actual == expected, f'patron balances match the restored transactions {actual}')
+            success &= check(ledger.get_balance(conn, alice_id) == 5.0 and ledger.get_balance(conn, bob_id) == 3.0,
+                             'ledger.get_balance agrees')
+            entries_after = conn.execute(text('SELECT COUNT(*) FROM fine_ledger')).scalar()
+            success &= check(entries_after > entries_before, 'the ledger was corrected by appending entries')
+
+            # A second reconcile has nothing left to correct
+            success &= check(ledger.reconcile_with_transactions(conn) == 0, 'reconciling again writes nothing')
+            conn.commit()
+        db.session.remove()
+    return success
+
+if __name__ == "__main__":
+    try:
+        passed = test_restore_ledger()
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    if passed:
+        print("\nRestore ledger test completed successfully!")
+    else:
+        print("\nRestore ledger test failed!")
+        sys.exit(1)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test that a table exported with /export/<table> restores through
+/restore/<table> to the same rows, on a new database with sample data
+"""
+
+import sys
+import os
+import io
+import shutil
+import sqlite3
+import tempfile
+from datetime import date
+
+# Add the library_management directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'library_management'))
+
+from app import create_app
+from app.db import db
+from app.models import Category, Patron, Book, Transaction, User
+from app.restore_engine import UPSERT_LAYOUTS
+
+# A change made after each export, which the restore must undo
+EDITS = {
+    'books': "UPDATE books SET title = 'Edited', category_id = 1, status = 'lost', call_number = NULL WHERE id = (SELECT MAX(id) FROM books)",
+    'patrons': "UPDATE patrons SET name = 'Edited', max_books = 9, email = NULL WHERE id = (SELECT MAX(id) FROM patrons)",
+    'categories': "UPDATE category SET description = 'Edited' WHERE id = (SELECT MAX(id) FROM category)",
+    'transactions': "UPDATE transactions SET status = 'returned', fine_amount = 99.5 WHERE id = (SELECT MAX(id) FROM transactions)"
+}
+
+def table_rows(db_path, table_name):
+    """Rows of the columns restore_table writes, by id.
+
+    CSV writes NULL and '' alike, so they compare equal.
+    """
+    layout = UPSERT_LAYOUTS[table_name]
+    columns = ', '.join(['id'] + [column for column, _ in layout['columns']])
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute(f"SELECT {columns} FROM {layout['table']} ORDER BY id").fetchall()
+    return [tuple('' if value is None else value for value in row) for row in rows]
+
+def add_sample_rows():
+    """A few rows per table, with empty optional columns and non-default values"""
+    admin = User.query.filter_by(role='admin').first()
+    fiction = Category(name='Fiction', description='Novels and stories')
+    reference = Category(name='Reference', is_active=False)
+    db.session.add_all([fiction, reference])
+    db.session.flush()
+    patrons = [Patron(roll_no='RT001', name='Asha Rao', email='asha@example.com', phone='555-0101',
+                      patron_type='student', department='CSE', division='A', status='active', max_books=3),
+               Patron(roll_no='RT002', name='Ben Ode', patron_type='faculty', status='suspended', max_books=6)]
+    books = [Book(title='Dune', author='Frank Herbert', isbn='978-0-441-01359-3', publisher='Ace',
+                  publication_year=1965, accession_number='RT-0001', call_number='813.54 HER',
+                  category_id=fiction.id, status='issued'),
+             Book(title='Atlas', author='Various', accession_number='RT-0002', category_id=reference.id)]
+    db.session.add_all(patrons + books)
+    db.session.flush()
+    db.session.add_all([
+        Transaction(patron_id=patrons[0].id, book_id=books[0].id, issue_date=date(2024, 3, 1),
+                    due_date=date(2024, 3, 15), status='issued', issued_by=admin.id),
+        Transaction(patron_id=patrons[1].id, book_id=books[1].id, issue_date=date(2024, 1, 2),
+                    due_date=date(2024, 1, 16), return_date=date(2024, 1, 20), status='returned',
+                    fine_amount=4.0, fine_paid=True, issued_by=admin.id)
+    ])
+    db.session.commit()
+
+def test_restore_roundtrip():
+    """Export, edit, restore and compare every restorable table"""
+    data_dir = tempfile.mkdtemp()
+    db_path = os.path.join(data_dir, 'library.db')
+
+    class RoundTripConfig:
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+
+    try:
+        app = create_app(RoundTripConfig, interfaces=['admin'])
+        with app.app_context():
+            add_sample_rows()
+            db.session.remove()
+        client = app.test_client()
+        client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+
+        success = True
+        for table_name in UPSERT_LAYOUTS:
+            exported = client.get(f'/export/{table_name}')
+            if exported.mimetype != 'text/csv':
+                print(f"{table_name}: export failed")
+                success = False
+                continue
+
+            before = table_rows(db_path, table_name)
+            with sqlite3.connect(db_path) as conn:
+                conn.execute(EDITS[table_name])
+
+            response = client.post(f'/restore/{table_name}', data={
+                'file': (io.BytesIO(exported.data), f'{table_name}.csv')
+            }, content_type='multipart/form-data')
+            after = table_rows(db_path, table_name)
+
+            if response.status_code != 200 or after != before:
+                changed = [row for row in after if row not in before]
+                print(f"{table_name}: {len(changed)} rows differ after the round trip, e.g. {changed[:2]}")
+                success = False
+            else:
+                print(f"{table_name}: {len(after)} rows restored unchanged")
+
+        # A file without a header naming the required columns is refused, not misread
+        response = client.post('/restore/books', data={
+            'file': (io.BytesIO(b'1,Some title,Some author\n'), 'books.csv')
+        }, content_type='multipart/form-data')
+        if b'missing required columns' not in response.data:
+            print("books: a file without a header was not refused")
+            success = False
+        else:
+            print("books: a file without a header is refused")
+        return success
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    if test_restore_roundtrip():
+        print("\nRestore round trip test completed successfully!")
+    else:
+        print("\nRestore round trip test failed!")
+        sys.exit(1)
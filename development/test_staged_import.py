@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test that a staged CSV import validates in its staging table, imports
+only the valid rows and assesses imported fines in the ledger
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+
+# Add the library_management directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'library_management'))
+
+from sqlalchemy import text
+from app import create_app, ledger, staged_import
+from app.db import db
+from app.models import Category, Patron, Book, Transaction, User
+
+PATRONS_CSV = [
+    'roll_no,name,email,phone',
+    'IMP001,Imported Patron,imported@example.com,555-0100',
+    'IMP002,Bad Email,not-an-email,',
+    'IMP001,Duplicate Roll,,'
+]
+
+def transactions_csv(patron_id, book_id):
+    return [
+        'patron_id,book_id,issue_date,due_date,return_date,status,fine_amount',
+        f'{patron_id},{book_id},2024-01-02,2024-01-16,2024-01-21,returned,5.0',
+        f'{patron_id},{book_id},02/01/2024,2024-03-14,,issued,',
+        f'{patron_id},999999,2024-03-01,2024-03-15,,issued,'
+    ]
+
+def check(condition, message):
+    print(('ok: ' if condition else 'FAILED: ') + message)
+    return condition
+
+def test_staged_import():
+    """Stage and commit patron and transaction uploads into a new database"""
+    data_dir = tempfile.mkdtemp()
+
+    class ImportConfig:
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(data_dir, 'library.db')}"
+
+    try:
+        app = create_app(ImportConfig, interfaces=['admin'])
+        with app.app_context():
+            admin = User.query.filter_by(role='admin').first()
+            category = Category(name='Import test')
+            db.session.add(category)
+            db.session.flush()
+            book = Book(title='Staged Book', author='Author', accession_number='IMP-1', category_id=category.id)
+            db.session.add(book)
+            db.session.commit()
+
+            success = True
+            staged = staged_import.stage_import('patrons', PATRONS_CSV, 'patrons.csv', admin.id)
+            success &= check(staged['total_rows'] == 3 and staged['valid_rows'] == 1,
+                             f"patrons: 1 of 3 rows valid ({staged['valid_rows']} of {staged['total_rows']})")
+            success &= check(staged['errors'] == ['Row 3: Invalid email format', 'Row 4: Duplicate roll_no in file'],
+                             f"patrons: errors listed by row {staged['errors']}")
+            result = staged_import.commit_import(staged['import_id'], admin.id)
+            patron = Patron.query.filter_by(roll_no='IMP001').first()
+            success &= check(result['imported'] == 1 and patron is not None and patron.email == 'imported@example.com',
+                             'patrons: the valid row is imported')
+
+            staged = staged_import.stage_import('transactions', transactions_csv(patron.id, book.id),
+                                                'transactions.csv', admin.id)
+            success &= check(staged['valid_rows'] == 1 and len(staged['errors']) == 2,
+                             f"transactions: bad date and unknown book rejected {staged['errors']}")
+            staged_import.commit_import(staged['import_id'], admin.id)
+            success &= check(Transaction.query.filter_by(patron_id=patron.id).count() == 1,
+                             'transactions: the valid row is imported')
+            with db.engine.connect() as conn:
+                balance = ledger.get_balance(conn, patron.id)
+                entries = conn.execute(text("SELECT COUNT(*) FROM fine_ledger WHERE patron_id = :id AND entry_type = 'assessment'"),
+                                       {'id': patron.id}).scalar()
+            success &= check(balance == 5.0 and entries == 1, f'transactions: imported fine is in the ledger (balance {balance})')
+
+            # An import id is used once, and its staging table is gone
+            try:
+                staged_import.commit_import(staged['import_id'], admin.id)
+                success &= check(False, 'a committed import id is refused')
+            except staged_import.StagedImportError:
+                success &= check(True, 'a committed import id is refused')
+            leftover = db.session.execute(text(
+                "SELECT COUNT(*) FROM sqlite_master WHERE name LIKE 'import_staging_%'")).scalar()
+            success &= check(leftover == 0, 'staging tables are dropped after import')
+            db.session.remove()
+        return success
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    if test_staged_import():
+        print("\nStaged import test completed successfully!")
+    else:
+        print("\nStaged import test failed!")
+        sys.exit(1)